@@ -0,0 +1,162 @@
+"""
+Micro-benchmark of the fiat conversion of result pages.
+
+Compares converting the values of a page row by row (ConvertedValues) with
+the batch conversion (convert_values) used by the listings, for address
+transactions, transactions with their inputs and outputs, and block
+transactions. Run
+
+    python benchmarks/conversion.py --rows 10000
+
+and the cost per row of each variant is reported.
+"""
+import argparse
+import random
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from gsrest.model.addresses import AddressTx
+from gsrest.model.blocks import BlockTxs
+from gsrest.model.common import ConvertedValues, RatesArray
+from gsrest.model.txs import Tx
+
+COLUMNS = {'address_id_group': 0, 'address_id': 1, 'tx_hash': 2,
+           'height': 3, 'timestamp': 4, 'value': 5}
+TxRow = namedtuple('TxRow', ('tx_hash', 'coinbase', 'height', 'inputs',
+                             'outputs', 'timestamp', 'total_input',
+                             'total_output'))
+TxInputOutput = namedtuple('TxInputOutput', ('address', 'value'))
+BlockTxSummary = namedtuple('BlockTxSummary', ('tx_hash', 'no_inputs',
+                                               'no_outputs', 'total_input',
+                                               'total_output'))
+BlockTxsRow = namedtuple('BlockTxsRow', ('height', 'txs'))
+FIAT_CURRENCIES = ('eur', 'usd')
+
+
+def random_rates(no_heights):
+    """ Returns the rates of all heights as dicts, which the per-row
+    conversion uses, and as in-memory rates table (see
+    gsrest.service.rates_service), which the batch conversion uses """
+    table = np.random.uniform(1, 60000, (no_heights, len(FIAT_CURRENCIES)))
+    return [dict(zip(FIAT_CURRENCIES, row)) for row in table.tolist()], \
+        table
+
+
+def address_tx_rows(rows, no_heights):
+    return [(0, 1, random.getrandbits(256).to_bytes(32, 'big'),
+             random.randrange(no_heights), 1500000000,
+             random.randrange(-10 ** 10, 10 ** 10)) for _ in range(rows)]
+
+
+def tx_rows(rows, no_heights):
+    def ios():
+        return [TxInputOutput(['1Address'], random.randrange(10 ** 10))
+                for _ in range(random.randint(1, 4))]
+    return [TxRow(random.getrandbits(256).to_bytes(32, 'big'), False,
+                  random.randrange(no_heights), ios(), ios(), 1500000000,
+                  random.randrange(10 ** 10), random.randrange(10 ** 10))
+            for _ in range(rows)]
+
+
+def rates_array(table, heights):
+    return RatesArray(FIAT_CURRENCIES,
+                      table[np.asarray(heights, dtype=np.int64)])
+
+
+def per_row_address_txs(rows, rates):
+    rates, _ = rates
+    return [AddressTx(None, row[3], row[4], row[2].hex(),
+                      ConvertedValues(row[5], rates[row[3]]).to_dict())
+            .to_dict() for row in rows]
+
+
+def batch_address_txs(rows, rates):
+    _, table = rates
+    array = rates_array(table, [row[3] for row in rows])
+    return [tx.to_dict()
+            for tx in AddressTx.from_tuples(rows, COLUMNS, None, array)]
+
+
+def per_row_txs(rows, rates):
+    rates, _ = rates
+
+    def convert(value, row):
+        return ConvertedValues(value, rates[row.height]).to_dict()
+    return [Tx(row.tx_hash, row.coinbase, row.height,
+               [{'address': i.address[0], 'value': convert(i.value, row)}
+                for i in row.inputs],
+               [{'address': o.address[0], 'value': convert(o.value, row)}
+                for o in row.outputs],
+               row.timestamp, convert(row.total_input, row),
+               convert(row.total_output, row)).to_dict() for row in rows]
+
+
+def batch_txs(rows, rates):
+    _, table = rates
+    array = rates_array(table, [row.height for row in rows])
+    return [tx.to_dict() for tx in Tx.from_rows(rows, array)]
+
+
+def per_row_block_txs(row, rates):
+    return [{'tx_hash': tx.tx_hash.hex(), 'no_inputs': tx.no_inputs,
+             'no_outputs': tx.no_outputs,
+             'total_input': ConvertedValues(tx.total_input,
+                                            rates).to_dict(),
+             'total_output': ConvertedValues(tx.total_output,
+                                             rates).to_dict()}
+            for tx in row.txs]
+
+
+def batch_block_txs(row, rates):
+    return BlockTxs.from_row(row, rates).to_dict()
+
+
+def measure(function, *args, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rows', type=int, default=10000,
+                        help='rows per page (default 10000)')
+    parser.add_argument('--heights', type=int, default=600000,
+                        help='distinct block heights (default 600000)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+    rates = random_rates(args.heights)
+    address_txs = address_tx_rows(args.rows, args.heights)
+    txs = tx_rows(args.rows, args.heights)
+    block = BlockTxsRow(0, [
+        BlockTxSummary(random.getrandbits(256).to_bytes(32, 'big'), 2, 2,
+                       random.randrange(10 ** 10), random.randrange(10 ** 10))
+        for _ in range(args.rows)])
+
+    assert per_row_address_txs(address_txs, rates) == \
+        batch_address_txs(address_txs, rates)
+    for name, per_row, batch, page, page_rates in (
+            ('address txs', per_row_address_txs, batch_address_txs,
+             address_txs, rates),
+            ('txs', per_row_txs, batch_txs, txs, rates),
+            ('block txs', per_row_block_txs, batch_block_txs, block,
+             rates[0][0])):
+        per_row_time = measure(per_row, page, page_rates)
+        batch_time = measure(batch, page, page_rates)
+        print('{:12} per row {:6.2f} us/row, batch {:6.2f} us/row '
+              '({:.1f}x)'.format(name, per_row_time / args.rows * 1e6,
+                                 batch_time / args.rows * 1e6,
+                                 per_row_time / batch_time))
+
+
+if __name__ == '__main__':
+    main()
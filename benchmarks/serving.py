@@ -0,0 +1,73 @@
+"""
+Load benchmark comparing the WSGI and ASGI serving modes.
+
+Start both deployments against the same Cassandra cluster, e.g.
+
+    gunicorn -w 1 -b :9000 "gsrest:create_app()"
+    gunicorn -w 1 -b :9001 -k uvicorn.workers.UvicornWorker \\
+        "gsrest.asgi:create_app()"
+
+and run
+
+    python benchmarks/serving.py --token JWT --concurrency 200 \\
+        http://localhost:9000 http://localhost:9001 \\
+        /btc/blocks/1000 /btc/addresses/1Archive1n2C579dMsAu3iC6tWzuQJz8dN
+
+Each path is requested by `concurrency` clients in parallel, `requests`
+times in total per deployment. Latency percentiles and throughput are
+reported per deployment.
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+
+def fetch(url, token):
+    request = Request(url, headers={'Authorization': token} if token else {})
+    start = time.perf_counter()
+    try:
+        with urlopen(request) as response:
+            response.read()
+            status = response.status
+    except HTTPError as e:
+        status = e.code
+    return time.perf_counter() - start, status
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run(base_url, paths, token, concurrency, requests):
+    urls = [base_url + paths[i % len(paths)] for i in range(requests)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda url: fetch(url, token), urls))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, status in results if status >= 500)
+    print('{}: {:.1f} req/s, p50 {:.1f} ms, p95 {:.1f} ms, p99 {:.1f} ms, '
+          '{} errors'.format(base_url, requests / elapsed,
+                             percentile(latencies, 50) * 1000,
+                             percentile(latencies, 95) * 1000,
+                             percentile(latencies, 99) * 1000, errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('sync_url', help='base URL of the sync deployment')
+    parser.add_argument('async_url', help='base URL of the async deployment')
+    parser.add_argument('paths', nargs='+', help='request paths')
+    parser.add_argument('--token', help='JWT used for authentication')
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+    for base_url in (args.sync_url, args.async_url):
+        run(base_url.rstrip('/'), args.paths, args.token, args.concurrency,
+            args.requests)
+
+
+if __name__ == '__main__':
+    main()
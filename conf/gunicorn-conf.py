@@ -1,3 +1,6 @@
+import glob
+import os
+
 timeout = 300
 capture_output = True
 accesslog = '/home/dockeruser/gunicorn-access.log'
@@ -11,8 +14,45 @@ secure_scheme_headers = {
 }
 
 
+def on_starting(server):
+    # metrics of previous runs must not be reported (see gsrest/util/metrics)
+    multiproc_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if multiproc_dir:
+        for name in glob.glob(os.path.join(multiproc_dir, '*.db')):
+            os.remove(name)
+
+
 def post_fork(server, worker):
     server.log.info('Worker spawned (pid: %s)', worker.pid)
+    # Cassandra connections must never be shared across processes
+    from gsrest.db import cassandra
+    cassandra.reset()
+
+
+def post_worker_init(worker):
+    # open the per-worker storage connection, load the exchange rates and
+    # map the Bloom filters before serving requests
+    from gsrest.db import storage
+    from gsrest.service import bloom_filters, rates_service
+    try:
+        storage.connect(worker.wsgi)
+        rates_service.preload(worker.wsgi)
+        bloom_filters.preload(worker.wsgi)
+    except Exception:
+        worker.log.exception('Storage connection failed, retrying on '
+                             'first request')
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    from gsrest.db import storage
+    storage.shutdown(worker.wsgi)
+    server.log.info('Worker exited (pid: %s)', worker.pid)
 
 
 def pre_fork(server, worker):
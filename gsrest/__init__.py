@@ -30,9 +30,24 @@ def init_services(app):
     from gsrest.service import user_service
     user_service.init_app(app)
 
-    # register cassandra database
-    from gsrest.db import cassandra
-    cassandra.init_app(app)
+    # register storage backend
+    from gsrest.db import storage
+    storage.init_app(app)
+
+    # register address dictionary, index and Bloom filter builders and the
+    # transaction index builder
+    from gsrest.service import address_dictionary, address_index, \
+        bloom_filters, tx_index
+    address_dictionary.init_app(app)
+    address_index.init_app(app)
+    bloom_filters.init_app(app)
+    tx_index.init_app(app)
+
+    # register request timing, metrics and slow-query log
+    from gsrest.util import timing, metrics, slow_queries
+    timing.init_app(app)
+    metrics.init_app(app)
+    slow_queries.init_app(app)
 
     # register api namespaces
     from gsrest.apis import api
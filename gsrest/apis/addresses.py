@@ -6,7 +6,6 @@ from gsrest.apis.common import page_size_parser, neighbors_parser, \
     tag_response, neighbors_response, links_parser, links_response
 import gsrest.service.addresses_service as addressesDAO
 import gsrest.service.common_service as commonDAO
-import gsrest.service.entities_service as entitiesDAO
 from gsrest.util.csvify import create_download_header, to_csv
 from gsrest.util.checks import check_inputs
 from gsrest.util.decorator import token_required
@@ -28,9 +27,8 @@ class Address(Resource):
         Returns details and tags of a specific address
         """
         check_inputs(address=address, currency=currency)  # abort if fails
-        addr = commonDAO.get_address(currency, address)
+        addr = commonDAO.get_address_with_tags(currency, address)
         if addr:
-            addr['tags'] = commonDAO.list_address_tags(currency, address)
             return addr
         abort(404, "Address {} not found in currency {}".format(address,
                                                                 currency))
@@ -181,10 +179,8 @@ class AddressEntity(Resource):
         Returns the associated entity for a given address
         """
         check_inputs(address=address, currency=currency)  # abort if fails
-        entity = addressesDAO.get_address_entity(currency, address)
+        entity = addressesDAO.get_address_entity_with_tags(currency, address)
         if entity:
-            entity['tags'] = entitiesDAO.list_entity_tags(currency,
-                                                          entity['entity'])
             entity['tag_coherence'] = compute_tag_coherence(entity['tags'])
             return entity
         abort(404, "Address {} not found in currency {}".format(address,
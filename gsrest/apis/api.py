@@ -1,5 +1,6 @@
-from flask_restplus import Api
+from flask_restplus import Api, representations
 from gsrest._version import __version__ as version
+from gsrest.util.timing import timed
 
 authorizations = {
     'apikey': {
@@ -16,3 +17,9 @@ api = Api(
     authorizations=authorizations,
     security='apikey'
 )
+
+
+@api.representation('application/json')
+def output_json(data, code, headers=None):
+    with timed('serialize'):
+        return representations.output_json(data, code, headers)
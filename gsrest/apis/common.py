@@ -22,6 +22,15 @@ label_parser.add_argument("currency", location="args")
 label_parser.add_argument("label", required=True, location="args",
                           help="The label of an entity")
 
+rates_range_parser = api.parser()
+rates_range_parser.add_argument("start", type=int, default=0,
+                                location="args", help="First block height")
+rates_range_parser.add_argument("end", type=int, location="args",
+                                help="Last block height (default: latest)")
+rates_range_parser.add_argument("stride", type=int, default=1,
+                                location="args",
+                                help="Distance between returned heights")
+
 search_parser = api.parser()
 search_parser.add_argument("currency", location="args",
                            help="Cryptocurrency")
@@ -354,6 +363,14 @@ currency_search_model = {
 currency_search_response = api.model('currency_search_response',
                                      currency_search_model)
 
+search_timeout_model = {
+    'currency': fields.String(required=True, description='Currency'),
+    'source': fields.String(required=True,
+                            description='Search: addresses, txs or labels'),
+}
+search_timeout_response = api.model('search_timeout_response',
+                                    search_timeout_model)
+
 search_model = {
     'currencies': fields.List(fields.Nested(currency_search_response),
                               required=True,
@@ -361,5 +378,14 @@ search_model = {
                                           'transactions for a cryptocurrency'),
     'labels': fields.List(fields.String, required=True,
                           description="The list of matching labels"),
+    'timed_out': fields.List(fields.Nested(search_timeout_response),
+                             required=True,
+                             description='Searches not finished within the '
+                                         'deadline, whose results are '
+                                         'missing'),
+    'failed': fields.List(fields.Nested(search_timeout_response),
+                          required=True,
+                          description='Searches which failed, whose results '
+                                      'are missing'),
 }
 search_response = api.model("search_response", search_model)
@@ -27,10 +27,8 @@ class Entity(Resource):
         Returns details and optionally tags of a specific entity
         """
         check_inputs(currency=currency, entity=entity)
-        entity_stats = entitiesDAO.get_entity(currency, entity)
+        entity_stats = entitiesDAO.get_entity_with_tags(currency, entity)
         if entity_stats:
-            entity_stats['tags'] = entitiesDAO.\
-                list_entity_tags(currency, entity_stats['entity'])
             entity_stats['tag_coherence'] = compute_tag_coherence(
                 entity_stats['tags'])
             return entity_stats
@@ -1,15 +1,22 @@
+import functools
+import hashlib
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from flask_restplus import Namespace, Resource
-from flask import current_app
+from flask import abort, current_app, g, request
 
 from gsrest._version import __version__ as version_number
+from gsrest.apis.api import api as root_api
 from gsrest.apis.common import search_parser, search_response
+from gsrest.config import Config
 import gsrest.service.addresses_service as addressesDAO
 import gsrest.service.general_service as generalDAO
 import gsrest.service.tags_service as labelsDAO
 import gsrest.service.txs_service as txsDAO
 from gsrest.util.checks import check_inputs
 from gsrest.util.decorator import token_required
+from gsrest.util.timing import RequestTimer, get_timer, timed
 
 
 api = Namespace('general',
@@ -41,6 +48,86 @@ notes = [{'note': 'Please **note** that the clustering dataset is built with'
                   'team (contact@graphsense.info) for more insight.'}]
 
 
+def statistics_etag(currency_stats):
+    """ Returns an ETag identifying the state of all currencies """
+    state = [version_number]
+    for currency, stats in sorted(currency_stats.items()):
+        if stats:
+            state.append('{}:{}:{}'.format(currency, stats['no_blocks'],
+                                           stats['timestamp']))
+    return hashlib.sha1(','.join(state).encode()).hexdigest()
+
+
+_lock = threading.Lock()
+
+
+def search_executor():
+    """ Returns the thread pool running the searches of the current
+    application """
+    executor = current_app.extensions.get('search_executor')
+    if executor is None:
+        with _lock:
+            executor = current_app.extensions.get('search_executor')
+            if executor is None:
+                executor = ThreadPoolExecutor(
+                    max_workers=current_app.config.get(
+                        'SEARCH_MAX_THREADS', Config.SEARCH_MAX_THREADS),
+                    thread_name_prefix='search')
+                current_app.extensions['search_executor'] = executor
+    return executor
+
+
+def run_searches(searches, timeout):
+    """ Runs the searches, by key, concurrently and returns the results of
+    those finished within timeout seconds (None waits for all), the keys
+    of the others and the keys of the failed ones.
+
+    Searches are called with the deadline, past which they stop fetching
+    pages. Their queries are recorded in the slow-query log of the request
+    and counted in its timer; the request waits for them in the db
+    phase. """
+    app = current_app._get_current_object()
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    slow_queries = g.get('slow_queries')
+    # the phases of a timer are switched by one thread only
+    timers = {key: RequestTimer() for key in searches} \
+        if get_timer() is not None else dict()
+
+    def run(key, search):
+        with app.app_context():
+            if key in timers:
+                g.timer = timers[key]
+            if slow_queries is not None:
+                g.slow_queries = slow_queries
+            return search(deadline=deadline)
+
+    executor = search_executor()
+    futures = {key: executor.submit(run, key, search)
+               for key, search in searches.items()}
+    with timed('db'):
+        wait(futures.values(), timeout=timeout)
+    results = dict()
+    timed_out = []
+    failed = []
+    for key, future in futures.items():
+        if not future.done():
+            # searches still queued are dropped, running ones stop at the
+            # deadline
+            future.cancel()
+            timed_out.append(key)
+        elif future.exception() is not None:
+            current_app.logger.error('Search %s failed', key,
+                                     exc_info=future.exception())
+            failed.append(key)
+        else:
+            results[key] = future.result()
+    timer = get_timer()
+    for search_timer in timers.values():
+        timer.queries += search_timer.queries
+        timer.rows += search_timer.rows
+    return results, timed_out, failed
+
+
 # TODO: is a response model needed here?
 @api.route("/stats")
 class Statistics(Resource):
@@ -48,16 +135,20 @@ class Statistics(Resource):
         """
         Returns summary statistics on all available currencies
         """
-        currency_stats = dict()
-        for currency in current_app.config['MAPPING']:
-            if currency != "tagpacks":
-                currency_stats[currency] = generalDAO.get_statistics(currency)
+        # the (cached) statistics of all currencies are fetched concurrently
+        futures = {currency: generalDAO.get_statistics_async(currency)
+                   for currency in current_app.config['MAPPING']
+                   if currency != "tagpacks"}
+        currency_stats = {currency: future.result()
+                          for currency, future in futures.items()}
         statistics = dict()
         statistics['currencies'] = currency_stats
         statistics['tools'] = tools
         statistics['notes'] = notes
         statistics['data_sources'] = [tags_source]
-        return statistics
+        response = root_api.make_response(statistics, 200)
+        response.set_etag(statistics_etag(currency_stats))
+        return response.make_conditional(request)
 
 
 @api.param('expression', 'It can be (the beginning of) an address, '
@@ -76,49 +167,52 @@ class Search(Resource):
         currency = args['currency']
         expression = args['q']
         limit = args['limit']
+        if limit is not None and limit < 0:
+            abort(400, 'Invalid limit')
         currencies = [c for c in current_app.config['MAPPING']
                       if c != 'tagpacks']
         if currency:
             check_inputs(currency=currency)
             currencies = [currency]
         can_be_label, can_be_tx_address = check_inputs(expression=expression)
-        leading_zeros = 0
-        pos = 0
-        # leading zeros will be lost when casting to int
-        while expression[pos] == "0":
-            pos += 1
-            leading_zeros += 1
+
+        searches = dict()
+        for currency in currencies:
+            if can_be_tx_address:
+                # Look for addresses and transactions
+                if len(expression) >= txsDAO.TX_PREFIX_LENGTH:
+                    searches[(currency, 'txs')] = functools.partial(
+                        txsDAO.list_matching_txs, currency, expression,
+                        limit)
+                if len(expression) >= addressesDAO.ADDRESS_PREFIX_LENGTH:
+                    searches[(currency, 'addresses')] = functools.partial(
+                        addressesDAO.list_matching_addresses, currency,
+                        expression, limit)
+            if can_be_label:
+                searches[(currency, 'labels')] = functools.partial(
+                    labelsDAO.list_labels, currency, expression, limit)
+        found, timed_out, failed = run_searches(
+            searches, current_app.config.get('SEARCH_TIMEOUT',
+                                             Config.SEARCH_TIMEOUT))
 
         result = dict()
         result['currencies'] = []
-
         if can_be_tx_address:
             for currency in currencies:
                 element = dict()
-                element['addresses'] = []
-                element['txs'] = []
                 element['currency'] = currency
-
-                # Look for addresses and transactions
-                if len(expression) >= txsDAO.TX_PREFIX_LENGTH:
-                    txs = txsDAO.list_matching_txs(currency,
-                                                   expression,
-                                                   leading_zeros)
-                    element["txs"] = txs[:limit]
-
-                if len(expression) >= addressesDAO.ADDRESS_PREFIX_LENGTH:
-                    addresses = \
-                        addressesDAO.list_matching_addresses(currency,
-                                                             expression)
-                    element["addresses"] = addresses[:limit]
-
+                element['addresses'] = found.get((currency, 'addresses'), [])
+                element['txs'] = found.get((currency, 'txs'), [])
                 result['currencies'].append(element)
 
         result['labels'] = []
-        if can_be_label:
-            for currency in currencies:
-                labels = labelsDAO.list_labels(currency, expression)[:limit]
-                if labels:
-                    result['labels'] += labels
+        for currency in currencies:
+            labels = found.get((currency, 'labels'))
+            if labels:
+                result['labels'] += labels
 
+        result['timed_out'] = [{'currency': currency, 'source': source}
+                               for currency, source in timed_out]
+        result['failed'] = [{'currency': currency, 'source': source}
+                            for currency, source in failed]
         return result
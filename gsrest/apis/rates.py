@@ -1,15 +1,66 @@
-from flask import abort
+import json
+
+from flask import Response, abort
 from flask_restplus import Namespace, Resource
 
-from gsrest.apis.common import height_rates_response
+from gsrest.apis.common import height_rates_response, rates_range_parser
 import gsrest.service.rates_service as ratesDAO
 from gsrest.util.checks import check_inputs
+from gsrest.util.csvify import create_download_header
 from gsrest.util.decorator import token_required
 
 api = Namespace('rates',
                 path='/<currency>/rates',
                 description='Operations related to exchange rates')
 
+# rates are streamed in chunks of this many heights
+RATES_CHUNK_SIZE = 10000
+
+
+def parse_rates_range(currency):
+    args = rates_range_parser.parse_args()
+    start, end, stride = args.get('start'), args.get('end'), \
+        args.get('stride')
+    check_inputs(currency=currency)
+    if start < 0 or stride < 1 or (end is not None and end < start):
+        abort(400, 'Invalid height range')
+    fiat_currencies, rates = ratesDAO.list_rates_range(currency, start, end,
+                                                       stride)
+    return start, stride, fiat_currencies, rates
+
+
+def chunks(column):
+    """ Yields the rates of a column in chunks; unknown rates (NaN) become
+    None """
+    for i in range(0, len(column), RATES_CHUNK_SIZE):
+        yield [None if r != r else r
+               for r in column[i:i + RATES_CHUNK_SIZE].tolist()]
+
+
+def to_columnar_json(start, stride, fiat_currencies, rates):
+    end = start + (len(rates) - 1) * stride if len(rates) else None
+    yield '{{"start": {}, "end": {}, "stride": {}, "rates": {{'.format(
+        start, json.dumps(end), stride)
+    for i, fiat in enumerate(fiat_currencies):
+        yield '{}"{}": ['.format(', ' if i else '', fiat)
+        for j, values in enumerate(chunks(rates[:, i])):
+            yield (', ' if j else '') + json.dumps(values)[1:-1]
+        yield ']'
+    yield '}}'
+
+
+def to_rates_csv(start, stride, fiat_currencies, rates):
+    yield ','.join(('height',) + fiat_currencies) + '\n'
+    columns = [chunks(rates[:, i]) for i in range(len(fiat_currencies))]
+    height = start
+    for chunk in zip(*columns):
+        lines = []
+        for row in zip(*chunk):
+            lines.append('{},{}\n'.format(height, ','.join(
+                '' if r is None else repr(r) for r in row)))
+            height += stride
+        yield ''.join(lines)
+
 
 @api.route("/<int:height>")
 @api.param('currency', 'The cryptocurrency (e.g., btc)')
@@ -27,3 +78,34 @@ class ExchangeRate(Resource):
             abort(404, "Exchange rate for height {} not found in currency {}"
                   .format(height, currency))
         return rates
+
+
+@api.route("/range")
+@api.param('currency', 'The cryptocurrency (e.g., btc)')
+class ExchangeRateRange(Resource):
+    @token_required
+    @api.doc(parser=rates_range_parser)
+    def get(self, currency):
+        """
+        Returns the exchange rates of a range of heights as columns: the
+        i-th rate of each fiat currency is the rate of height
+        start + i * stride; unknown rates are null
+        """
+        return Response(to_columnar_json(*parse_rates_range(currency)),
+                        mimetype='application/json')
+
+
+@api.route("/range.csv")
+@api.param('currency', 'The cryptocurrency (e.g., btc)')
+class ExchangeRateRangeCSV(Resource):
+    @token_required
+    @api.doc(parser=rates_range_parser)
+    def get(self, currency):
+        """
+        Returns a CSV with the exchange rates of a range of heights
+        """
+        return Response(to_rates_csv(*parse_rates_range(currency)),
+                        mimetype='text/csv',
+                        headers=create_download_header(
+                            'exchange rates ({}).csv'
+                            .format(currency.upper())))
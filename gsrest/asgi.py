@@ -0,0 +1,182 @@
+"""
+Optional ASGI serving mode: a threaded bridge from an ASGI server to the
+WSGI application.
+
+The asyncio event loop owns all client connections, while every request is
+handled by the unchanged Flask application (namespaces, parsers and
+response models) on a thread of its own, which also produces the chunks of
+its response: generators of streamed responses, like the CSV exports, push
+contexts which must be popped on the thread that pushed them. At most
+ASYNC_MAX_THREADS of these threads run the application at a time. Query
+futures are still joined by blocking the thread, so, as with gthread
+workers, the number of requests in flight per worker is bounded by
+ASYNC_MAX_THREADS. The mode keeps slow clients and streamed CSV downloads
+from occupying one of them while they are sent, as sending runs on the
+event loop.
+
+Run with any ASGI server, e.g.
+
+    gunicorn -k uvicorn.workers.UvicornWorker "gsrest.asgi:create_app()"
+"""
+import asyncio
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from gsrest import create_app as create_wsgi_app
+from gsrest.config import Config
+from gsrest.db import storage
+from gsrest.service import bloom_filters, rates_service
+
+# response chunks are collected up to this size before being sent
+RESPONSE_CHUNK_SIZE = 64 * 1024
+
+
+def build_environ(scope, body):
+    """ Builds a PEP 3333 environ from an ASGI HTTP scope """
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8')
+                                                 .decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('ascii'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope['http_version']),
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin1').upper().replace('-', '_')
+        value = value.decode('latin1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'CONTENT_LENGTH':
+            environ['CONTENT_LENGTH'] = value
+        else:
+            key = 'HTTP_' + name
+            if key in environ:
+                value = environ[key] + ',' + value
+            environ[key] = value
+    return environ
+
+
+class AsgiApp:
+    """ ASGI application serving a WSGI application from threads, at most
+    max_threads of them running it at a time """
+
+    def __init__(self, wsgi_app, max_threads):
+        self.wsgi_app = wsgi_app
+        # runs the lifespan events
+        self.executor = ThreadPoolExecutor(max_workers=max_threads)
+        self.slots = threading.BoundedSemaphore(max_threads)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError('Unsupported ASGI scope: {}'
+                             .format(scope['type']))
+
+    async def lifespan(self, receive, send):
+        loop = asyncio.get_event_loop()
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await loop.run_in_executor(self.executor,
+                                               storage.connect,
+                                               self.wsgi_app)
+                    await loop.run_in_executor(self.executor,
+                                               rates_service.preload,
+                                               self.wsgi_app)
+                    await loop.run_in_executor(self.executor,
+                                               bloom_filters.preload,
+                                               self.wsgi_app)
+                except Exception:
+                    self.wsgi_app.logger.exception(
+                        'Storage connection failed, retrying on first '
+                        'request')
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await loop.run_in_executor(self.executor, storage.shutdown,
+                                           self.wsgi_app)
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def http(self, scope, receive, send):
+        loop = asyncio.get_event_loop()
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+
+        response = dict()
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin1'),
+                                    value.encode('latin1'))
+                                   for name, value in headers]
+
+        def run():
+            iterable = self.wsgi_app(build_environ(scope, body),
+                                     start_response)
+            return iterable, iter(iterable)
+
+        def next_chunk(iterator):
+            chunk = b''
+            for data in iterator:
+                chunk += data
+                if len(chunk) >= RESPONSE_CHUNK_SIZE:
+                    return chunk, True
+            return chunk, False
+
+        def bounded(function, *args):
+            with self.slots:
+                return function(*args)
+
+        # the thread of the response, idle while chunks are sent
+        thread = ThreadPoolExecutor(max_workers=1,
+                                    thread_name_prefix='response')
+
+        def on_thread(function, *args):
+            return loop.run_in_executor(thread, bounded, function, *args)
+
+        try:
+            iterable, iterator = await on_thread(run)
+            try:
+                await send({'type': 'http.response.start',
+                            'status': response['status'],
+                            'headers': response['headers']})
+                more_body = True
+                while more_body:
+                    chunk, more_body = await on_thread(next_chunk, iterator)
+                    await send({'type': 'http.response.body',
+                                'body': chunk, 'more_body': more_body})
+            finally:
+                if hasattr(iterable, 'close'):
+                    await on_thread(iterable.close)
+        finally:
+            thread.shutdown(wait=False)
+
+
+def create_app(test_config=None):
+    wsgi_app = create_wsgi_app(test_config)
+    return AsgiApp(wsgi_app, wsgi_app.config.get('ASYNC_MAX_THREADS',
+                                                 Config.ASYNC_MAX_THREADS))
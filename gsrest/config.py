@@ -15,6 +15,81 @@ class Config:
     DEBUG = False
     JWT_ACCESS_TOKEN_EXPIRES_DAYS = 1
     USE_PROXY = False
+    # number of request threads of the ASGI serving mode running at a time
+    ASYNC_MAX_THREADS = 256
+    # emit a Server-Timing header with the time spent per request phase
+    SERVER_TIMING = False
+    # serve Prometheus metrics at /metrics (requires prometheus_client)
+    METRICS = False
+    # collect cassandra-driver metrics (requires scales)
+    CASSANDRA_METRICS = False
+    # log queries slower than this many seconds (None disables the log) and
+    # trace the given fraction of queries (see gsrest/util/slow_queries.py)
+    SLOW_QUERY_THRESHOLD = None
+    SLOW_QUERY_TRACE_RATE = 0.0
+    # seconds the latest statistics of a currency are cached per worker (0
+    # disables the cache) and served stale while being reloaded in the
+    # background (see gsrest/util/cache.py)
+    LATEST_CACHE_TTL = 10.0
+    LATEST_CACHE_MAX_STALE = 300.0
+    # estimated bytes of addresses and ids cached per worker (0 disables the
+    # cache), optionally shared by the workers of a host through a SQLite
+    # file (None disables the shared cache) of at most
+    # ADDRESS_CACHE_SHARED_ENTRIES least recently accessed entries
+    ADDRESS_CACHE_SIZE = 32 * 1024 * 1024
+    ADDRESS_CACHE_SHARED_PATH = None
+    ADDRESS_CACHE_SHARED_ENTRIES = 1000000
+    # directory of the address dictionaries built by `flask
+    # build-address-dictionary` (see gsrest/service/address_dictionary.py)
+    ADDRESS_DICTIONARY_PATH = None
+    # directory of the Bloom filters of known addresses and transactions
+    # built by `flask build-bloom-filters` (see
+    # gsrest/service/bloom_filters.py)
+    BLOOM_FILTER_PATH = None
+    # directory of the sorted address indexes for prefix searches built by
+    # `flask build-address-index` (see gsrest/service/address_index.py)
+    ADDRESS_INDEX_PATH = None
+    # directory of the sorted transaction hash indexes for prefix searches
+    # built by `flask build-tx-index` (see gsrest/service/tx_index.py)
+    TX_INDEX_PATH = None
+    # seconds a search waits for the address, transaction and label searches
+    # of all currencies, which run concurrently on up to SEARCH_MAX_THREADS
+    # threads per worker; searches not finished in time are reported as
+    # timed out (None waits for all)
+    SEARCH_TIMEOUT = 5.0
+    SEARCH_MAX_THREADS = 32
+    # storage backend serving the query catalog: 'cassandra' or 'memory'
+    # (synthetic in-process dataset, see gsrest/db/memory.py)
+    STORAGE_BACKEND = 'cassandra'
+    # size and seed of the synthetic dataset of the memory backend
+    MEMORY_DATASET = {
+        'seed': 0,
+        'no_blocks': 100,
+        'no_txs_per_block': 10,
+        'no_addresses': 1000,
+        'no_clusters': 200,
+        'no_tags': 50
+    }
+    # Cassandra execution profiles; queries are assigned to profiles in
+    # gsrest/db/queries.py, speculative executions hedge idempotent reads
+    CASSANDRA_EXECUTION_PROFILES = {
+        'default': {
+            'load_balancing_policy': 'token_aware',
+            'consistency_level': 'LOCAL_ONE',
+            'request_timeout': 10.0
+        },
+        'point': {
+            'load_balancing_policy': 'token_aware',
+            'consistency_level': 'LOCAL_ONE',
+            'request_timeout': 2.0,
+            'speculative_execution': {'delay': 0.05, 'max_attempts': 2}
+        },
+        'scan': {
+            'load_balancing_policy': 'token_aware',
+            'consistency_level': 'LOCAL_ONE',
+            'request_timeout': 60.0
+        }
+    }
 
     def __init__(self, instance_path):
         self.instance_path = instance_path
@@ -1,71 +1,272 @@
-from cassandra.cluster import Cluster
-from cassandra.query import named_tuple_factory
+import os
+import threading
+from collections import namedtuple
+from functools import lru_cache
 
-from flask import current_app, g, abort
+from cassandra import ConsistencyLevel
+from cassandra.cluster import Cluster, ExecutionProfile, EXEC_PROFILE_DEFAULT
+from cassandra.policies import DCAwareRoundRobinPolicy, RoundRobinPolicy, \
+    TokenAwarePolicy, ConstantSpeculativeExecutionPolicy
+from cassandra.query import tuple_factory
 
+from flask import current_app
+
+from gsrest.config import Config
+from gsrest.db.queries import get_query, get_profile, get_row_factory
+from gsrest.db.storage import StorageBackend, get_keyspace_mapping, \
+    keyspaces
 from gsrest.util.exceptions import MissingConfigError
 
 
-def init_app(app):
-    app.teardown_appcontext(close_db)
+class ClusterManager:
+    """ Per-worker Cassandra cluster and sessions shared by all requests.
 
+    The cluster is created once per process, either eagerly from the
+    gunicorn worker hooks or lazily on first use, and is shut down only
+    when the worker exits. Each keyspace gets its own session, so queries
+    never have to switch keyspaces with a USE statement, and its own set of
+    prepared statements.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self.cluster = None
+        self.sessions = dict()
+        self.statements = dict()
+        self.columns = dict()
+
+    def is_connected(self):
+        return self.cluster is not None and self._pid == os.getpid()
+
+    def connect(self, config, logger):
+        if self.is_connected():
+            return self.cluster
+        with self._lock:
+            if not self.is_connected():
+                logger.info("Opening new Cassandra cluster connection.")
+                profiles = config.get('CASSANDRA_EXECUTION_PROFILES',
+                                      Config.CASSANDRA_EXECUTION_PROFILES)
+                self.cluster = Cluster(
+                    config['CASSANDRA_NODES'],
+                    execution_profiles=create_execution_profiles(profiles),
+                    metrics_enabled=config.get('CASSANDRA_METRICS',
+                                               Config.CASSANDRA_METRICS))
+                self.sessions = dict()
+                self.statements = dict()
+                self.columns = dict()
+                self._pid = os.getpid()
+        return self.cluster
+
+    def get_session(self, keyspace, config, logger):
+        session = self.sessions.get(keyspace) if self.is_connected() \
+            else None
+        if session is not None:
+            return session
+        cluster = self.connect(config, logger)
+        with self._lock:
+            if keyspace not in self.sessions:
+                logger.info("Creating new Cassandra session for keyspace "
+                            "{}.".format(keyspace))
+                self.sessions[keyspace] = cluster.connect(keyspace)
+            return self.sessions[keyspace]
+
+    def prepare(self, session, keyspace, name, query):
+        key = (keyspace, name)
+        statement = self.statements.get(key)
+        if statement is None:
+            # preparing twice under a race is harmless
+            statement = session.prepare(query)
+            # all catalog queries are reads and may be retried or hedged
+            statement.is_idempotent = True
+            self.statements[key] = statement
+        return statement
+
+    def get_columns(self, statement, keyspace, name):
+        key = (keyspace, name)
+        columns = self.columns.get(key)
+        if columns is None:
+            columns = {column[2]: i for i, column
+                       in enumerate(statement.result_metadata)}
+            self.columns[key] = columns
+        return columns
+
+    def reset(self):
+        # connections inherited from a parent process must not be reused
+        with self._lock:
+            self.cluster = None
+            self.sessions = dict()
+            self.statements = dict()
+            self.columns = dict()
+            self._pid = None
+
+    def shutdown(self):
+        with self._lock:
+            if self.cluster is not None and self._pid == os.getpid():
+                self.cluster.shutdown()
+            self.cluster = None
+            self.sessions = dict()
+            self.statements = dict()
+            self.columns = dict()
+            self._pid = None
+
+
+manager = ClusterManager()
+
+
+@lru_cache(maxsize=256)
+def row_class(colnames):
+    return namedtuple('Row', colnames, rename=True)
+
+
+def cached_named_tuple_factory(colnames, rows):
+    """ Returns rows as named tuples like the driver's
+    named_tuple_factory, but creates the namedtuple class only once per
+    distinct column list instead of once per result page """
+    make = row_class(tuple(colnames))._make
+    return [make(row) for row in rows]
 
-def get_cluster():
-    if 'ccluster' not in g:
-        current_app.logger.info("Opening new Cassandra cluster connection.")
-        g.ccluster = Cluster(current_app.config["CASSANDRA_NODES"])
 
-    return g.ccluster
+# Row formats of the catalog queries (see ROW_FACTORIES in
+# gsrest/db/queries.py); every execution profile is registered once per
+# format, with the profile name suffixed for the non-default formats.
+ROW_FACTORIES = {
+    'named': cached_named_tuple_factory,
+    'tuple': tuple_factory
+}
 
 
-def get_keyspace_mapping_definition():
-    if 'MAPPING' not in current_app.config:
-        raise MissingConfigError('Missing config property: MAPPING')
-    return current_app.config['MAPPING']
+def create_load_balancing_policy(options):
+    name = options.get('load_balancing_policy', 'token_aware')
+    if name == 'round_robin':
+        return RoundRobinPolicy()
+    child_policy = DCAwareRoundRobinPolicy(local_dc=options.get('local_dc'))
+    if name == 'dc_aware':
+        return child_policy
+    if name == 'token_aware':
+        return TokenAwarePolicy(child_policy)
+    raise ValueError('Unknown load balancing policy: {}'.format(name))
 
 
-def get_supported_currencies():
-    ks_mapping = get_keyspace_mapping_definition()
-    return dict(filter(lambda elem: elem[0] != 'tagpacks',
-                       ks_mapping.items())).keys()
+def create_speculative_execution_policy(options):
+    speculative_execution = options.get('speculative_execution')
+    if not speculative_execution:
+        return None
+    return ConstantSpeculativeExecutionPolicy(
+        speculative_execution['delay'],
+        speculative_execution['max_attempts'])
 
 
-def get_keyspace_mapping(currency, keyspace_type):
-    ks_mapping = get_keyspace_mapping_definition()
-    if currency is None and keyspace_type == 'tagpacks':
-        if 'tagpacks' not in ks_mapping:
-            raise MissingConfigError('Missing config property: tagpacks')
-        return ks_mapping['tagpacks']
-    if currency is not None and keyspace_type in ('raw', 'transformed'):
-        if currency not in ks_mapping:
-            abort(404, 'Unknown currency in config: {}'.format(currency))
-        if keyspace_type == 'raw':
-            return ks_mapping[currency][0]
-        if keyspace_type == 'transformed':
-            return ks_mapping[currency][1]
-    else:
-        raise ValueError("Invalid keyspace request: {} {}".format(
-            currency, keyspace_type))
+def create_execution_profiles(profiles):
+    """ Creates driver execution profiles from the
+    CASSANDRA_EXECUTION_PROFILES config """
+    if 'default' not in profiles:
+        raise MissingConfigError('Missing default Cassandra execution profile')
+    execution_profiles = dict()
+    for name, options in profiles.items():
+        consistency_level = ConsistencyLevel.name_to_value[
+            options.get('consistency_level', 'LOCAL_ONE')]
+        for row_format, row_factory in ROW_FACTORIES.items():
+            profile = ExecutionProfile(
+                load_balancing_policy=create_load_balancing_policy(options),
+                consistency_level=consistency_level,
+                request_timeout=options.get('request_timeout', 10.0),
+                speculative_execution_policy=(
+                    create_speculative_execution_policy(options)),
+                row_factory=row_factory)
+            execution_profiles[profile_name(name, row_format)] = profile
+    return execution_profiles
+
+
+def profile_name(profile, row_format):
+    if row_format != 'named':
+        return '{}:{}'.format(profile, row_format)
+    if profile == 'default':
+        return EXEC_PROFILE_DEFAULT
+    return profile
+
+
+class CassandraBackend(StorageBackend):
+    """ Serves the query catalog from the Cassandra cluster """
+
+    def connect(self, app):
+        """ Connects the current worker process to the Cassandra cluster and
+        opens a session for every configured keyspace """
+        for keyspace in keyspaces():
+            manager.get_session(keyspace, app.config, app.logger)
+
+    def shutdown(self):
+        manager.shutdown()
+
+    def execute_async(self, currency, keyspace_type, name, params=None,
+                      fetch_size=None, paging_state=None, profile=None,
+                      trace=False):
+        session = get_session(currency, keyspace_type)
+        statement = bind(currency, keyspace_type, name, params, fetch_size)
+        return session.execute_async(
+            statement, trace=trace, paging_state=paging_state,
+            execution_profile=get_execution_profile(name, profile))
+
+    def get_columns(self, currency, keyspace_type, name):
+        keyspace = get_keyspace_mapping(currency, keyspace_type)
+        statement = get_statement(currency, keyspace_type, name)
+        return manager.get_columns(statement, keyspace, name)
+
+    def get_stats(self):
+        stats = {'pool': dict()}
+        if not manager.is_connected():
+            return stats
+        for session in list(manager.sessions.values()):
+            for host, state in session.get_pool_state().items():
+                pool = stats['pool'].setdefault(
+                    str(host), {'open_connections': 0, 'in_flight': 0})
+                pool['open_connections'] += state['open_count']
+                pool['in_flight'] += sum(state['in_flights'])
+        if manager.cluster.metrics_enabled:
+            stats['driver'] = manager.cluster.metrics.get_stats()
+        return stats
+
+
+def reset():
+    manager.reset()
+
+
+def get_cluster():
+    if not manager.is_connected():
+        manager.connect(current_app.config, current_app.logger)
+    return manager.cluster
 
 
 def get_session(currency, keyspace_type):
-    if 'csession' not in g:
-        cluster = get_cluster()
-        current_app.logger.info("Creating new Cassandra session.")
-        g.csession = cluster.connect()
+    keyspace = get_keyspace_mapping(currency, keyspace_type)
+    return manager.get_session(keyspace, current_app.config,
+                               current_app.logger)
 
-    session = g.csession
-    # enforce standard row factory (can be overridden on service-level)
-    session.row_factory = named_tuple_factory
 
+def get_statement(currency, keyspace_type, name):
+    """ Returns the prepared statement for a named query of the catalog """
     keyspace = get_keyspace_mapping(currency, keyspace_type)
-    session.set_keyspace(keyspace)
+    session = manager.get_session(keyspace, current_app.config,
+                                  current_app.logger)
+    return manager.prepare(session, keyspace, name,
+                           get_query(keyspace_type, name))
+
 
-    return session
+def bind(currency, keyspace_type, name, params=None, fetch_size=None):
+    """ Returns a bound statement for a named query of the catalog """
+    statement = get_statement(currency, keyspace_type, name)\
+        .bind(params or [])
+    if fetch_size:
+        statement.fetch_size = fetch_size
+    return statement
 
 
-def close_db(e=None):
-    if 'ccluster' in g:
-        cluster = g.pop('ccluster', None)
-        cluster.shutdown()
-        current_app.logger.info("Closed Cassandra cluster connection.")
+def get_execution_profile(name, profile=None):
+    """ Returns the execution profile of a named query, unless overridden
+    by the caller """
+    profile = profile or get_profile(name)
+    profiles = current_app.config.get('CASSANDRA_EXECUTION_PROFILES',
+                                      Config.CASSANDRA_EXECUTION_PROFILES)
+    if profile not in profiles:
+        profile = 'default'
+    return profile_name(profile, get_row_factory(name))
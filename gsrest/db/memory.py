@@ -0,0 +1,393 @@
+"""
+In-memory storage backend.
+
+Serves the query catalog from tables held in process memory, so the API can
+be run, tested and benchmarked without a Cassandra cluster. The tables
+mirror the GraphSense keyspace schemas (see TABLES) and are filled from the
+synthetic dataset generator (gsrest.db.synthetic) on first use of a
+keyspace. Catalog statements are evaluated directly for the CQL subset they
+use: column selection, equality, IN and range restrictions, GROUP BY and
+LIMIT.
+Rows are returned as named tuples or plain tuples, like the driver returns
+them for the row format of the query (see ROW_FACTORIES in
+gsrest/db/queries.py).
+"""
+import re
+import threading
+from collections import namedtuple
+from functools import lru_cache
+from itertools import product
+
+from flask import current_app
+
+from gsrest.config import Config
+from gsrest.db import synthetic
+from gsrest.db.queries import get_query, get_row_factory
+from gsrest.db.storage import StorageBackend, get_keyspace_mapping, \
+    get_supported_currencies
+
+# the driver's default page size
+DEFAULT_FETCH_SIZE = 5000
+
+STATEMENT_PATTERN = re.compile(
+    r'SELECT (?P<columns>.+?) FROM (?P<table>\w+)'
+    r'(?: WHERE (?P<where>.+?))?'
+    r'(?: GROUP BY (?P<group_by>.+?))?'
+    r'(?: LIMIT (?P<limit>\d+|\?))?$')
+RESTRICTION_PATTERN = re.compile(r'(\w+) (=|IN|>=|<=) \?$')
+
+
+# table name: (columns, partition key, clustering key)
+TABLES = {
+    'raw': {
+        'block': (
+            ('height', 'block_hash', 'no_transactions', 'timestamp'),
+            ('height',), ()),
+        'block_transactions': (
+            ('height', 'txs'), ('height',), ()),
+        'transaction': (
+            ('tx_prefix', 'tx_hash', 'height', 'timestamp', 'coinbase',
+             'total_input', 'total_output', 'inputs', 'outputs'),
+            ('tx_prefix',), ('tx_hash',)),
+    },
+    'transformed': {
+        'summary_statistics': (
+            ('no_blocks', 'no_address_relations', 'no_addresses',
+             'no_clusters', 'no_transactions', 'no_tags', 'timestamp'),
+            ('timestamp',), ()),
+        'exchange_rates': (
+            ('height', 'eur', 'usd'), ('height',), ()),
+        'address': (
+            ('address_prefix', 'address', 'address_id', 'first_tx',
+             'last_tx', 'no_incoming_txs', 'no_outgoing_txs',
+             'total_received', 'total_spent', 'in_degree', 'out_degree'),
+            ('address_prefix',), ('address',)),
+        'address_by_id_group': (
+            ('address_id_group', 'address_id', 'address'),
+            ('address_id_group',), ('address_id',)),
+        'address_tags': (
+            ('address', 'label', 'category', 'abuse', 'tagpack_uri',
+             'source', 'lastmod', 'active_address'),
+            ('address',), ('label',)),
+        'address_cluster': (
+            ('address_id_group', 'address_id', 'cluster'),
+            ('address_id_group',), ('address_id',)),
+        'address_transactions': (
+            ('address_id_group', 'address_id', 'tx_hash', 'height',
+             'timestamp', 'value'),
+            ('address_id_group', 'address_id'), ('tx_hash',)),
+        'address_outgoing_relations': (
+            ('src_address_id_group', 'src_address_id', 'dst_address_id',
+             'estimated_value', 'no_transactions', 'dst_properties',
+             'dst_labels', 'tx_list'),
+            ('src_address_id_group', 'src_address_id'),
+            ('dst_address_id',)),
+        'address_incoming_relations': (
+            ('dst_address_id_group', 'dst_address_id', 'src_address_id',
+             'estimated_value', 'no_transactions', 'src_properties',
+             'src_labels', 'tx_list'),
+            ('dst_address_id_group', 'dst_address_id'),
+            ('src_address_id',)),
+        'cluster': (
+            ('cluster_group', 'cluster', 'first_tx', 'last_tx', 'in_degree',
+             'out_degree', 'no_addresses', 'no_incoming_txs',
+             'no_outgoing_txs', 'total_received', 'total_spent'),
+            ('cluster_group',), ('cluster',)),
+        'cluster_tags': (
+            ('cluster_group', 'cluster', 'address_id', 'label', 'category',
+             'abuse', 'tagpack_uri', 'source', 'lastmod'),
+            ('cluster_group', 'cluster'), ('address_id', 'label')),
+        'cluster_addresses': (
+            ('cluster_group', 'cluster', 'address_id', 'first_tx',
+             'last_tx', 'no_incoming_txs', 'no_outgoing_txs',
+             'total_received', 'total_spent', 'in_degree', 'out_degree'),
+            ('cluster_group', 'cluster'), ('address_id',)),
+        'cluster_outgoing_relations': (
+            ('src_cluster_group', 'src_cluster', 'dst_cluster', 'value',
+             'no_transactions', 'dst_properties', 'dst_labels'),
+            ('src_cluster_group', 'src_cluster'), ('dst_cluster',)),
+        'cluster_incoming_relations': (
+            ('dst_cluster_group', 'dst_cluster', 'src_cluster', 'value',
+             'no_transactions', 'src_properties', 'src_labels'),
+            ('dst_cluster_group', 'dst_cluster'), ('src_cluster',)),
+        'tag_by_label': (
+            ('label_norm_prefix', 'label_norm', 'label', 'address',
+             'category', 'abuse', 'tagpack_uri', 'source', 'lastmod',
+             'active_address', 'currency'),
+            ('label_norm_prefix',), ('label_norm', 'address')),
+    },
+    'tagpacks': {
+        'concept_by_taxonomy_id': (
+            ('taxonomy', 'id', 'label', 'uri', 'description'),
+            ('taxonomy',), ('id',)),
+        'taxonomy_by_key': (
+            ('key', 'uri'), ('key',), ()),
+    }
+}
+
+
+@lru_cache(maxsize=256)
+def row_class(colnames):
+    return namedtuple('Row', colnames)
+
+
+class Table:
+    """ Rows of a table, grouped by partition key and sorted by clustering
+    key """
+
+    def __init__(self, columns, partition_key, clustering_key):
+        self.columns = columns
+        self.index = {column: i for i, column in enumerate(columns)}
+        self.partition_key = partition_key
+        self.clustering_key = clustering_key
+        self.partitions = dict()
+
+    def insert(self, rows):
+        for row in rows:
+            row = tuple(row.get(column) for column in self.columns)
+            key = tuple(row[self.index[c]] for c in self.partition_key)
+            self.partitions.setdefault(key, []).append(row)
+        clustering = [self.index[c] for c in self.clustering_key]
+        if clustering:
+            for partition in self.partitions.values():
+                partition.sort(key=lambda r: [r[i] for i in clustering])
+
+    def rows(self, restrictions):
+        """ Returns the rows matching all (column, operator, value)
+        restrictions, reading only the restricted partitions if possible """
+        values = {column: [value] if operator == '=' else list(value)
+                  for column, operator, value in restrictions
+                  if operator in ('=', 'IN')}
+        if all(column in values for column in self.partition_key):
+            keys = product(*[values[column]
+                             for column in self.partition_key])
+            rows = [row for key in keys
+                    for row in self.partitions.get(key, [])]
+        else:
+            rows = [row for partition in self.partitions.values()
+                    for row in partition]
+        for column, operator, value in restrictions:
+            i = self.index[column]
+            if operator == '=':
+                rows = [row for row in rows if row[i] == value]
+            elif operator == '>=':
+                rows = [row for row in rows if row[i] >= value]
+            elif operator == '<=':
+                rows = [row for row in rows if row[i] <= value]
+            else:
+                # values may be unhashable, e.g. bytearrays
+                value = list(value)
+                rows = [row for row in rows if row[i] in value]
+        return rows
+
+
+class Statement:
+    """ Parsed catalog statement """
+
+    def __init__(self, query):
+        match = STATEMENT_PATTERN.match(' '.join(query.split()))
+        if match is None:
+            raise ValueError('Unsupported statement: {}'.format(query))
+        self.table = match.group('table')
+        columns = match.group('columns')
+        self.columns = None if columns == '*' else \
+            tuple(column.strip() for column in columns.split(','))
+        self.restrictions = []
+        if match.group('where'):
+            for restriction in match.group('where').split(' AND '):
+                restriction = RESTRICTION_PATTERN.match(restriction.strip())
+                if restriction is None:
+                    raise ValueError('Unsupported statement: {}'
+                                     .format(query))
+                self.restrictions.append(restriction.groups())
+        self.group_by = tuple(column.strip() for column
+                              in match.group('group_by').split(',')) \
+            if match.group('group_by') else ()
+        self.limit = match.group('limit')
+        if self.limit not in (None, '?'):
+            self.limit = int(self.limit)
+
+    def execute(self, table, params):
+        params = list(params or [])
+        limit = self.limit
+        expected = len(self.restrictions) + (limit == '?')
+        if len(params) != expected:
+            raise ValueError('Expected {} parameters, got {}'.format(
+                expected, len(params)))
+        if limit == '?':
+            limit = params.pop()
+            if limit <= 0:
+                raise ValueError('LIMIT must be strictly positive')
+        rows = table.rows([(column, operator, value) for
+                           (column, operator), value
+                           in zip(self.restrictions, params)])
+        if self.group_by:
+            groups = set()
+            indexes = [table.index[column] for column in self.group_by]
+            grouped = []
+            for row in rows:
+                key = tuple(row[i] for i in indexes)
+                if key not in groups:
+                    groups.add(key)
+                    grouped.append(row)
+            rows = grouped
+        if limit is not None:
+            rows = rows[:limit]
+        return rows
+
+    def get_columns(self, table):
+        return self.columns or table.columns
+
+
+@lru_cache(maxsize=256)
+def parse(query):
+    return Statement(query)
+
+
+def encode_paging_state(position):
+    return position.to_bytes(8, byteorder='big')
+
+
+def decode_paging_state(paging_state):
+    if paging_state is None:
+        return 0
+    return int.from_bytes(paging_state, byteorder='big')
+
+
+class ResultSet:
+    """ Result of a query, paged like the driver's ResultSet: iterating
+    beyond the current page fetches the following pages, each of which is
+    passed to the callbacks of the query's future like a driver response """
+
+    def __init__(self, rows, fetch_size=None, paging_state=None):
+        self.fetch_size = fetch_size or DEFAULT_FETCH_SIZE
+        self._start = decode_paging_state(paging_state)
+        self._rows = rows
+        self._list = None
+        end = self._start + self.fetch_size
+        self.current_rows = rows[self._start:end]
+        self.paging_state = encode_paging_state(end) if end < len(rows) \
+            else None
+        self.callbacks = []
+
+    @property
+    def has_more_pages(self):
+        return self.paging_state is not None
+
+    def one(self):
+        return self.current_rows[0] if self.current_rows else None
+
+    def pages(self):
+        yield self.current_rows
+        position = self._start + self.fetch_size
+        while position < len(self._rows):
+            page = self._rows[position:position + self.fetch_size]
+            for callback in self.callbacks:
+                callback(page)
+            yield page
+            position += self.fetch_size
+
+    def __iter__(self):
+        if self._list is not None:
+            return iter(self._list)
+        return (row for page in self.pages() for row in page)
+
+    def __getitem__(self, i):
+        # like the driver, indexing fetches all pages
+        if self._list is None:
+            self._list = list(self)
+        return self._list[i]
+
+    def __bool__(self):
+        return len(self.current_rows) > 0
+
+
+class ResponseFuture:
+    """ Completed future of a query, with the interface of the driver's
+    ResponseFuture """
+
+    def __init__(self, result=None, exception=None):
+        self._result = result
+        self._exception = exception
+
+    def result(self):
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def add_callbacks(self, callback, errback):
+        if self._exception is not None:
+            errback(self._exception)
+        else:
+            # like the driver, pass the rows of every fetched page
+            callback(self._result.current_rows)
+            self._result.callbacks.append(callback)
+
+
+class MemoryBackend(StorageBackend):
+    """ Serves the query catalog from a synthetic in-memory dataset """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.keyspaces = dict()
+
+    def connect(self, app):
+        """ Generates the datasets of all configured currencies """
+        for currency in get_supported_currencies():
+            self.get_table(currency, 'raw', 'block')
+        if 'tagpacks' in current_app.config['MAPPING']:
+            self.get_table(None, 'tagpacks', 'taxonomy_by_key')
+
+    def shutdown(self):
+        with self._lock:
+            self.keyspaces = dict()
+
+    def load(self, currency, keyspace_type):
+        options = dict(Config.MEMORY_DATASET,
+                       **current_app.config.get('MEMORY_DATASET', {}))
+        if keyspace_type == 'tagpacks':
+            keyspaces = {'tagpacks': synthetic.generate_tagpacks()}
+        else:
+            keyspaces = synthetic.generate(currency, options)
+        for ks_type, rows in keyspaces.items():
+            keyspace = get_keyspace_mapping(currency, ks_type)
+            tables = dict()
+            for name, schema in TABLES[ks_type].items():
+                tables[name] = Table(*schema)
+                tables[name].insert(rows.get(name, []))
+            self.keyspaces[keyspace] = tables
+
+    def get_table(self, currency, keyspace_type, name):
+        keyspace = get_keyspace_mapping(currency, keyspace_type)
+        if keyspace not in self.keyspaces:
+            with self._lock:
+                if keyspace not in self.keyspaces:
+                    current_app.logger.info(
+                        "Generating synthetic dataset for keyspace {}."
+                        .format(keyspace))
+                    self.load(currency, keyspace_type)
+        return self.keyspaces[keyspace][name]
+
+    def execute_async(self, currency, keyspace_type, name, params=None,
+                      fetch_size=None, paging_state=None, profile=None,
+                      trace=False):
+        try:
+            statement = parse(get_query(keyspace_type, name))
+            table = self.get_table(currency, keyspace_type, statement.table)
+            rows = statement.execute(table, params)
+            columns = statement.get_columns(table)
+            indexes = [table.index[column] for column in columns]
+            if get_row_factory(name) == 'tuple':
+                rows = [tuple(row[i] for i in indexes) for row in rows]
+            else:
+                make = row_class(columns)._make
+                rows = [make(row[i] for i in indexes) for row in rows]
+            return ResponseFuture(ResultSet(rows, fetch_size, paging_state))
+        except ValueError as e:
+            return ResponseFuture(exception=e)
+
+    def get_columns(self, currency, keyspace_type, name):
+        statement = parse(get_query(keyspace_type, name))
+        table = self.get_table(currency, keyspace_type, statement.table)
+        return {column: i for i, column
+                in enumerate(statement.get_columns(table))}
@@ -0,0 +1,166 @@
+"""
+Catalog of all CQL statements issued by the service layer.
+
+Statements are referenced by keyspace type and name and are prepared once
+per worker and keyspace (see gsrest.db.cassandra.get_statement). Each
+statement runs with the execution profile assigned in PROFILES and returns
+its rows in the format assigned in ROW_FACTORIES.
+"""
+
+RELATIONS = (('outgoing', 'src', 'dst'), ('incoming', 'dst', 'src'))
+
+
+def _relation_queries():
+    queries = dict()
+    for (table, this, that) in RELATIONS:
+        basequery = "SELECT * FROM cluster_{}_relations WHERE " \
+                    "{}_cluster_group = ? AND " \
+                    "{}_cluster = ?".format(table, this, this)
+        queries['cluster_{}_relations'.format(table)] = basequery
+        queries['cluster_{}_relations_targets'.format(table)] = \
+            basequery.replace('*', '{}_cluster'.format(that)) + \
+            " AND {}_cluster IN ?".format(that)
+        queries['cluster_{}_relation'.format(table)] = \
+            basequery + " AND {}_cluster = ?".format(that)
+    return queries
+
+
+QUERIES = {
+    'raw': {
+        'block':
+            "SELECT * FROM block WHERE height = ?",
+        'blocks':
+            "SELECT * FROM block",
+        'block_transactions':
+            "SELECT * FROM block_transactions WHERE height = ?",
+        'transaction':
+            "SELECT * FROM transaction WHERE tx_prefix = ? AND tx_hash = ?",
+        'transactions':
+            "SELECT * FROM transaction",
+        'transaction_hashes':
+            "SELECT tx_hash FROM transaction WHERE tx_prefix = ? AND "
+            "tx_hash >= ? AND tx_hash <= ? LIMIT ?",
+        'all_transaction_hashes':
+            "SELECT tx_hash FROM transaction",
+    },
+    'transformed': dict({
+        'summary_statistics':
+            "SELECT * FROM summary_statistics LIMIT 1",
+        'exchange_rates':
+            "SELECT * FROM exchange_rates WHERE height = ?",
+        'exchange_rates_by_heights':
+            "SELECT * FROM exchange_rates WHERE height IN ?",
+        'all_exchange_rates':
+            "SELECT * FROM exchange_rates",
+        'address':
+            "SELECT * FROM address WHERE address_prefix = ? AND address = ?",
+        'address_id':
+            "SELECT address_id FROM address WHERE address_prefix = ? "
+            "AND address = ?",
+        'addresses_by_prefix':
+            "SELECT address FROM address WHERE address_prefix = ? AND "
+            "address >= ? LIMIT ?",
+        'address_by_id_group':
+            "SELECT * FROM address_by_id_group WHERE "
+            "address_id_group = ? AND address_id = ?",
+        'addresses_by_id_group':
+            "SELECT address_id, address FROM address_by_id_group WHERE "
+            "address_id_group = ?",
+        'addresses_by_ids':
+            "SELECT address_id, address FROM address_by_id_group WHERE "
+            "address_id_group = ? AND address_id IN ?",
+        'address_tags':
+            "SELECT * FROM address_tags WHERE address = ?",
+        'address_cluster':
+            "SELECT cluster FROM address_cluster WHERE "
+            "address_id_group = ? AND address_id = ?",
+        'address_transactions':
+            "SELECT * FROM address_transactions WHERE address_id = ? "
+            "AND address_id_group = ?",
+        'address_transactions_by_hashes':
+            "SELECT * FROM address_transactions WHERE "
+            "address_id_group = ? AND address_id = ? AND tx_hash IN ?",
+        'address_outgoing_relations':
+            "SELECT * FROM address_outgoing_relations WHERE "
+            "src_address_id_group = ? AND src_address_id = ?",
+        'address_incoming_relations':
+            "SELECT * FROM address_incoming_relations WHERE "
+            "dst_address_id_group = ? AND dst_address_id = ?",
+        'address_outgoing_relation_txs':
+            "SELECT tx_list FROM address_outgoing_relations WHERE "
+            "src_address_id_group = ? AND src_address_id = ? AND "
+            "dst_address_id = ?",
+        'cluster':
+            "SELECT * FROM cluster WHERE cluster_group = ? AND cluster = ?",
+        'cluster_tags':
+            "SELECT * FROM cluster_tags WHERE cluster_group = ? AND "
+            "cluster = ?",
+        'cluster_addresses':
+            "SELECT * FROM cluster_addresses WHERE cluster_group = ? AND "
+            "cluster = ?",
+        'tag_by_label':
+            "SELECT * FROM tag_by_label WHERE label_norm_prefix = ? AND "
+            "label_norm = ?",
+        'labels_by_prefix':
+            "SELECT label, label_norm, currency FROM tag_by_label WHERE "
+            "label_norm_prefix = ? AND label_norm >= ? "
+            "GROUP BY label_norm_prefix, label_norm LIMIT ?",
+    }, **_relation_queries()),
+    'tagpacks': {
+        'concept_by_taxonomy_id':
+            "SELECT * FROM concept_by_taxonomy_id WHERE taxonomy = ?",
+        'taxonomy_by_key':
+            "SELECT * FROM taxonomy_by_key LIMIT 100",
+    }
+}
+
+
+# execution profiles (see CASSANDRA_EXECUTION_PROFILES) of the queries;
+# queries not listed here run with the default profile
+PROFILES = {
+    'point': (
+        'block', 'transaction', 'summary_statistics', 'exchange_rates',
+        'exchange_rates_by_heights',
+        'address', 'address_id', 'address_by_id_group', 'addresses_by_ids',
+        'address_tags',
+        'address_cluster', 'address_outgoing_relation_txs',
+        'address_transactions_by_hashes', 'cluster', 'cluster_tags',
+        'cluster_outgoing_relation', 'cluster_incoming_relation',
+        'tag_by_label', 'concept_by_taxonomy_id', 'taxonomy_by_key'),
+    'scan': (
+        'blocks', 'block_transactions', 'transactions', 'transaction_hashes',
+        'addresses_by_prefix', 'labels_by_prefix', 'all_exchange_rates',
+        'addresses_by_id_group', 'all_transaction_hashes'),
+}
+
+QUERY_PROFILES = {name: profile for profile, names in PROFILES.items()
+                  for name in names}
+
+
+def get_profile(name):
+    return QUERY_PROFILES.get(name, 'default')
+
+
+# queries on hot paths return plain tuples, which are accessed via the
+# column indexes of the prepared statement (see get_columns); all other
+# queries return named tuples
+ROW_FACTORIES = {
+    'tuple': ('exchange_rates', 'exchange_rates_by_heights',
+              'all_exchange_rates', 'address_transactions',
+              'address_transactions_by_hashes'),
+}
+
+QUERY_ROW_FACTORIES = {name: row_factory
+                       for row_factory, names in ROW_FACTORIES.items()
+                       for name in names}
+
+
+def get_row_factory(name):
+    return QUERY_ROW_FACTORIES.get(name, 'named')
+
+
+def get_query(keyspace_type, name):
+    try:
+        return QUERIES[keyspace_type][name]
+    except KeyError:
+        raise ValueError("Unknown query: {} {}".format(keyspace_type, name))
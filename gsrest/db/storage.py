@@ -0,0 +1,215 @@
+"""
+Storage backends serving the query catalog (see gsrest.db.queries).
+
+The service layer issues named queries through the functions of this module,
+which dispatch to the backend selected by the STORAGE_BACKEND config:
+
+    'cassandra'  the Cassandra cluster (gsrest.db.cassandra, default)
+    'memory'     an in-process stand-in serving a synthetic dataset
+                 (gsrest.db.memory), for tests, benchmarks and local runs
+
+A backend returns driver-compatible results: futures with result() and
+add_callbacks(), and result sets with current_rows, paging_state, one(),
+iteration over all pages and indexing.
+"""
+import atexit
+from importlib import import_module
+
+from flask import current_app, abort
+
+from gsrest.config import Config
+from gsrest.util.exceptions import MissingConfigError
+from gsrest.util.metrics import observe_query
+from gsrest.util.slow_queries import sample_trace, record_query
+from gsrest.util.timing import timed, count_query, count_rows
+
+BACKENDS = {
+    'cassandra': 'gsrest.db.cassandra.CassandraBackend',
+    'memory': 'gsrest.db.memory.MemoryBackend'
+}
+
+
+class StorageBackend:
+    """ Interface of a storage backend """
+
+    def connect(self, app):
+        """ Prepares the backend for serving requests of the current
+        worker process """
+
+    def shutdown(self):
+        """ Releases all resources of the current worker process """
+
+    def execute_async(self, currency, keyspace_type, name, params=None,
+                      fetch_size=None, paging_state=None, profile=None,
+                      trace=False):
+        """ Starts a named query of the catalog and returns its future;
+        backends supporting it record a server-side trace if requested """
+        raise NotImplementedError
+
+    def get_columns(self, currency, keyspace_type, name):
+        """ Returns the column indexes of the rows of a named query """
+        raise NotImplementedError
+
+    def get_stats(self):
+        """ Returns the connection pool state of the current worker
+        process: open connections and requests in flight per host under
+        'pool', and driver statistics under 'driver' """
+        return dict()
+
+
+def create_backend(name):
+    if name not in BACKENDS:
+        raise ValueError('Unknown storage backend: {}'.format(name))
+    module, cls = BACKENDS[name].rsplit('.', 1)
+    return getattr(import_module(module), cls)()
+
+
+def init_app(app):
+    backend = create_backend(app.config.get('STORAGE_BACKEND',
+                                            Config.STORAGE_BACKEND))
+    app.extensions['storage'] = backend
+    atexit.register(backend.shutdown)
+
+
+def get_backend(app=None):
+    app = app or current_app
+    return app.extensions['storage']
+
+
+def connect(app):
+    """ Connects the current worker process to the storage backend """
+    with app.app_context():
+        get_backend(app).connect(app)
+
+
+def shutdown(app):
+    get_backend(app).shutdown()
+
+
+def get_keyspace_mapping_definition():
+    if 'MAPPING' not in current_app.config:
+        raise MissingConfigError('Missing config property: MAPPING')
+    return current_app.config['MAPPING']
+
+
+def keyspaces():
+    """ Returns all keyspaces referenced by the MAPPING config """
+    result = []
+    for keyspace in get_keyspace_mapping_definition().values():
+        if isinstance(keyspace, str):
+            keyspace = [keyspace]
+        result += [k for k in keyspace if k not in result]
+    return result
+
+
+def get_supported_currencies():
+    ks_mapping = get_keyspace_mapping_definition()
+    return dict(filter(lambda elem: elem[0] != 'tagpacks',
+                       ks_mapping.items())).keys()
+
+
+def get_keyspace_mapping(currency, keyspace_type):
+    ks_mapping = get_keyspace_mapping_definition()
+    if currency is None and keyspace_type == 'tagpacks':
+        if 'tagpacks' not in ks_mapping:
+            raise MissingConfigError('Missing config property: tagpacks')
+        return ks_mapping['tagpacks']
+    if currency is not None and keyspace_type in ('raw', 'transformed'):
+        if currency not in ks_mapping:
+            abort(404, 'Unknown currency in config: {}'.format(currency))
+        if keyspace_type == 'raw':
+            return ks_mapping[currency][0]
+        if keyspace_type == 'transformed':
+            return ks_mapping[currency][1]
+    else:
+        raise ValueError("Invalid keyspace request: {} {}".format(
+            currency, keyspace_type))
+
+
+class QueryFuture:
+    """ Deferred result of one or more asynchronously executed queries.
+
+    The given futures (backend response futures or other query futures) are
+    joined when result() is called, and their results are passed to the
+    callback, which runs in the calling thread. Independent queries can thus
+    be started at once and joined later.
+    """
+
+    def __init__(self, futures, callback):
+        self._futures = futures
+        self._callback = callback
+        self._done = False
+        self._value = None
+
+    def result(self):
+        if not self._done:
+            self._value = self._callback(*[wait(future)
+                                           for future in self._futures])
+            self._done = True
+        return self._value
+
+    @staticmethod
+    def resolved(value):
+        """ Returns a query future holding an already known value """
+        return QueryFuture([], lambda: value)
+
+
+def wait(future):
+    """ Waits for a backend or query future and returns its result """
+    if isinstance(future, QueryFuture):
+        return future.result()
+    with timed('db'):
+        result = future.result()
+    count_rows(result)
+    return result
+
+
+def get_columns(currency, keyspace_type, name):
+    """ Returns the column indexes of the rows of a named query; used to
+    access rows of queries returning plain tuples """
+    return get_backend().get_columns(currency, keyspace_type, name)
+
+
+def execute_async(currency, keyspace_type, name, params=None,
+                  fetch_size=None, paging_state=None, profile=None):
+    """ Starts a named query of the catalog and returns its response
+    future """
+    count_query()
+    trace = sample_trace()
+    future = get_backend().execute_async(currency, keyspace_type, name,
+                                         params, fetch_size, paging_state,
+                                         profile, trace)
+    observe_query(name, future)
+    record_query(name, get_keyspace_mapping(currency, keyspace_type), params,
+                 future, trace)
+    return future
+
+
+def join(*futures):
+    """ Waits for all given futures and returns their results """
+    return [wait(future) for future in futures]
+
+
+def execute_many(currency, keyspace_type, name, params_list,
+                 concurrency=100):
+    """ Executes a named query once per parameter list, with at most
+    `concurrency` queries in flight. Failed queries yield None. """
+    results = []
+    for i in range(0, len(params_list), concurrency):
+        futures = [execute_async(currency, keyspace_type, name, params)
+                   for params in params_list[i:i + concurrency]]
+        for future in futures:
+            try:
+                results.append(wait(future))
+            except Exception as e:
+                current_app.logger.warning(
+                    'Query {} failed: {}'.format(name, e))
+                results.append(None)
+    return results
+
+
+def execute(currency, keyspace_type, name, params=None, fetch_size=None,
+            paging_state=None, profile=None):
+    """ Executes a named query of the catalog """
+    return wait(execute_async(currency, keyspace_type, name, params,
+                              fetch_size, paging_state, profile))
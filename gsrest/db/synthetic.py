@@ -0,0 +1,389 @@
+"""
+Synthetic GraphSense dataset.
+
+Generates a small, internally consistent ledger for the memory storage
+backend (see gsrest.db.memory): blocks and transactions, the addresses and
+clusters they touch, their relations, exchange rates, tags and summary
+statistics. The dataset is fully determined by the currency and the
+MEMORY_DATASET options, so every worker generates the same data.
+"""
+import random
+import zlib
+from collections import namedtuple
+
+from gsrest.util.checks import LABEL_PREFIX_LENGTH
+from gsrest.util.string_edit import alphanumeric_lower
+
+# must match gsrest.service.common_service.ADDRESS_PREFIX_LENGTH,
+# gsrest.service.txs_service.TX_PREFIX_LENGTH and
+# gsrest.service.common_service.BUCKET_SIZE
+ADDRESS_PREFIX_LENGTH = 5
+TX_PREFIX_LENGTH = 5
+BUCKET_SIZE = 25000
+
+GENESIS_TIMESTAMP = 1231006505
+BLOCK_INTERVAL = 600
+BLOCK_REWARD = 50 * 10 ** 8
+BASE58 = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+CATEGORIES = ('exchange', 'miner', 'market', 'wallet_service', 'mixing',
+              'gambling')
+ABUSES = ('scam', 'ransomware', 'sextortion')
+
+# user defined types of the GraphSense schemas
+TxSummary = namedtuple('tx_summary', ('height', 'timestamp', 'tx_hash'))
+Value = namedtuple('value', ('value', 'eur', 'usd'))
+TxInputOutput = namedtuple('tx_input_output', ('address', 'value'))
+BlockTxSummary = namedtuple('tx_summary', ('tx_hash', 'no_inputs',
+                                           'no_outputs', 'total_input',
+                                           'total_output'))
+Properties = namedtuple('address_summary', ('total_received',
+                                            'total_spent'))
+
+
+def get_id_group(id_):
+    return id_ // BUCKET_SIZE
+
+
+class Accumulator:
+    """ Sum of crypto values and their fiat values at transaction time """
+
+    def __init__(self):
+        self.value = 0
+        self.eur = 0.0
+        self.usd = 0.0
+
+    def add(self, value, rates):
+        self.value += value
+        self.eur += value * rates['eur'] * 1e-8
+        self.usd += value * rates['usd'] * 1e-8
+
+    def merge(self, other):
+        self.value += other.value
+        self.eur += other.eur
+        self.usd += other.usd
+
+    def to_value(self):
+        return Value(self.value, round(self.eur, 2), round(self.usd, 2))
+
+
+class Stats:
+    """ Activity of an address or cluster """
+
+    def __init__(self):
+        self.first_tx = None
+        self.last_tx = None
+        self.no_incoming_txs = 0
+        self.no_outgoing_txs = 0
+        self.total_received = Accumulator()
+        self.total_spent = Accumulator()
+        self.in_degree = 0
+        self.out_degree = 0
+
+    def add_tx(self, tx, received, spent, rates):
+        if self.first_tx is None or tx.height < self.first_tx.height:
+            self.first_tx = tx
+        if self.last_tx is None or tx.height >= self.last_tx.height:
+            self.last_tx = tx
+        if received:
+            self.no_incoming_txs += 1
+            self.total_received.add(received, rates)
+        if spent:
+            self.no_outgoing_txs += 1
+            self.total_spent.add(spent, rates)
+
+    def merge(self, other):
+        if self.first_tx is None or \
+                other.first_tx.height < self.first_tx.height:
+            self.first_tx = other.first_tx
+        if self.last_tx is None or \
+                other.last_tx.height >= self.last_tx.height:
+            self.last_tx = other.last_tx
+        self.no_incoming_txs += other.no_incoming_txs
+        self.no_outgoing_txs += other.no_outgoing_txs
+        self.total_received.merge(other.total_received)
+        self.total_spent.merge(other.total_spent)
+
+    def properties(self):
+        return Properties(self.total_received.to_value(),
+                          self.total_spent.to_value())
+
+    def to_dict(self):
+        return {'first_tx': self.first_tx, 'last_tx': self.last_tx,
+                'no_incoming_txs': self.no_incoming_txs,
+                'no_outgoing_txs': self.no_outgoing_txs,
+                'total_received': self.total_received.to_value(),
+                'total_spent': self.total_spent.to_value(),
+                'in_degree': self.in_degree,
+                'out_degree': self.out_degree}
+
+
+class Relation:
+    """ Aggregated flows between two addresses or clusters """
+
+    def __init__(self):
+        self.value = Accumulator()
+        self.tx_list = []
+
+    def add(self, tx_hash, value, rates):
+        self.value.add(value, rates)
+        if tx_hash not in self.tx_list:
+            self.tx_list.append(tx_hash)
+
+
+def random_address(rng, currency):
+    prefix = '1' if currency == 'btc' else currency[0]
+    return prefix + ''.join(rng.choice(BASE58) for _ in range(33))
+
+
+def split(rng, total, parts):
+    """ Splits an amount into the given number of positive parts """
+    if parts == 1 or total < parts:
+        return [total] + [0] * (parts - 1)
+    cuts = sorted(rng.sample(range(1, total), parts - 1))
+    return [b - a for a, b in zip([0] + cuts, cuts + [total])]
+
+
+def generate(currency, options):
+    """ Returns the rows of all tables of the raw and transformed keyspaces
+    of a currency, keyed by keyspace type and table name """
+    rng = random.Random(options['seed'] ^ zlib.crc32(currency.encode()))
+    no_blocks = options['no_blocks']
+    no_addresses = options['no_addresses']
+    no_clusters = min(options['no_clusters'], no_addresses)
+
+    # address ids start at 1; the services treat id 0 as missing
+    addresses = [None]
+    seen = set()
+    while len(addresses) <= no_addresses:
+        address = random_address(rng, currency)
+        if address not in seen:
+            seen.add(address)
+            addresses.append(address)
+    address_ids = range(1, no_addresses + 1)
+    # every cluster contains at least one address
+    clusters = [None] + list(range(no_clusters)) + \
+        [rng.randrange(no_clusters)
+         for _ in range(no_addresses - no_clusters)]
+
+    raw = {'block': [], 'block_transactions': [], 'transaction': []}
+    rates = []
+    eur = 100.0
+    address_stats = [Stats() for _ in addresses]
+    address_txs = []
+    relations = dict()
+    for height in range(no_blocks):
+        timestamp = GENESIS_TIMESTAMP + height * BLOCK_INTERVAL
+        eur = round(max(1.0, eur * rng.uniform(0.95, 1.06)), 2)
+        rates.append({'height': height, 'eur': eur,
+                      'usd': round(eur * 1.12, 2)})
+        block_txs = []
+        for i in range(options['no_txs_per_block']):
+            tx_hash = bytes(rng.getrandbits(8) for _ in range(32))
+            tx = TxSummary(height, timestamp, tx_hash)
+            if i == 0:
+                inputs = []
+                total_input = 0
+                total_output = BLOCK_REWARD
+            else:
+                inputs = rng.sample(address_ids,
+                                    min(rng.randint(1, 3), no_addresses))
+                total_input = rng.randint(10 ** 5, 10 ** 10)
+                total_output = total_input - rng.randint(0, 10 ** 4)
+            outputs = rng.sample(address_ids,
+                                 min(rng.randint(1, 3), no_addresses))
+            input_values = split(rng, total_input, len(inputs)) \
+                if inputs else []
+            output_values = split(rng, total_output, len(outputs))
+
+            flows = dict()
+            for address_id, value in zip(inputs, input_values):
+                flows.setdefault(address_id, [0, 0])[1] += value
+            for address_id, value in zip(outputs, output_values):
+                flows.setdefault(address_id, [0, 0])[0] += value
+            for address_id, (received, spent) in flows.items():
+                address_stats[address_id].add_tx(tx, received, spent,
+                                                 rates[height])
+                address_txs.append({
+                    'address_id_group': get_id_group(address_id),
+                    'address_id': address_id, 'tx_hash': tx_hash,
+                    'height': height, 'timestamp': timestamp,
+                    'value': received - spent})
+            for src, in_value in zip(inputs, input_values):
+                for dst, out_value in zip(outputs, output_values):
+                    if src != dst:
+                        relations.setdefault((src, dst), Relation()).add(
+                            tx_hash, out_value * in_value // total_input,
+                            rates[height])
+
+            raw['transaction'].append({
+                'tx_prefix': tx_hash.hex()[:TX_PREFIX_LENGTH],
+                'tx_hash': tx_hash, 'height': height,
+                'timestamp': timestamp, 'coinbase': not inputs,
+                'total_input': total_input, 'total_output': total_output,
+                'inputs': [TxInputOutput([addresses[a]], v)
+                           for a, v in zip(inputs, input_values)],
+                'outputs': [TxInputOutput([addresses[a]], v)
+                            for a, v in zip(outputs, output_values)]})
+            block_txs.append(BlockTxSummary(tx_hash, len(inputs),
+                                            len(outputs), total_input,
+                                            total_output))
+        raw['block'].append({
+            'height': height,
+            'block_hash': bytes(rng.getrandbits(8) for _ in range(32)),
+            'no_transactions': len(block_txs), 'timestamp': timestamp})
+        raw['block_transactions'].append({'height': height,
+                                          'txs': block_txs})
+
+    # only addresses which took part in a transaction exist
+    active = [a for a in address_ids
+              if address_stats[a].first_tx is not None]
+    for (src, dst) in relations:
+        address_stats[src].out_degree += 1
+        address_stats[dst].in_degree += 1
+
+    tags = generate_tags(rng, currency, addresses, active,
+                         options['no_tags'])
+    labels = dict()
+    for tag in tags:
+        labels.setdefault(tag['address_id'], []).append(tag['label'])
+
+    cluster_stats = dict()
+    cluster_members = dict()
+    for address_id in active:
+        cluster = clusters[address_id]
+        cluster_members.setdefault(cluster, []).append(address_id)
+        cluster_stats.setdefault(cluster, Stats()).merge(
+            address_stats[address_id])
+    cluster_relations = dict()
+    for (src, dst), relation in relations.items():
+        key = (clusters[src], clusters[dst])
+        if key[0] != key[1]:
+            cluster_relation = cluster_relations.setdefault(key, Relation())
+            cluster_relation.value.merge(relation.value)
+            for tx_hash in relation.tx_list:
+                if tx_hash not in cluster_relation.tx_list:
+                    cluster_relation.tx_list.append(tx_hash)
+    for (src, dst) in cluster_relations:
+        cluster_stats[src].out_degree += 1
+        cluster_stats[dst].in_degree += 1
+    cluster_labels = dict()
+    for address_id, address_labels in labels.items():
+        cluster_labels.setdefault(clusters[address_id], []) \
+            .extend(address_labels)
+
+    transformed = {
+        'summary_statistics': [{
+            'no_blocks': no_blocks,
+            'no_address_relations': len(relations),
+            'no_addresses': len(active),
+            'no_clusters': len(cluster_stats),
+            'no_transactions': len(raw['transaction']),
+            'no_tags': len(tags),
+            'timestamp': GENESIS_TIMESTAMP +
+            (no_blocks - 1) * BLOCK_INTERVAL}],
+        'exchange_rates': rates,
+        'address': [dict(address_stats[a].to_dict(),
+                         address_prefix=addresses[a][:ADDRESS_PREFIX_LENGTH],
+                         address=addresses[a], address_id=a)
+                    for a in active],
+        'address_by_id_group': [{'address_id_group': get_id_group(a),
+                                 'address_id': a, 'address': addresses[a]}
+                                for a in active],
+        'address_cluster': [{'address_id_group': get_id_group(a),
+                             'address_id': a, 'cluster': clusters[a]}
+                            for a in active],
+        'address_transactions': address_txs,
+        'address_outgoing_relations': [{
+            'src_address_id_group': get_id_group(src),
+            'src_address_id': src, 'dst_address_id': dst,
+            'estimated_value': relation.value.to_value(),
+            'no_transactions': len(relation.tx_list),
+            'dst_properties': address_stats[dst].properties(),
+            'dst_labels': labels.get(dst, []),
+            'tx_list': relation.tx_list}
+            for (src, dst), relation in relations.items()],
+        'address_incoming_relations': [{
+            'dst_address_id_group': get_id_group(dst),
+            'dst_address_id': dst, 'src_address_id': src,
+            'estimated_value': relation.value.to_value(),
+            'no_transactions': len(relation.tx_list),
+            'src_properties': address_stats[src].properties(),
+            'src_labels': labels.get(src, []),
+            'tx_list': relation.tx_list}
+            for (src, dst), relation in relations.items()],
+        'cluster': [dict(stats.to_dict(), cluster_group=get_id_group(c),
+                         cluster=c, no_addresses=len(cluster_members[c]))
+                    for c, stats in cluster_stats.items()],
+        'cluster_addresses': [dict(address_stats[a].to_dict(),
+                                   cluster_group=get_id_group(c), cluster=c,
+                                   address_id=a)
+                              for c, members in cluster_members.items()
+                              for a in members],
+        'cluster_outgoing_relations': [{
+            'src_cluster_group': get_id_group(src), 'src_cluster': src,
+            'dst_cluster': dst, 'value': relation.value.to_value(),
+            'no_transactions': len(relation.tx_list),
+            'dst_properties': cluster_stats[dst].properties(),
+            'dst_labels': cluster_labels.get(dst, [])}
+            for (src, dst), relation in cluster_relations.items()],
+        'cluster_incoming_relations': [{
+            'dst_cluster_group': get_id_group(dst), 'dst_cluster': dst,
+            'src_cluster': src, 'value': relation.value.to_value(),
+            'no_transactions': len(relation.tx_list),
+            'src_properties': cluster_stats[src].properties(),
+            'src_labels': cluster_labels.get(src, [])}
+            for (src, dst), relation in cluster_relations.items()],
+        'address_tags': [dict(tag, active_address=True) for tag in tags],
+        'cluster_tags': [dict(tag, cluster_group=get_id_group(
+                                  clusters[tag['address_id']]),
+                              cluster=clusters[tag['address_id']])
+                         for tag in tags],
+        'tag_by_label': [dict(tag, label_norm=alphanumeric_lower(
+                                  tag['label']),
+                              label_norm_prefix=alphanumeric_lower(
+                                  tag['label'])[:LABEL_PREFIX_LENGTH],
+                              active_address=True,
+                              currency=currency.upper())
+                         for tag in tags],
+    }
+    return {'raw': raw, 'transformed': transformed}
+
+
+def generate_tags(rng, currency, addresses, active, no_tags):
+    tags = []
+    for i, address_id in enumerate(rng.sample(active,
+                                              min(no_tags, len(active)))):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        tags.append({
+            'address_id': address_id, 'address': addresses[address_id],
+            'label': '{} {}'.format(category.replace('_', ' ').title(), i),
+            'category': category,
+            'abuse': ABUSES[i % len(ABUSES)] if i % 5 == 0 else None,
+            'tagpack_uri': 'https://tagpacks.example.org/{}.yaml'
+                           .format(currency),
+            'source': 'https://example.org/{}'.format(i),
+            'lastmod': GENESIS_TIMESTAMP})
+    return tags
+
+
+def generate_tagpacks():
+    """ Returns the rows of all tables of the tagpacks keyspace """
+    concepts = [{'taxonomy': 'entity', 'id': category,
+                 'label': category.replace('_', ' ').title(),
+                 'uri': 'https://graphsense.info/taxonomy/entity#{}'
+                        .format(category),
+                 'description': 'Synthetic {} concept'.format(category)}
+                for category in CATEGORIES]
+    concepts += [{'taxonomy': 'abuse', 'id': abuse,
+                  'label': abuse.title(),
+                  'uri': 'https://graphsense.info/taxonomy/abuse#{}'
+                         .format(abuse),
+                  'description': 'Synthetic {} concept'.format(abuse)}
+                 for abuse in ABUSES]
+    return {
+        'concept_by_taxonomy_id': concepts,
+        'taxonomy_by_key': [
+            {'key': taxonomy,
+             'uri': 'https://graphsense.info/taxonomy/{}'.format(taxonomy)}
+            for taxonomy in ('entity', 'abuse')]
+    }
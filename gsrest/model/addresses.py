@@ -1,5 +1,6 @@
 from gsrest.model.blocks import ConvertedValues
-from gsrest.model.common import Values, compute_balance
+from gsrest.model.common import Values, compute_balance, compute_balances, \
+    convert_values
 from gsrest.model.txs import TxSummary
 
 
@@ -36,18 +37,30 @@ class Address:
 
 
 class AddressTx:
-    def __init__(self, address, height, timestamp, tx_hash, value,
-                 rates):
+    def __init__(self, address, height, timestamp, tx_hash, value):
         self.address = address
         self.height = height
         self.timestamp = timestamp
         self.tx_hash = tx_hash
-        self.value = ConvertedValues(value, rates).to_dict()
+        self.value = value
 
     @staticmethod
     def from_row(row, address, rates):
         return AddressTx(address, row.height, row.timestamp, row.tx_hash.hex(),
-                         row.value, rates)
+                         ConvertedValues(row.value, rates).to_dict())
+
+    @staticmethod
+    def from_tuples(rows, columns, address, rates):
+        """ Creates the models of plain tuple rows, given the column
+        indexes of the query and the RatesArray of the rows; all values are
+        converted at once """
+        height, timestamp, tx_hash = columns['height'], \
+            columns['timestamp'], columns['tx_hash']
+        values = convert_values([row[columns['value']] for row in rows],
+                                rates)
+        return [AddressTx(address, row[height], row[timestamp],
+                          row[tx_hash].hex(), value)
+                for row, value in zip(rows, values)]
 
     def to_dict(self):
         return self.__dict__
@@ -82,24 +95,36 @@ class ReceivedSpent:
 
 class AddressOutgoingRelations:
     def __init__(self, estimated_value, dst_address, no_txs, dst_properties,
-                 labels, rates):
+                 labels, balance):
         self.id = dst_address
         self.node_type = 'address'
         self.labels = labels
         self.received = Values(**dst_properties.total_received._asdict())\
             .to_dict()
-        self.balance = compute_balance(dst_properties.total_received.value,
-                                       dst_properties.total_spent.value,
-                                       rates)
+        self.balance = balance
         self.no_txs = no_txs
         self.estimated_value = Values(**estimated_value._asdict()).to_dict()
 
     @staticmethod
     def from_row(row, dst_address, rates):
-        return AddressOutgoingRelations(row.estimated_value,
-                                        dst_address, row.no_transactions,
-                                        row.dst_properties, row.dst_labels,
-                                        rates)
+        properties = row.dst_properties
+        return AddressOutgoingRelations(
+            row.estimated_value, dst_address, row.no_transactions,
+            properties, row.dst_labels,
+            compute_balance(properties.total_received.value,
+                            properties.total_spent.value, rates))
+
+    @staticmethod
+    def from_rows(rows, dst_addresses, rates):
+        """ Creates the models of rows and their dst addresses, given the
+        RatesArray of the rows; all balances are converted at once """
+        balances = compute_balances(
+            [row.dst_properties.total_received.value for row in rows],
+            [row.dst_properties.total_spent.value for row in rows], rates)
+        return [AddressOutgoingRelations(
+            row.estimated_value, address, row.no_transactions,
+            row.dst_properties, row.dst_labels, balance)
+            for row, address, balance in zip(rows, dst_addresses, balances)]
 
     def to_dict(self):
         return self.__dict__
@@ -107,24 +132,36 @@ class AddressOutgoingRelations:
 
 class AddressIncomingRelations:
     def __init__(self, estimated_value, src_address, no_txs, src_properties,
-                 labels, rates):
+                 labels, balance):
         self.id = src_address
         self.node_type = 'address'
         self.labels = labels
         self.received = Values(**src_properties.total_received._asdict())\
             .to_dict()
-        self.balance = compute_balance(src_properties.total_received.value,
-                                       src_properties.total_spent.value,
-                                       rates)
+        self.balance = balance
         self.no_txs = no_txs
         self.estimated_value = Values(**estimated_value._asdict()).to_dict()
 
     @staticmethod
     def from_row(row, src_address, rates):
-        return AddressIncomingRelations(row.estimated_value,
-                                        src_address, row.no_transactions,
-                                        row.src_properties, row.src_labels,
-                                        rates)
+        properties = row.src_properties
+        return AddressIncomingRelations(
+            row.estimated_value, src_address, row.no_transactions,
+            properties, row.src_labels,
+            compute_balance(properties.total_received.value,
+                            properties.total_spent.value, rates))
+
+    @staticmethod
+    def from_rows(rows, src_addresses, rates):
+        """ Creates the models of rows and their src addresses, given the
+        RatesArray of the rows; all balances are converted at once """
+        balances = compute_balances(
+            [row.src_properties.total_received.value for row in rows],
+            [row.src_properties.total_spent.value for row in rows], rates)
+        return [AddressIncomingRelations(
+            row.estimated_value, address, row.no_transactions,
+            row.src_properties, row.src_labels, balance)
+            for row, address, balance in zip(rows, src_addresses, balances)]
 
     def to_dict(self):
         return self.__dict__
@@ -1,4 +1,5 @@
-from gsrest.model.common import ConvertedValues
+from gsrest.model.common import ConvertedValues, RatesArray, \
+    convert_values
 
 
 class Block:
@@ -54,7 +55,14 @@ class BlockTxs:
 
     @staticmethod
     def from_row(row, rates):
-        tx_summaries = [BlockTxSummary.from_row(tx, rates).to_dict()
+        # all values are converted at once
+        totals = iter(convert_values(
+            [total for tx in row.txs
+             for total in (tx.total_input, tx.total_output)],
+            RatesArray.from_dict(rates)))
+        tx_summaries = [BlockTxSummary(tx.tx_hash.hex(), tx.no_inputs,
+                                       tx.no_outputs, next(totals),
+                                       next(totals)).to_dict()
                         for tx in row.txs]
 
         return BlockTxs(row.height, tx_summaries)
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class Values:
     """ Model representing values in different crypto- and fiat-currencies."""
 
@@ -23,7 +26,55 @@ class ConvertedValues(Values):
         return values
 
 
+class RatesArray:
+    """ Exchange rates of a batch of values: one row per value (or a single
+    row for all values), one column per fiat currency """
+
+    def __init__(self, fiat_currencies, rates):
+        self.fiat_currencies = tuple(fiat_currencies)
+        self.rates = np.asarray(rates, dtype=np.float64) \
+            .reshape(-1, len(self.fiat_currencies))
+
+    @staticmethod
+    def from_dict(rates):
+        """ Creates the rates of all values from a single rates dict """
+        return RatesArray(rates.keys(), [list(rates.values())])
+
+    def take(self, indexes):
+        """ Returns the rates of the given rows """
+        if len(self.rates) == 1:
+            return self
+        return RatesArray(self.fiat_currencies, self.rates[indexes])
+
+
+def convert_values(values, rates):
+    """ Converts a batch of crypto values at once; returns a list of dicts
+    like ConvertedValues.to_dict() """
+    if not len(values):
+        return []
+    converted = np.round(np.asarray(values, dtype=np.float64)[:, None] *
+                         rates.rates * 1e-8, 2)
+    fiat = [(currency, column.tolist()) for currency, column
+            in zip(rates.fiat_currencies, converted.T)]
+    if np.isnan(converted).any():
+        # unknown rates
+        fiat = [(currency, [None if c != c else c for c in column])
+                for currency, column in fiat]
+    result = [{'value': value} for value in values]
+    for currency, column in fiat:
+        for d, c in zip(result, column):
+            d[currency] = c
+    return result
+
+
 def compute_balance(total_received_value, total_spent_value, rates):
     balance_value = total_received_value - total_spent_value
     balance = ConvertedValues(balance_value, rates).to_dict()
     return balance
+
+
+def compute_balances(total_received_values, total_spent_values, rates):
+    """ Batch version of compute_balance """
+    return convert_values([r - s for r, s in zip(total_received_values,
+                                                 total_spent_values)],
+                          rates)
@@ -1,5 +1,5 @@
 from gsrest.model.addresses import Address
-from gsrest.model.common import Values, compute_balance
+from gsrest.model.common import Values, compute_balance, compute_balances
 from gsrest.model.txs import TxSummary
 
 
@@ -37,15 +37,13 @@ class Entity:
 
 
 class EntityIncomingRelations:
-    def __init__(self, estimated_value, no_txs, src_properties, rate,
+    def __init__(self, estimated_value, no_txs, src_properties, balance,
                  src_cluster, dst_cluster, labels, from_search=False):
         self.id = src_cluster
         self.node_type = 'entity'
         self.received = Values(**src_properties.total_received._asdict())\
             .to_dict()
-        self.balance = compute_balance(src_properties.total_received.value,
-                                       src_properties.total_spent.value,
-                                       rate)
+        self.balance = balance
         self.no_txs = no_txs
         self.estimated_value = Values(**estimated_value._asdict()).to_dict()
         self.labels = labels
@@ -55,25 +53,37 @@ class EntityIncomingRelations:
 
     @staticmethod
     def from_row(row, rates, from_search=False):
-        return EntityIncomingRelations(row.value, row.no_transactions,
-                                       row.src_properties, rates,
-                                       row.src_cluster, row.dst_cluster,
-                                       row.src_labels, from_search)
+        properties = row.src_properties
+        return EntityIncomingRelations(
+            row.value, row.no_transactions, properties,
+            compute_balance(properties.total_received.value,
+                            properties.total_spent.value, rates),
+            row.src_cluster, row.dst_cluster, row.src_labels, from_search)
+
+    @staticmethod
+    def from_rows(rows, rates, from_search=False):
+        """ Creates the models of rows, given their RatesArray; all
+        balances are converted at once """
+        balances = compute_balances(
+            [row.src_properties.total_received.value for row in rows],
+            [row.src_properties.total_spent.value for row in rows], rates)
+        return [EntityIncomingRelations(
+            row.value, row.no_transactions, row.src_properties, balance,
+            row.src_cluster, row.dst_cluster, row.src_labels, from_search)
+            for row, balance in zip(rows, balances)]
 
     def to_dict(self):
         return self.__dict__
 
 
 class EntityOutgoingRelations:
-    def __init__(self, estimated_value, no_txs, dst_properties, rates,
+    def __init__(self, estimated_value, no_txs, dst_properties, balance,
                  dst_cluster, src_cluster, labels, from_search=False):
         self.id = dst_cluster
         self.node_type = 'entity'
         self.received = Values(**dst_properties.total_received._asdict())\
             .to_dict()
-        self.balance = compute_balance(dst_properties.total_received.value,
-                                       dst_properties.total_spent.value,
-                                       rates)
+        self.balance = balance
         self.no_txs = no_txs
         self.estimated_value = Values(**estimated_value._asdict()).to_dict()
         self.labels = labels
@@ -83,10 +93,24 @@ class EntityOutgoingRelations:
 
     @staticmethod
     def from_row(row, rates, from_search=False):
-        return EntityOutgoingRelations(row.value, row.no_transactions,
-                                       row.dst_properties, rates,
-                                       row.dst_cluster, row.src_cluster,
-                                       row.dst_labels, from_search)
+        properties = row.dst_properties
+        return EntityOutgoingRelations(
+            row.value, row.no_transactions, properties,
+            compute_balance(properties.total_received.value,
+                            properties.total_spent.value, rates),
+            row.dst_cluster, row.src_cluster, row.dst_labels, from_search)
+
+    @staticmethod
+    def from_rows(rows, rates, from_search=False):
+        """ Creates the models of rows, given their RatesArray; all
+        balances are converted at once """
+        balances = compute_balances(
+            [row.dst_properties.total_received.value for row in rows],
+            [row.dst_properties.total_spent.value for row in rows], rates)
+        return [EntityOutgoingRelations(
+            row.value, row.no_transactions, row.dst_properties, balance,
+            row.dst_cluster, row.src_cluster, row.dst_labels, from_search)
+            for row, balance in zip(rows, balances)]
 
     def to_dict(self):
         return self.__dict__
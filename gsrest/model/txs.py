@@ -1,38 +1,48 @@
-from gsrest.model.common import ConvertedValues
+from gsrest.model.common import RatesArray, convert_values
 
 
 class Tx:
     """ Model representing a transaction """
 
     def __init__(self, tx_hash, coinbase, height, inputs, outputs, timestamp,
-                 total_input, total_output, rates):
+                 total_input, total_output):
         self.tx_hash = tx_hash.hex()
         self.coinbase = coinbase
         self.height = height
-        if inputs:
-            self.inputs = [TxInputOutput(i.address,
-                                         ConvertedValues(i.value,
-                                                         rates)
-                                         .to_dict()).to_dict()
-                           for i in inputs]
-        else:
-            self.inputs = []
-        self.outputs = [TxInputOutput(output.address,
-                                      ConvertedValues(output.value,
-                                                      rates)
-                                      .to_dict()).to_dict()
-                        for output in outputs if output.address]
+        self.inputs = inputs
+        self.outputs = outputs
         self.timestamp = timestamp
-        self.total_input = ConvertedValues(total_input,
-                                           rates).to_dict()
-        self.total_output = ConvertedValues(total_output,
-                                            rates).to_dict()
+        self.total_input = total_input
+        self.total_output = total_output
 
     @staticmethod
     def from_row(row, rates):
-        return Tx(row.tx_hash, row.coinbase, row.height, row.inputs,
-                  row.outputs, row.timestamp, row.total_input,
-                  row.total_output, rates)
+        return Tx.from_rows([row], RatesArray.from_dict(rates))[0]
+
+    @staticmethod
+    def from_rows(rows, rates):
+        """ Creates the models of rows, given the RatesArray of the rows;
+        all input, output and total values are converted at once """
+        ios = [(row.inputs or [],
+                [output for output in row.outputs if output.address])
+               for row in rows]
+        values, indexes = [], []
+        for i, (row, (inputs, outputs)) in enumerate(zip(rows, ios)):
+            values += [io.value for io in inputs]
+            values += [io.value for io in outputs]
+            values += [row.total_input, row.total_output]
+            indexes += [i] * (len(inputs) + len(outputs) + 2)
+        converted = iter(convert_values(values, rates.take(indexes)))
+        txs = []
+        for row, (inputs, outputs) in zip(rows, ios):
+            inputs = [TxInputOutput(io.address, next(converted)).to_dict()
+                      for io in inputs]
+            outputs = [TxInputOutput(io.address, next(converted)).to_dict()
+                       for io in outputs]
+            txs.append(Tx(row.tx_hash, row.coinbase, row.height, inputs,
+                          outputs, row.timestamp, next(converted),
+                          next(converted)))
+        return txs
 
     def to_dict(self):
         return self.__dict__
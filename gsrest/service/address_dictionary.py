@@ -0,0 +1,290 @@
+"""
+Offline-built dictionary of the addresses of a keyspace, mapping address ids
+to addresses and back without querying the storage backend.
+
+The dictionary is built by
+
+    flask build-address-dictionary <currency>
+
+into ADDRESS_DICTIONARY_PATH/<transformed keyspace>.dict, scanning the
+address_by_id_group table with one query per id group, several in flight.
+The addresses are written in chunks to temporary files, so that building
+never holds more than one chunk in memory, and the hash index is filled
+through a memory map of the file. The file holds, after a header,
+
+    ids      sorted address ids (int64)
+    offsets  start of the address of each id in the heap (uint64), plus the
+             end of the heap
+    table    open-addressing hash index of the addresses (int64 position in
+             ids plus one, 0 for empty slots)
+    heap     the UTF-8 encoded addresses
+
+and is memory-mapped read-only, so that all worker processes of a host share
+one copy in the page cache. Ids and addresses newer than the dictionary are
+not found in it and are looked up in the storage backend instead.
+"""
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from itertools import islice
+
+import click
+import numpy as np
+from flask import current_app
+from flask.cli import with_appcontext
+
+from gsrest.db.storage import execute_many, get_keyspace_mapping
+from gsrest.util.mapped_files import MappedFiles, atomic_write, \
+    decode_keyspace, encode_keyspace
+
+MAGIC = b'GSADDR01'
+# magic, number of ids, hash table size, heap size, maximum id, keyspace
+HEADER = struct.Struct('<8sQQQq48s')
+
+# addresses held in memory at once while building a dictionary
+CHUNK_SIZE = 1000000
+
+
+def init_app(app):
+    app.cli.add_command(build_address_dictionary_command)
+
+
+def address_hash(address):
+    return zlib.crc32(address)
+
+
+def fill_table(table, hashes, positions):
+    """ Inserts the given positions (plus one) with the given hashes into
+    the open-addressing table with linear probing, in rounds: every
+    position takes its slot if it is empty, the first one winning if
+    several compete, or moves on to the next slot. Slots are only skipped
+    when taken, so lookups probing from the hash find every position. """
+    mask = len(table) - 1
+    slots = hashes.astype(np.int64) & mask
+    values = positions + 1
+    while len(values):
+        free = np.flatnonzero(table[slots] == 0)
+        taken, first = np.unique(slots[free], return_index=True)
+        table[taken] = values[free[first]]
+        placed = np.zeros(len(values), dtype=bool)
+        placed[free[first]] = True
+        slots = (slots[~placed] + 1) & mask
+        values = values[~placed]
+
+
+class DictionaryWriter:
+    """ Writes a dictionary of addresses added in chunks of increasing
+    ids. Ids, address ends, hashes and addresses are spooled to temporary
+    files next to the dictionary until it is written by close(). """
+
+    def __init__(self, path, keyspace):
+        self.path = path
+        # fails before scanning, not after
+        self.keyspace = encode_keyspace(keyspace)
+        directory = os.path.dirname(os.path.abspath(path))
+        self._ids, self._ends, self._hashes, self._heap = \
+            [tempfile.TemporaryFile(dir=directory) for _ in range(4)]
+        self.count = 0
+        self.heap_size = 0
+        self.max_id = -1
+
+    def add(self, ids, addresses):
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return
+        if ids[0] <= self.max_id or (np.diff(ids) <= 0).any():
+            raise ValueError('Address ids must be added in increasing order')
+        encoded = [address.encode('utf-8') for address in addresses]
+        ends = self.heap_size + np.cumsum(
+            np.fromiter(map(len, encoded), np.uint64, len(encoded)))
+        self._ids.write(ids.tobytes())
+        self._ends.write(ends.tobytes())
+        self._hashes.write(np.fromiter(map(address_hash, encoded), np.uint32,
+                                       len(encoded)).tobytes())
+        self._heap.write(b''.join(encoded))
+        self.count += len(ids)
+        self.heap_size = int(ends[-1])
+        self.max_id = int(ids[-1])
+
+    def close(self):
+        """ Writes the dictionary and removes the temporary files """
+        table_size = 1
+        while table_size < 2 * self.count:
+            table_size *= 2
+        try:
+            with atomic_write(self.path) as f:
+                f.write(HEADER.pack(MAGIC, self.count, table_size,
+                                    self.heap_size, self.max_id,
+                                    self.keyspace))
+                copy(self._ids, f)
+                # start of the first address
+                f.write(np.zeros(1, dtype=np.uint64).tobytes())
+                copy(self._ends, f)
+                table_offset = f.tell()
+                # the table is zero-filled, the heap follows
+                f.truncate(table_offset + 8 * table_size)
+                f.seek(0, os.SEEK_END)
+                copy(self._heap, f)
+                f.flush()
+                self.fill_table(np.memmap(f, dtype=np.int64, mode='r+',
+                                          offset=table_offset,
+                                          shape=(table_size,)))
+        finally:
+            for spooled in (self._ids, self._ends, self._hashes,
+                            self._heap):
+                spooled.close()
+
+    def fill_table(self, table):
+        self._hashes.seek(0)
+        for start in range(0, self.count, CHUNK_SIZE):
+            hashes = np.fromfile(self._hashes, dtype=np.uint32,
+                                 count=min(CHUNK_SIZE, self.count - start))
+            fill_table(table, hashes, np.arange(start, start + len(hashes)))
+        table.flush()
+
+
+def copy(spooled, f):
+    spooled.seek(0)
+    shutil.copyfileobj(spooled, f)
+
+
+def write_dictionary(path, keyspace, ids, addresses):
+    """ Writes the dictionary of the given ids and (str) addresses """
+    order = np.argsort(np.asarray(ids, dtype=np.int64), kind='stable')
+    writer = DictionaryWriter(path, keyspace)
+    writer.add(np.asarray(ids, dtype=np.int64)[order],
+               [addresses[i] for i in order])
+    writer.close()
+
+
+class AddressDictionary:
+    """ Read-only, memory-mapped address dictionary """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, table_size, heap_size, self.max_id, keyspace = \
+            HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError('Not an address dictionary: {}'.format(path))
+        self.keyspace = decode_keyspace(keyspace)
+        offset = HEADER.size
+        self.ids = np.frombuffer(self._mmap, np.int64, count, offset)
+        offset += 8 * count
+        self.offsets = np.frombuffer(self._mmap, np.uint64, count + 1,
+                                     offset)
+        offset += 8 * (count + 1)
+        self.table = np.frombuffer(self._mmap, np.int64, table_size, offset)
+        self.heap = offset + 8 * table_size
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _address(self, position):
+        start = self.heap + int(self.offsets[position])
+        end = self.heap + int(self.offsets[position + 1])
+        return self._mmap[start:end]
+
+    def get_addresses(self, address_ids):
+        """ Returns the addresses of the given ids, or None for ids not in
+        the dictionary """
+        if not len(self.ids):
+            return [None] * len(address_ids)
+        ids = np.asarray(address_ids, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.ids, ids),
+                               len(self.ids) - 1)
+        found = self.ids[positions] == ids
+        return [self._address(int(position)).decode('utf-8') if is_found
+                else None
+                for position, is_found in zip(positions, found)]
+
+    def get_address_id(self, address):
+        """ Returns the id of the given address, or None if it is not in the
+        dictionary """
+        if not len(self.ids):
+            return None
+        encoded = address.encode('utf-8')
+        mask = len(self.table) - 1
+        slot = address_hash(encoded) & mask
+        while True:
+            position = int(self.table[slot])
+            if not position:
+                return None
+            if self._address(position - 1) == encoded:
+                return int(self.ids[position - 1])
+            slot = (slot + 1) & mask
+
+
+dictionaries = MappedFiles('address dictionary', 'address_dictionaries',
+                           'ADDRESS_DICTIONARY_PATH', AddressDictionary)
+
+
+def dictionary_path(currency):
+    return dictionaries.path('{}.dict'.format(
+        get_keyspace_mapping(currency, 'transformed')))
+
+
+def get_address_dictionary(currency):
+    """ Returns the address dictionary of a currency, opened on first use,
+    or None if there is none for the current keyspace """
+    return dictionaries.get(currency, dictionary_path(currency),
+                            get_keyspace_mapping(currency, 'transformed'))
+
+
+def scan_addresses(currency, concurrency=16, min_id=0):
+    """ Yields the ids and addresses of a currency, from min_id on,
+    scanning one id group per query with `concurrency` queries in
+    flight """
+    from gsrest.service.common_service import get_id_group
+    from gsrest.service.general_service import get_statistics
+
+    no_id_groups = get_id_group(get_statistics(currency)['no_addresses']) + 1
+    for start in range(get_id_group(min_id), no_id_groups, concurrency):
+        params = [[group] for group in
+                  range(start, min(start + concurrency, no_id_groups))]
+        results = execute_many(currency, 'transformed',
+                               'addresses_by_id_group', params,
+                               concurrency=concurrency)
+        if any(result is None for result in results):
+            raise RuntimeError('Scanning the addresses of {} failed'
+                               .format(currency))
+        for result in results:
+            # further pages are fetched while iterating
+            for row in result:
+                if row.address_id >= min_id:
+                    yield row.address_id, row.address
+
+
+def build_dictionary(currency, path, concurrency=16):
+    """ Writes the dictionary of all addresses of a currency """
+    writer = DictionaryWriter(path,
+                              get_keyspace_mapping(currency, 'transformed'))
+    # id groups are scanned in order, and the ids within each of them
+    scan = scan_addresses(currency, concurrency)
+    while True:
+        chunk = list(islice(scan, CHUNK_SIZE))
+        if not chunk:
+            break
+        ids, addresses = zip(*chunk)
+        writer.add(ids, addresses)
+    writer.close()
+    return writer.count
+
+
+@click.command('build-address-dictionary')
+@click.argument('currency')
+@click.option('--output', help='dictionary file (default: '
+              'ADDRESS_DICTIONARY_PATH/<keyspace>.dict)')
+@click.option('--concurrency', default=16, show_default=True,
+              help='id groups scanned concurrently')
+@with_appcontext
+def build_address_dictionary_command(currency, output, concurrency):
+    """Build the address dictionary of a currency."""
+    path = output or dictionary_path(currency)
+    if path is None:
+        raise click.UsageError('Set ADDRESS_DICTIONARY_PATH or --output')
+    count = build_dictionary(currency, path, concurrency)
+    current_app.logger.info('Wrote %d addresses to %s', count, path)
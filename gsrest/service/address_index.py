@@ -0,0 +1,288 @@
+"""
+Offline-built, sorted index of the addresses of a keyspace, answering
+address prefix searches (autocompletion) with a binary search.
+
+The index is built by
+
+    flask build-address-index <currency>
+
+into ADDRESS_INDEX_PATH/<transformed keyspace>.index, scanning the
+addresses like the address dictionary (see
+gsrest.service.address_dictionary). With --incremental, only the addresses
+with ids above the largest id of an existing index are scanned and merged
+into it. The scanned addresses are sorted in runs of CHUNK_SIZE, spooled to
+temporary files next to the index and merged with the existing index while
+the offsets and the heap are written, so that the build holds one run in
+memory. The file holds, after a header,
+
+    offsets  start of each address in the heap (uint64), plus the end of
+             the heap
+    heap     the UTF-8 encoded addresses, in byte order
+
+and is memory-mapped read-only by the workers. Addresses with ids above
+the largest id of the index, up to the number of addresses of the summary
+statistics, are scanned from the storage backend once per worker and
+searched along with the index; if there are more than MAX_NEWER_ADDRESSES
+of them, the index is stale and skipped. Without an index, or for other
+keyspaces, prefix searches query the storage backend.
+"""
+import bisect
+import heapq
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from itertools import islice
+
+import click
+import numpy as np
+from flask import current_app
+from flask.cli import with_appcontext
+
+from gsrest.db.storage import get_keyspace_mapping
+from gsrest.service.general_service import get_statistics
+from gsrest.util.mapped_files import MappedFiles, atomic_write, \
+    decode_keyspace, encode_keyspace
+
+MAGIC = b'GSAIDX01'
+# magic, number of addresses, heap size, maximum address id, keyspace
+HEADER = struct.Struct('<8sQQq48s')
+# length of an address in a run
+RUN_RECORD = struct.Struct('<H')
+
+# addresses sorted in memory at once while building an index
+CHUNK_SIZE = 1000000
+# offsets written at once
+OFFSETS_BATCH = 65536
+
+# addresses newer than an index held per worker, beyond which prefix
+# searches query the storage backend
+MAX_NEWER_ADDRESSES = 100000
+
+
+def init_app(app):
+    app.cli.add_command(build_address_index_command)
+
+
+def write_index(path, keyspace, addresses, max_id):
+    """ Writes the index of the given, sorted and encoded addresses, which
+    may be an iterator, and returns their number. The heap is spooled to a
+    temporary file while the offsets are written. """
+    field = encode_keyspace(keyspace)
+    heap = tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with atomic_write(path) as f:
+            f.write(HEADER.pack(MAGIC, 0, 0, max_id, field))
+            count = 0
+            end = 0
+            offsets = [end]
+            for address in addresses:
+                heap.write(address)
+                end += len(address)
+                count += 1
+                offsets.append(end)
+                if len(offsets) == OFFSETS_BATCH:
+                    f.write(np.array(offsets, dtype=np.uint64).tobytes())
+                    offsets = []
+            f.write(np.array(offsets, dtype=np.uint64).tobytes())
+            heap.seek(0)
+            shutil.copyfileobj(heap, f)
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, count, end, max_id, field))
+    finally:
+        heap.close()
+    return count
+
+
+def write_run(addresses, directory):
+    """ Returns a temporary file of the given encoded addresses, sorted and
+    prefixed with their lengths """
+    run = tempfile.TemporaryFile(dir=directory)
+    for address in sorted(addresses):
+        run.write(RUN_RECORD.pack(len(address)))
+        run.write(address)
+    run.seek(0)
+    return run
+
+
+def read_run(run):
+    """ Yields the addresses of a run """
+    while True:
+        record = run.read(RUN_RECORD.size)
+        if not record:
+            return
+        yield run.read(RUN_RECORD.unpack(record)[0])
+
+
+class AddressIndex:
+    """ Read-only, memory-mapped sorted address index """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, heap_size, self.max_id, keyspace = \
+            HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError('Not an address index: {}'.format(path))
+        self.keyspace = decode_keyspace(keyspace)
+        self.offsets = np.frombuffer(self._mmap, np.uint64, count + 1,
+                                     HEADER.size)
+        self.heap = HEADER.size + 8 * (count + 1)
+        # largest id scanned and the sorted, encoded addresses newer than
+        # the index, swapped in one assignment
+        self.newer = (self.max_id, [])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, position):
+        """ Returns the encoded address at a position """
+        return self._mmap[self.heap + int(self.offsets[position]):
+                          self.heap + int(self.offsets[position + 1])]
+
+    def __iter__(self):
+        return (self[position] for position in range(len(self)))
+
+    def search(self, prefix, limit=None):
+        """ Returns the addresses starting with prefix, in byte order, at
+        most limit of them """
+        encoded = prefix.encode('utf-8')
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self[middle] < encoded:
+                low = middle + 1
+            else:
+                high = middle
+        matches = []
+        while low < len(self) and (limit is None or len(matches) < limit):
+            address = self[low]
+            if not address.startswith(encoded):
+                break
+            matches.append(address.decode('utf-8'))
+            low += 1
+        return matches
+
+
+indexes = MappedFiles('address index', 'address_indexes',
+                      'ADDRESS_INDEX_PATH', AddressIndex)
+
+
+def index_path(currency):
+    return indexes.path('{}.index'.format(
+        get_keyspace_mapping(currency, 'transformed')))
+
+
+def get_address_index(currency):
+    """ Returns the address index of a currency, opened on first use, or
+    None if there is none for the current keyspace """
+    return indexes.get(currency, index_path(currency),
+                       get_keyspace_mapping(currency, 'transformed'))
+
+
+def search_sorted(addresses, prefix, limit=None):
+    """ Returns the addresses of a sorted list of encoded addresses starting
+    with prefix, at most limit of them """
+    encoded = prefix.encode('utf-8')
+    matches = []
+    for address in addresses[bisect.bisect_left(addresses, encoded):]:
+        if not address.startswith(encoded) or \
+                (limit is not None and len(matches) >= limit):
+            break
+        matches.append(address.decode('utf-8'))
+    return matches
+
+
+def get_newer_addresses(currency, index):
+    """ Returns the sorted, encoded addresses newer than the index, scanned
+    when the statistics report new addresses, or None if there are more
+    than MAX_NEWER_ADDRESSES of them """
+    from gsrest.service.address_dictionary import scan_addresses
+
+    statistics = get_statistics(currency)
+    # ids are scanned up to the number of addresses, like scan_addresses
+    last_id = statistics['no_addresses'] if statistics else -1
+    max_id, addresses = index.newer
+    if last_id <= max_id:
+        return addresses
+    if last_id - index.max_id > MAX_NEWER_ADDRESSES:
+        return None
+    added = []
+    for address_id, address in scan_addresses(currency, min_id=max_id + 1):
+        added.append(address.encode('utf-8'))
+        last_id = max(last_id, address_id)
+    addresses = sorted(addresses + added)
+    index.newer = (last_id, addresses)
+    return addresses
+
+
+def search_address_index(currency, expression, limit=None):
+    """ Returns the addresses starting with expression, at most limit of
+    them, or None if there is no current index to search """
+    index = get_address_index(currency)
+    if index is None:
+        return None
+    newer = get_newer_addresses(currency, index)
+    if newer is None:
+        return None
+    matches = index.search(expression, limit)
+    if not newer:
+        return matches
+    matches += search_sorted(newer, expression, limit)
+    return sorted(matches, key=lambda address: address.encode('utf-8'))[
+        :limit]
+
+
+def build_index(currency, path, incremental=False, concurrency=16):
+    """ Writes the index of the addresses of a currency; an incremental
+    build adds the addresses newer than those of the existing index.
+    Returns the number of addresses added. """
+    from gsrest.service.address_dictionary import scan_addresses
+
+    keyspace = get_keyspace_mapping(currency, 'transformed')
+    previous = indexes.open(path, keyspace) if incremental else None
+    min_id = previous.max_id + 1 if previous is not None else 0
+    max_id = min_id - 1
+    directory = os.path.dirname(os.path.abspath(path))
+    scan = scan_addresses(currency, concurrency, min_id)
+    added = 0
+    runs = []
+    try:
+        while True:
+            chunk = list(islice(scan, CHUNK_SIZE))
+            if not chunk:
+                break
+            max_id = max(max_id, max(address_id for address_id, _ in chunk))
+            runs.append(write_run([address.encode('utf-8')
+                                   for _, address in chunk], directory))
+            added += len(chunk)
+        # the existing index is read from its memory map while the new one
+        # replaces it
+        sources = [read_run(run) for run in runs]
+        if previous is not None:
+            sources.append(iter(previous))
+        write_index(path, keyspace, heapq.merge(*sources), max_id)
+    finally:
+        for run in runs:
+            run.close()
+    return added
+
+
+@click.command('build-address-index')
+@click.argument('currency')
+@click.option('--output', help='index file (default: '
+              'ADDRESS_INDEX_PATH/<keyspace>.index)')
+@click.option('--incremental', is_flag=True,
+              help='add the addresses newer than the existing index')
+@click.option('--concurrency', default=16, show_default=True,
+              help='id groups scanned concurrently')
+@with_appcontext
+def build_address_index_command(currency, output, incremental,
+                                concurrency):
+    """Build the sorted address index of a currency."""
+    path = output or index_path(currency)
+    if path is None:
+        raise click.UsageError('Set ADDRESS_INDEX_PATH or --output')
+    count = build_index(currency, path, incremental, concurrency)
+    current_app.logger.info('Added %d addresses to %s', count, path)
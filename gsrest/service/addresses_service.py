@@ -1,21 +1,50 @@
-from cassandra.query import SimpleStatement, ValueSequence
+from itertools import islice, takewhile
 
-from gsrest.db.cassandra import get_session
+from gsrest.db.storage import execute, get_columns, get_keyspace_mapping
 from gsrest.model.addresses import AddressTx, \
     AddressOutgoingRelations, AddressIncomingRelations, Link
-from gsrest.service.entities_service import get_entity, get_id_group
-from gsrest.service.common_service import get_address_by_id_group, \
+from gsrest.service.entities_service import get_entity, \
+    get_entity_with_tags
+from gsrest.service.address_dictionary import get_address_dictionary
+from gsrest.service.address_index import search_address_index
+from gsrest.service.bloom_filters import is_unknown, is_unknown_prefix
+from gsrest.service.common_service import get_address_cache, \
+    get_id_group, list_addresses_by_ids, search_bounds, until, \
     ADDRESS_PREFIX_LENGTH
-from gsrest.service.rates_service import get_rates, list_rates
+from gsrest.model.common import RatesArray
+from gsrest.service.rates_service import get_rates_async, list_rates, \
+    list_rates_array
+from gsrest.util.cache import MISSING
 
 ADDRESS_PAGE_SIZE = 100
 
 
 def get_address_id(currency, address):
-    session = get_session(currency, 'transformed')
-    query = "SELECT address_id FROM address WHERE address_prefix = %s " \
-            "AND address = %s"
-    result = session.execute(query, [address[:ADDRESS_PREFIX_LENGTH], address])
+    """ Returns the id of an address, or None if it is unknown. Ids never
+    change within a keyspace, so they are looked up in the address
+    dictionary and cached, unknown addresses included. """
+    if is_unknown(currency, 'addresses', address):
+        return None
+    dictionary = get_address_dictionary(currency)
+    if dictionary is not None:
+        address_id = dictionary.get_address_id(address)
+        if address_id is not None:
+            return address_id
+    cache = get_address_cache()
+    if cache is None:
+        return fetch_address_id(currency, address)
+    key = 'id:{}:{}'.format(get_keyspace_mapping(currency, 'transformed'),
+                            address)
+    address_id = cache.get(key)
+    if address_id is MISSING:
+        address_id = fetch_address_id(currency, address)
+        cache.put(key, address_id)
+    return address_id
+
+
+def fetch_address_id(currency, address):
+    result = execute(currency, 'transformed', 'address_id',
+                     [address[:ADDRESS_PREFIX_LENGTH], address])
     if result:
         return result[0].address_id
     return None
@@ -30,124 +59,103 @@ def get_address_id_id_group(currency, address):
 
 
 def list_address_txs(currency, address, paging_state=None, pagesize=None):
-    session = get_session(currency, 'transformed')
-
     address_id, address_id_group = get_address_id_id_group(currency, address)
     if address_id:
-        query = "SELECT * FROM address_transactions WHERE address_id = %s " \
-                "AND address_id_group = %s"
         fetch_size = ADDRESS_PAGE_SIZE
         if pagesize:
             fetch_size = pagesize
-        statement = SimpleStatement(query, fetch_size=fetch_size)
-        results = session.execute(statement, [address_id, address_id_group],
-                                  paging_state=paging_state)
+        results = execute(currency, 'transformed', 'address_transactions',
+                          [address_id, address_id_group],
+                          fetch_size=fetch_size, paging_state=paging_state)
         paging_state = results.paging_state
         if results:
-            heights = [row.height for row in results.current_rows]
-            rates = list_rates(currency, heights)
-            address_txs = [AddressTx.from_row(row, address, rates[row.height])
-                           .to_dict() for row in results.current_rows]
+            columns = get_columns(currency, 'transformed',
+                                  'address_transactions')
+            height = columns['height']
+            heights = [row[height] for row in results.current_rows]
+            rates = list_rates_array(currency, heights)
+            address_txs = [tx.to_dict() for tx in AddressTx.from_tuples(
+                results.current_rows, columns, address, rates)]
             return paging_state, address_txs
     return None, None
 
 
 def list_address_outgoing_relations(currency, address, paging_state=None,
                                     page_size=None):
-    session = get_session(currency, 'transformed')
-
     address_id, address_id_group = get_address_id_id_group(currency, address)
     if address_id:
-        query = "SELECT * FROM address_outgoing_relations WHERE " \
-                "src_address_id_group = %s AND src_address_id = %s"
         fetch_size = ADDRESS_PAGE_SIZE
         if page_size:
             fetch_size = page_size
-        statement = SimpleStatement(query, fetch_size=fetch_size)
-        results = session.execute(statement, [address_id_group, address_id],
-                                  paging_state=paging_state)
+        rates = get_rates_async(currency)
+        results = execute(currency, 'transformed',
+                          'address_outgoing_relations',
+                          [address_id_group, address_id],
+                          fetch_size=fetch_size, paging_state=paging_state)
         paging_state = results.paging_state
-        rates = get_rates(currency)['rates']
-        relations = []
-        for row in results.current_rows:
-            dst_address_id_group = get_id_group(row.dst_address_id)
-            dst_address = get_address_by_id_group(currency,
-                                                  dst_address_id_group,
-                                                  row.dst_address_id)
-
-            relations.append(AddressOutgoingRelations.from_row(row,
-                                                               dst_address,
-                                                               rates)
-                             .to_dict())
-        return paging_state, relations
+        rates = RatesArray.from_dict(rates.result()['rates'])
+        addresses = list_addresses_by_ids(
+            currency, [row.dst_address_id for row in results.current_rows])
+        relations = AddressOutgoingRelations.from_rows(results.current_rows,
+                                                       addresses, rates)
+        return paging_state, [relation.to_dict() for relation in relations]
     return None, None
 
 
 def list_address_incoming_relations(currency, address, paging_state=None,
                                     page_size=None):
-    session = get_session(currency, 'transformed')
-
     address_id, address_id_group = get_address_id_id_group(currency, address)
     if address_id:
-        query = "SELECT * FROM address_incoming_relations WHERE " \
-                "dst_address_id_group = %s AND dst_address_id = %s"
         fetch_size = ADDRESS_PAGE_SIZE
         if page_size:
             fetch_size = page_size
-        statement = SimpleStatement(query, fetch_size=fetch_size)
-        results = session.execute(statement, [address_id_group, address_id],
-                                  paging_state=paging_state)
+        rates = get_rates_async(currency)
+        results = execute(currency, 'transformed',
+                          'address_incoming_relations',
+                          [address_id_group, address_id],
+                          fetch_size=fetch_size, paging_state=paging_state)
         paging_state = results.paging_state
-        rates = get_rates(currency)['rates']
-        relations = []
-        for row in results.current_rows:
-            src_address_id_group = get_id_group(row.src_address_id)
-            src_address = get_address_by_id_group(currency,
-                                                  src_address_id_group,
-                                                  row.src_address_id)
-
-            relations.append(AddressIncomingRelations.from_row(row,
-                                                               src_address,
-                                                               rates)
-                             .to_dict())
-        return paging_state, relations
+        rates = RatesArray.from_dict(rates.result()['rates'])
+        addresses = list_addresses_by_ids(
+            currency, [row.src_address_id for row in results.current_rows])
+        relations = AddressIncomingRelations.from_rows(results.current_rows,
+                                                       addresses, rates)
+        return paging_state, [relation.to_dict() for relation in relations]
     return None, None
 
 
 def list_addresses_links(currency, address, neighbor):
-    session = get_session(currency, 'transformed')
-
     address_id, address_id_group = get_address_id_id_group(currency, address)
     neighbor_id, neighbor_id_group = get_address_id_id_group(currency,
                                                              neighbor)
     if address_id and neighbor_id:
-        query = "SELECT tx_list FROM address_outgoing_relations WHERE " \
-                "src_address_id_group = %s AND src_address_id = %s AND " \
-                "dst_address_id = %s"
-        results = session.execute(query, [address_id_group, address_id,
-                                          neighbor_id])
+        results = execute(currency, 'transformed',
+                          'address_outgoing_relation_txs',
+                          [address_id_group, address_id, neighbor_id])
         if results.current_rows:
             txs = [tx_hash for tx_hash in
                    results.current_rows[0].tx_list]
-            query = "SELECT * FROM address_transactions WHERE " \
-                    "address_id_group = %s AND address_id = %s AND " \
-                    "tx_hash IN %s"
-            results1 = session.execute(query, [address_id_group, address_id,
-                                               ValueSequence(txs)])
-            results2 = session.execute(query, [neighbor_id_group, neighbor_id,
-                                               ValueSequence(txs)])
+            results1 = execute(currency, 'transformed',
+                               'address_transactions_by_hashes',
+                               [address_id_group, address_id, txs])
+            results2 = execute(currency, 'transformed',
+                               'address_transactions_by_hashes',
+                               [neighbor_id_group, neighbor_id, txs])
             if results1.current_rows and results2.current_rows:
+                columns = get_columns(currency, 'transformed',
+                                      'address_transactions_by_hashes')
+                tx_hash, value = columns['tx_hash'], columns['value']
                 links = dict()
                 for row in results1.current_rows:
-                    hsh = row.tx_hash.hex()
+                    hsh = row[tx_hash].hex()
                     links[hsh] = dict()
                     links[hsh]['tx_hash'] = hsh
-                    links[hsh]['height'] = row.height
-                    links[hsh]['timestamp'] = row.timestamp
-                    links[hsh]['input_value'] = row.value
+                    links[hsh]['height'] = row[columns['height']]
+                    links[hsh]['timestamp'] = row[columns['timestamp']]
+                    links[hsh]['input_value'] = row[value]
                 for row in results2.current_rows:
-                    hsh = row.tx_hash.hex()
-                    links[hsh]['output_value'] = row.value
+                    hsh = row[tx_hash].hex()
+                    links[hsh]['output_value'] = row[value]
                 heights = [e['height'] for e in links.values()]
                 rates = list_rates(currency, heights)
                 return [Link.from_dict(e, rates[e['height']]).to_dict()
@@ -163,24 +171,38 @@ def get_address_entity(currency, address):
     return None
 
 
+def get_address_entity_with_tags(currency, address):
+    entity_id = get_address_entity_id(currency, address)
+    if isinstance(entity_id, int):
+        return get_entity_with_tags(currency, entity_id)
+    return None
+
+
 def get_address_entity_id(currency, address):
     # from address to entity id only
-    session = get_session(currency, 'transformed')
     address_id, address_id_group = get_address_id_id_group(currency, address)
     if isinstance(address_id, int):
-        query = "SELECT cluster FROM address_cluster WHERE " \
-                "address_id_group = %s AND address_id = %s "
-        result = session.execute(query, [address_id_group, address_id])
+        result = execute(currency, 'transformed', 'address_cluster',
+                         [address_id_group, address_id])
         if result:
             return result[0].cluster
     return None
 
 
-def list_matching_addresses(currency, expression):
-    # TODO: rather slow with bech32 address (loop through pages instead)
-    session = get_session(currency, 'transformed')
-    query = "SELECT address FROM address WHERE address_prefix = %s"
-    statement = SimpleStatement(query, fetch_size=ADDRESS_PAGE_SIZE)
-    result = session.execute(statement, [expression[:ADDRESS_PREFIX_LENGTH]])
-    return [row.address for row in result
-            if row.address.startswith(expression)]
+def list_matching_addresses(currency, expression, limit=None,
+                            deadline=None):
+    """ Returns the addresses starting with expression, at most limit of
+    them, read until the deadline """
+    if is_unknown_prefix(currency, 'addresses', expression):
+        return []
+    matches = search_address_index(currency, expression, limit)
+    if matches is not None:
+        return matches
+    query_limit, fetch_size = search_bounds(limit)
+    result = execute(currency, 'transformed', 'addresses_by_prefix',
+                     [expression[:ADDRESS_PREFIX_LENGTH], expression,
+                      query_limit], fetch_size=fetch_size)
+    # further pages are only fetched until the first address not matching
+    return list(islice(takewhile(lambda address: address.startswith(
+        expression), (row.address for row in until(result, deadline))),
+        limit))
@@ -1,6 +1,4 @@
-from cassandra.query import SimpleStatement
-
-from gsrest.db.cassandra import get_session
+from gsrest.db.storage import execute
 from gsrest.model.blocks import Block, BlockTxs
 from gsrest.service.rates_service import get_rates
 
@@ -8,21 +6,15 @@ BLOCKS_PAGE_SIZE = 100
 
 
 def get_block(currency, height):
-    session = get_session(currency, 'raw')
-
-    query = "SELECT * FROM block WHERE height = %s"
-    result = session.execute(query, [height])
+    result = execute(currency, 'raw', 'block', [height])
     if result:
         return Block.from_row(result[0]).to_dict()
     return None
 
 
 def list_blocks(currency, paging_state=None):
-    session = get_session(currency, 'raw')
-
-    query = "SELECT * FROM block"
-    statement = SimpleStatement(query, fetch_size=BLOCKS_PAGE_SIZE)
-    results = session.execute(statement, paging_state=paging_state)
+    results = execute(currency, 'raw', 'blocks',
+                      fetch_size=BLOCKS_PAGE_SIZE, paging_state=paging_state)
 
     paging_state = results.paging_state
     block_list = [Block.from_row(row).to_dict()
@@ -32,10 +24,7 @@ def list_blocks(currency, paging_state=None):
 
 
 def list_block_txs(currency, height):
-    session = get_session(currency, 'raw')
-
-    query = "SELECT * FROM block_transactions WHERE height = %s"
-    results = session.execute(query, [height])
+    results = execute(currency, 'raw', 'block_transactions', [height])
 
     if results:
         rates = get_rates(currency, height)
@@ -0,0 +1,281 @@
+"""
+Bloom filters of the addresses and transactions of each currency, answering
+lookups of unknown addresses and transactions without querying the storage
+backend.
+
+The filters are built by
+
+    flask build-bloom-filters <currency>
+
+into BLOOM_FILTER_PATH/<keyspace>.<kind>.bloom, where kind is 'addresses'
+(transformed keyspace) or 'txs' (raw keyspace). Each filter holds the
+addresses or transaction hashes and their partition prefixes, so that
+prefix searches of unknown prefixes are answered as well. The filters are
+memory-mapped read-only when a worker starts.
+
+A filter may report false positives, at the rate it was built for, but no
+false negatives for the items it was built from. Items added to the dataset
+after a filter was built would be reported as unknown, so the header of a
+filter records the number of blocks and items of the summary statistics it
+was built from. A filter is skipped once the statistics report more blocks
+or items, until it is rebuilt; since this check reads the cached statistics,
+filters are only used while LATEST_CACHE_TTL is set. A filter of another
+keyspace is ignored.
+"""
+import hashlib
+import math
+import mmap
+import os
+import struct
+
+import click
+import numpy as np
+from flask import current_app
+from flask.cli import with_appcontext
+
+from gsrest.db.storage import execute, get_keyspace_mapping, \
+    get_supported_currencies
+from gsrest.service.general_service import get_statistics
+from gsrest.util.cache import get_cache
+from gsrest.util.mapped_files import MappedFiles, atomic_write, \
+    decode_keyspace, encode_keyspace
+
+MAGIC = b'GSBLOOM2'
+# magic, number of bits, number of hash functions, number of entries,
+# partition prefix length, number of blocks and items of the statistics the
+# filter was built from, keyspace
+HEADER = struct.Struct('<8sQQQQQQ48s')
+
+# kind: keyspace type
+KINDS = {'addresses': 'transformed', 'txs': 'raw'}
+# kind: statistics field of the number of items
+STATISTICS = {'addresses': 'no_addresses', 'txs': 'no_txs'}
+
+# distinguishes partition prefixes from items in a filter
+PREFIX_MARKER = b'\0'
+
+
+def init_app(app):
+    app.cli.add_command(build_bloom_filters_command)
+
+
+def bit_positions(item, num_bits, num_hashes):
+    """ Returns the bits of an item, by double hashing """
+    digest = hashlib.blake2b(item, digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], 'little')
+    h2 = int.from_bytes(digest[8:], 'little') | 1
+    return [(h1 + i * h2) % num_bits for i in range(num_hashes)]
+
+
+def filter_size(count, false_positive_rate):
+    """ Returns the number of bits and hash functions of a filter of count
+    items with the given false positive rate """
+    count = max(count, 1)
+    num_bits = max(64, math.ceil(-count * math.log(false_positive_rate) /
+                                 math.log(2) ** 2))
+    num_bits = (num_bits + 7) // 8 * 8
+    num_hashes = max(1, round(num_bits / count * math.log(2)))
+    return num_bits, num_hashes
+
+
+class BloomFilter:
+    """ Bloom filter of strings and their partition prefixes """
+
+    def __init__(self, bits, num_hashes, prefix_length, count=0,
+                 keyspace=None, no_blocks=0, no_items=0):
+        self.bits = bits
+        self.num_bits = len(bits) * 8
+        self.num_hashes = num_hashes
+        self.prefix_length = prefix_length
+        self.count = count
+        self.keyspace = keyspace
+        # statistics of the dataset the filter was built from
+        self.no_blocks = no_blocks
+        self.no_items = no_items
+
+    @classmethod
+    def create(cls, count, false_positive_rate, prefix_length,
+               keyspace=None, no_blocks=0, no_items=0):
+        num_bits, num_hashes = filter_size(count, false_positive_rate)
+        return cls(np.zeros(num_bits // 8, dtype=np.uint8), num_hashes,
+                   prefix_length, keyspace=keyspace, no_blocks=no_blocks,
+                   no_items=no_items)
+
+    def _add(self, entry):
+        for position in bit_positions(entry, self.num_bits, self.num_hashes):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def _contains(self, entry):
+        return all(self.bits[position >> 3] & (1 << (position & 7))
+                   for position in bit_positions(entry, self.num_bits,
+                                                 self.num_hashes))
+
+    def prefix_entry(self, item):
+        return PREFIX_MARKER + item[:self.prefix_length].encode('utf-8')
+
+    def add(self, item):
+        self._add(item.encode('utf-8'))
+
+    def add_prefix(self, item):
+        self._add(self.prefix_entry(item))
+
+    def __contains__(self, item):
+        return self._contains(item.encode('utf-8'))
+
+    def contains_prefix(self, item):
+        """ Returns whether an item with the partition prefix of the given
+        item may have been added """
+        return self._contains(self.prefix_entry(item))
+
+    def covers(self, no_blocks, no_items):
+        """ Returns whether the filter was built from a dataset of at least
+        the given number of blocks and items """
+        return no_blocks <= self.no_blocks and no_items <= self.no_items
+
+    def write(self, path):
+        with atomic_write(path) as f:
+            f.write(HEADER.pack(MAGIC, self.num_bits, self.num_hashes,
+                                self.count, self.prefix_length,
+                                self.no_blocks, self.no_items,
+                                encode_keyspace(self.keyspace)))
+            f.write(self.bits.tobytes())
+
+    @classmethod
+    def open(cls, path):
+        """ Memory-maps a filter file read-only """
+        with open(path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, num_bits, num_hashes, count, prefix_length, no_blocks, \
+            no_items, keyspace = HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError('Not a Bloom filter: {}'.format(path))
+        return cls(np.frombuffer(buffer, np.uint8, num_bits // 8,
+                                 HEADER.size),
+                   num_hashes, prefix_length, count,
+                   decode_keyspace(keyspace), no_blocks, no_items)
+
+
+filters = MappedFiles('Bloom filter', 'bloom_filters', 'BLOOM_FILTER_PATH',
+                      BloomFilter.open)
+
+
+def filter_path(currency, kind):
+    return filters.path('{}.{}.bloom'.format(
+        get_keyspace_mapping(currency, KINDS[kind]), kind))
+
+
+def get_bloom_filter(currency, kind):
+    """ Returns the filter of a currency and kind, opened on first use, or
+    None if there is none for the current keyspace """
+    return filters.get((currency, kind), filter_path(currency, kind),
+                       get_keyspace_mapping(currency, KINDS[kind]))
+
+
+def preload(app):
+    """ Opens the filters of all supported currencies """
+    with app.app_context():
+        for currency in get_supported_currencies():
+            for kind in KINDS:
+                get_bloom_filter(currency, kind)
+
+
+def get_current_filter(currency, kind):
+    """ Returns the filter of a currency and kind, or None if there is none
+    or the cached statistics report blocks or items added after it was
+    built """
+    bloom_filter = get_bloom_filter(currency, kind)
+    # without the cache, checking the statistics would cost a query
+    if bloom_filter is None or get_cache('statistics') is None:
+        return None
+    statistics = get_statistics(currency)
+    if statistics is None or not bloom_filter.covers(
+            statistics['no_blocks'], statistics[STATISTICS[kind]]):
+        return None
+    return bloom_filter
+
+
+def is_unknown(currency, kind, item):
+    """ Returns True if the address or transaction hash is certainly not in
+    the dataset """
+    bloom_filter = get_current_filter(currency, kind)
+    return bloom_filter is not None and item not in bloom_filter
+
+
+def is_unknown_prefix(currency, kind, expression):
+    """ Returns True if no address or transaction hash of the dataset starts
+    with the partition prefix of the expression """
+    bloom_filter = get_current_filter(currency, kind)
+    return bloom_filter is not None and \
+        not bloom_filter.contains_prefix(expression)
+
+
+def build_filter(currency, kind, items, count, prefix_length,
+                 false_positive_rate, no_blocks=0):
+    """ Returns a filter of the given items and their prefixes, sized for
+    count items, and the number of items; the filter covers no_blocks
+    blocks and count items """
+    # items and prefixes share the filter
+    bloom_filter = BloomFilter.create(
+        2 * count, false_positive_rate, prefix_length,
+        get_keyspace_mapping(currency, KINDS[kind]), no_blocks, count)
+    prefixes = set()
+    no_items = 0
+    for item in items:
+        bloom_filter.add(item)
+        prefix = item[:prefix_length]
+        if prefix not in prefixes:
+            prefixes.add(prefix)
+            bloom_filter.add_prefix(prefix)
+        no_items += 1
+    return bloom_filter, no_items
+
+
+def build_filters(currency, directory, false_positive_rate=0.001,
+                  concurrency=16):
+    """ Scans the addresses and transactions of a currency and writes their
+    filters into directory; returns the number of items by kind """
+    from gsrest.service.address_dictionary import scan_addresses
+    from gsrest.service.common_service import ADDRESS_PREFIX_LENGTH
+    from gsrest.service.txs_service import TX_PREFIX_LENGTH
+
+    # read before scanning, so that items added while scanning do not mark
+    # the filters as current
+    statistics = get_statistics(currency)
+    addresses = (address for _, address
+                 in scan_addresses(currency, concurrency))
+    # further pages are fetched while iterating
+    txs = (row.tx_hash.hex() for row
+           in execute(currency, 'raw', 'all_transaction_hashes'))
+    counts = dict()
+    for kind, items, count, prefix_length in (
+            ('addresses', addresses, statistics['no_addresses'],
+             ADDRESS_PREFIX_LENGTH),
+            ('txs', txs, statistics['no_txs'], TX_PREFIX_LENGTH)):
+        bloom_filter, counts[kind] = build_filter(
+            currency, kind, items, count, prefix_length, false_positive_rate,
+            statistics['no_blocks'])
+        bloom_filter.write(os.path.join(directory, '{}.{}.bloom'.format(
+            bloom_filter.keyspace, kind)))
+    return counts
+
+
+@click.command('build-bloom-filters')
+@click.argument('currency')
+@click.option('--output', help='directory of the filters (default: '
+              'BLOOM_FILTER_PATH)')
+@click.option('--false-positive-rate', default=0.001, show_default=True)
+@click.option('--concurrency', default=16, show_default=True,
+              help='id groups of addresses scanned concurrently')
+@with_appcontext
+def build_bloom_filters_command(currency, output, false_positive_rate,
+                                concurrency):
+    """Build the address and transaction Bloom filters of a currency."""
+    directory = output or filters.directory()
+    if not directory:
+        raise click.UsageError('Set BLOOM_FILTER_PATH or --output')
+    counts = build_filters(currency, directory, false_positive_rate,
+                           concurrency)
+    current_app.logger.info('Wrote Bloom filters of %d addresses and %d '
+                            'transactions', counts['addresses'],
+                            counts['txs'])
@@ -1,43 +1,141 @@
-from gsrest.db.cassandra import get_session
+import time
+from math import floor
+
+from gsrest.db.storage import execute_async, execute_many, \
+    get_keyspace_mapping, join, QueryFuture
 from gsrest.model.addresses import Address
 from gsrest.model.tags import Tag
-from gsrest.service.rates_service import get_rates
+from gsrest.service.address_dictionary import get_address_dictionary
+from gsrest.service.bloom_filters import is_unknown
+from gsrest.service.rates_service import get_rates_async
+from gsrest.util.cache import MISSING, get_lru_cache
 
 ADDRESS_PREFIX_LENGTH = 5
+BUCKET_SIZE = 25000  # TODO: get BUCKET_SIZE from cassandra
+# address ids resolved per query, all of the same id group
+ADDRESS_BATCH_SIZE = 100
+# page size and LIMIT of searches without a limit
+SEARCH_PAGE_SIZE = 100
+NO_LIMIT = 2 ** 31 - 1
 
 
-def get_address_by_id_group(currency, address_id_group, address_id):
-    session = get_session(currency, 'transformed')
-    query = "SELECT address FROM address_by_id_group WHERE " \
-            "address_id_group = %s and address_id = %s"
-    result = session.execute(query, [address_id_group, address_id])
-    return result[0].address if result else None
+def get_id_group(id_):
+    # if BUCKET_SIZE depends on the currency, we need session = ... here
+    return floor(id_ / BUCKET_SIZE)
 
 
-def get_address(currency, address):
-    session = get_session(currency, 'transformed')
+def search_bounds(limit):
+    """ Returns the LIMIT and the fetch size of a search query for at most
+    limit results. Searches restrict the clustering column to the range
+    starting with the expression and stop at the first row beyond it, so
+    only the matching rows are read. """
+    if limit is None:
+        return NO_LIMIT, SEARCH_PAGE_SIZE
+    # CQL limits must be positive
+    return max(limit, 1), max(limit, 1)
 
-    query = "SELECT * FROM address WHERE address_prefix = %s AND address = %s"
-    result = session.execute(query, [address[:ADDRESS_PREFIX_LENGTH], address])
-    if result:
-        return Address.from_row(result[0],
-                                get_rates(currency)['rates']).to_dict()
-    return None
 
+def until(rows, deadline=None):
+    """ Yields the rows until the deadline (time.monotonic()) has passed, so
+    that searches abandoned by the caller stop fetching further pages """
+    rows = iter(rows)
+    while deadline is None or time.monotonic() < deadline:
+        row = next(rows, MISSING)
+        if row is MISSING:
+            return
+        yield row
 
-def list_address_tags(currency, address):
-    session = get_session(currency, 'transformed')
 
-    query = "SELECT * FROM address_tags WHERE address = %s"
-    results = session.execute(query, [address])
-    address_tags = [Tag.from_address_row(row, currency, True).to_dict()
-                    for row in results.current_rows]
+def get_address_cache():
+    """ Returns the cache of addresses and address ids of the current
+    application, or None if it is disabled """
+    return get_lru_cache('addresses', 'ADDRESS_CACHE_SIZE',
+                         'ADDRESS_CACHE_SHARED_PATH',
+                         'ADDRESS_CACHE_SHARED_ENTRIES')
+
+
+def list_addresses_by_ids(currency, address_ids):
+    """ Returns the addresses of the given ids, in order, or None for
+    unknown ids.
+
+    Repeated ids are resolved once. Ids covered by the address dictionary
+    and cached ids are not queried; the others are queried in batches per
+    id group, with a bounded number of batches in flight. """
+    cache = get_address_cache()
+    keyspace = get_keyspace_mapping(currency, 'transformed')
+
+    def key(address_id):
+        return 'address:{}:{}'.format(keyspace, address_id)
+
+    unique_ids = set(address_ids)
+    addresses = dict()
+    dictionary = get_address_dictionary(currency)
+    if dictionary is not None:
+        known_ids = [address_id for address_id in unique_ids
+                     if address_id <= dictionary.max_id]
+        addresses.update(zip(known_ids,
+                             dictionary.get_addresses(known_ids)))
+        unique_ids.difference_update(known_ids)
+    missing = dict()  # id group: [address id]
+    for address_id in unique_ids:
+        address = cache.get(key(address_id)) if cache is not None \
+            else MISSING
+        if address is MISSING:
+            missing.setdefault(get_id_group(address_id), []) \
+                .append(address_id)
+        else:
+            addresses[address_id] = address
+
+    params = [[id_group, ids[i:i + ADDRESS_BATCH_SIZE]]
+              for id_group, ids in missing.items()
+              for i in range(0, len(ids), ADDRESS_BATCH_SIZE)]
+    for batch, result in zip(params, execute_many(
+            currency, 'transformed', 'addresses_by_ids', params)):
+        found = {row.address_id: row.address for row in result or []}
+        for address_id in batch[1]:
+            address = found.get(address_id)
+            addresses[address_id] = address
+            # failed batches are not cached
+            if cache is not None and result is not None:
+                cache.put(key(address_id), address)
+    return [addresses[address_id] for address_id in address_ids]
 
-    return address_tags
+
+def get_address_async(currency, address):
+    if is_unknown(currency, 'addresses', address):
+        return QueryFuture.resolved(None)
+
+    def build(result, rates):
+        if result:
+            return Address.from_row(result[0], rates['rates']).to_dict()
+        return None
+    return QueryFuture([execute_async(currency, 'transformed', 'address',
+                                      [address[:ADDRESS_PREFIX_LENGTH],
+                                       address]),
+                        get_rates_async(currency)], build)
+
+
+def get_address(currency, address):
+    return get_address_async(currency, address).result()
+
+
+def list_address_tags_async(currency, address):
+    def build(results):
+        return [Tag.from_address_row(row, currency, True).to_dict()
+                for row in results.current_rows]
+    return QueryFuture([execute_async(currency, 'transformed',
+                                      'address_tags', [address])], build)
+
+
+def list_address_tags(currency, address):
+    return list_address_tags_async(currency, address).result()
 
 
 def get_address_with_tags(currency, address):
-    result = get_address(currency, address)
+    if is_unknown(currency, 'addresses', address):
+        return None
+    result, tags = join(get_address_async(currency, address),
+                        list_address_tags_async(currency, address))
     if result:
-        result['tags'] = list_address_tags(currency, address)
+        result['tags'] = tags
     return result
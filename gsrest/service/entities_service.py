@@ -1,148 +1,119 @@
-from math import floor
-from cassandra.query import SimpleStatement
-from cassandra.concurrent import execute_concurrent
-
-from gsrest.db.cassandra import get_session
+from gsrest.db.storage import execute, execute_async, execute_many, \
+    QueryFuture
+from gsrest.model.common import RatesArray
 from gsrest.model.entities import Entity, EntityIncomingRelations, \
     EntityOutgoingRelations, EntityAddress
 from gsrest.model.tags import Tag
-from gsrest.service.common_service import get_address_by_id_group, \
-    get_address_with_tags
-from gsrest.service.rates_service import get_rates
+from gsrest.service.common_service import get_address_with_tags, \
+    get_id_group, list_addresses_by_ids
+from gsrest.service.rates_service import get_rates_async
 
-BUCKET_SIZE = 25000  # TODO: get BUCKET_SIZE from cassandra
 ENTITY_PAGE_SIZE = 100
 ENTITY_ADDRESSES_PAGE_SIZE = 100
 
 
-def get_id_group(id_):
-    # if BUCKET_SIZE depends on the currency, we need session = ... here
-    return floor(id_ / BUCKET_SIZE)
+def list_entity_tags_async(currency, entity_id):
+    # from entity id to list of tags
+    entity_group = get_id_group(entity_id)
+
+    def build(results):
+        addresses = list_addresses_by_ids(
+            currency, [row.address_id for row in results.current_rows])
+        return [Tag.from_entity_row(row, address, currency).to_dict()
+                for row, address in zip(results.current_rows, addresses)]
+    return QueryFuture([execute_async(currency, 'transformed', 'cluster_tags',
+                                      [entity_group, entity_id])], build)
 
 
 def list_entity_tags(currency, entity_id):
-    # from entity id to list of tags
-    session = get_session(currency, 'transformed')
-    entity_group = get_id_group(entity_id)
-    query = "SELECT * FROM cluster_tags WHERE cluster_group = %s and cluster" \
-            " = %s"
-    concurrent_query = "SELECT * FROM address_by_id_group WHERE " \
-                       "address_id_group = %s and address_id = %s"
-
-    results = session.execute(query, [entity_group, entity_id])
-
-    # concurrent queries
-    statements_and_params = []
-    for row in results.current_rows:
-        address_id_group = get_id_group(row.address_id)
-        params = (address_id_group, row.address_id)
-        statements_and_params.append((concurrent_query, params))
-    addresses = execute_concurrent(session, statements_and_params,
-                                   raise_on_first_error=False)
-    id_address = dict()  # to temporary store the id-address mapping
-    for (success, address) in addresses:
-        if not success:
-            pass
-        else:
-            id_address[address.one().address_id] = address.one().address
-    entity_tags = []
-    for row in results.current_rows:
-        entity_tags.append(Tag.from_entity_row(row, id_address[row.address_id],
-                                               currency).to_dict())
-
-    return entity_tags
+    return list_entity_tags_async(currency, entity_id).result()
 
 
-def get_entity(currency, entity_id):
+def get_entity_async(currency, entity_id):
     # from entity id to complete entity stats
-    session = get_session(currency, 'transformed')
     entity_id_group = get_id_group(entity_id)
-    query = "SELECT * FROM cluster WHERE cluster_group = %s AND cluster = %s "
-    result = session.execute(query, [entity_id_group, entity_id])
-    rates = get_rates(currency)['rates']
+
+    def build(result, rates):
+        if result:
+            return Entity.from_row(result[0], rates['rates']).to_dict()
+        return None
+    return QueryFuture([execute_async(currency, 'transformed', 'cluster',
+                                      [entity_id_group, entity_id]),
+                        get_rates_async(currency)], build)
+
+
+def get_entity(currency, entity_id):
+    return get_entity_async(currency, entity_id).result()
+
+
+def get_entity_with_tags(currency, entity_id):
+    entity = get_entity_async(currency, entity_id)
+    tags = list_entity_tags_async(currency, entity_id)
+    result = entity.result()
     if result:
-        return Entity.from_row(result[0], rates).to_dict()
-    return None
+        result['tags'] = tags.result()
+    return result
 
 
 def list_entity_relations(currency, entity_id, is_outgoing, targets=None,
                           paging_state=None, page_size=None,
                           from_search=False):
     if is_outgoing:
-        table, this, that = ('outgoing', 'src', 'dst')
+        table, that = ('outgoing', 'dst')
         cls = EntityOutgoingRelations
     else:
-        table, this, that = ('incoming', 'dst', 'src')
+        table, that = ('incoming', 'src')
         cls = EntityIncomingRelations
 
-    session = get_session(currency, 'transformed')
     entity_id_group = get_id_group(entity_id)
     has_targets = isinstance(targets, list)
     parameters = [entity_id_group, entity_id]
-    basequery = "SELECT * FROM cluster_{}_relations WHERE " \
-                "{}_cluster_group = %s AND " \
-                "{}_cluster = %s".format(table, this, this)
     if has_targets:
         if len(targets) == 0:
             return None
-        query = basequery.replace('*', '{}_cluster'.format(that))
-        query += " AND {}_cluster in ({})".format(that, ','.join(targets))
+        name = 'cluster_{}_relations_targets'.format(table)
+        query_parameters = parameters + [[int(t) for t in targets]]
     else:
-        query = basequery
+        name = 'cluster_{}_relations'.format(table)
+        query_parameters = parameters
     fetch_size = ENTITY_PAGE_SIZE
     if page_size:
         fetch_size = page_size
-    statement = SimpleStatement(query, fetch_size=fetch_size)
-    results = session.execute(statement, parameters,
-                              paging_state=paging_state)
+    rates = get_rates_async(currency)
+    results = execute(currency, 'transformed', name, query_parameters,
+                      fetch_size=fetch_size, paging_state=paging_state)
     paging_state = results.paging_state
     current_rows = results.current_rows
     if has_targets:
-        statements_and_params = []
-        query = basequery + " AND {}_cluster = %s".format(that)
-        for row in results.current_rows:
-            params = parameters.copy()
-            params.append(getattr(row, "{}_cluster".format(that)))
-            statements_and_params.append((query, params))
-        results = execute_concurrent(session, statements_and_params,
-                                     raise_on_first_error=False)
-        current_rows = []
-        for (success, row) in results:
-            if not success:
-                pass
-            else:
-                current_rows.append(row.one())
-
-    rates = get_rates(currency)['rates']
-    relations = []
-    for row in current_rows:
-        relations.append(cls.from_row(row, rates, from_search).to_dict())
+        params = [parameters + [getattr(row, "{}_cluster".format(that))]
+                  for row in results.current_rows]
+        results = execute_many(currency, 'transformed',
+                               'cluster_{}_relation'.format(table), params)
+        current_rows = [row.one() for row in results if row]
+
+    rates = RatesArray.from_dict(rates.result()['rates'])
+    relations = [relation.to_dict() for relation
+                 in cls.from_rows(current_rows, rates, from_search)]
     return paging_state, relations
 
 
 def list_entity_addresses(currency, entity_id, paging_state, page_size):
-    session = get_session(currency, 'transformed')
     entity_id_group = get_id_group(entity_id)
-    query = "SELECT * FROM cluster_addresses WHERE cluster_group = %s AND " \
-            "cluster = %s"
     fetch_size = ENTITY_ADDRESSES_PAGE_SIZE
     if page_size:
         fetch_size = page_size
-    statement = SimpleStatement(query, fetch_size=fetch_size)
-    results = session.execute(statement, [entity_id_group, entity_id],
-                              paging_state=paging_state)
+    rates = get_rates_async(currency)
+    results = execute(currency, 'transformed', 'cluster_addresses',
+                      [entity_id_group, entity_id],
+                      fetch_size=fetch_size, paging_state=paging_state)
     if results:
         paging_state = results.paging_state
-        rates = get_rates(currency)['rates']
-        addresses = []
-        for row in results.current_rows:
-            address_id_group = get_id_group(row.address_id)
-            address = get_address_by_id_group(currency, address_id_group,
-                                              row.address_id)
-            addresses.append(EntityAddress.from_entity_row(row, address,
-                                                           rates)
-                             .to_dict())
-        return paging_state, addresses
+        rates = rates.result()['rates']
+        addresses = list_addresses_by_ids(
+            currency, [row.address_id for row in results.current_rows])
+        return paging_state, [
+            EntityAddress.from_entity_row(row, address, rates).to_dict()
+            for row, address in zip(results.current_rows, addresses)]
     return paging_state, None
 
 
@@ -170,6 +141,20 @@ def list_entity_search_neighbors(currency, entity, params, breadth, depth,
                            currency, entity, outgoing, paging_state=None,
                            page_size=breadth, from_search=True))
 
+    # start the lookups of all uncached neighbors at once
+    futures = dict()
+    for row in rows:
+        subentity = row['dst_entity'] if outgoing else row['src_entity']
+        if isinstance(subentity, int) and subentity not in futures and \
+                get_cached(subentity, 'props') is None:
+            futures[subentity] = (get_entity_async(currency, subentity),
+                                  list_entity_tags_async(currency, subentity))
+
+    def prefetched(subentity, index, get):
+        if subentity in futures:
+            return futures[subentity][index].result()
+        return get()
+
     paths = []
 
     for row in rows:
@@ -177,13 +162,16 @@ def list_entity_search_neighbors(currency, entity, params, breadth, depth,
         if not isinstance(subentity, int):
             continue
         match = True
-        props = cached(subentity, 'props', lambda: get_entity(currency,
-                                                              subentity))
+        props = cached(subentity, 'props',
+                       lambda: prefetched(subentity, 0, lambda: get_entity(
+                           currency, subentity)))
         if props is None:
             continue
 
-        tags = cached(subentity, 'tags', lambda: list_entity_tags(currency,
-                                                                  subentity))
+        tags = cached(subentity, 'tags',
+                      lambda: prefetched(subentity, 1,
+                                         lambda: list_entity_tags(
+                                             currency, subentity)))
         if 'category' in params:
             # find first occurrence of category in tags
             match = next((True for t in tags if t["category"] and
@@ -1,11 +1,34 @@
-from gsrest.db.cassandra import get_session
+from gsrest.db.storage import execute_async, QueryFuture
 from gsrest.model.general import Statistics
+from gsrest.util.cache import get_cache
+
+
+def fetch_statistics_async(currency):
+    def build(result):
+        if result:
+            return Statistics.from_row(result[0], currency).to_dict()
+        return None
+    return QueryFuture([execute_async(currency, 'transformed',
+                                      'summary_statistics')], build)
+
+
+def get_statistics_async(currency):
+    """ Starts fetching the summary statistics of a currency, which are
+    cached per worker """
+    cache = get_cache('statistics')
+    if cache is None:
+        return fetch_statistics_async(currency)
+    statistics = cache.get(
+        currency, lambda: fetch_statistics_async(currency).result())
+    if statistics is not None:
+        return QueryFuture.resolved(statistics)
+
+    def store(statistics):
+        if statistics is not None:
+            cache.put(currency, statistics)
+        return statistics
+    return QueryFuture([fetch_statistics_async(currency)], store)
 
 
 def get_statistics(currency):
-    session = get_session(currency, 'transformed')
-    query = "SELECT * FROM summary_statistics LIMIT 1"
-    result = session.execute(query)
-    if result:
-        return Statistics.from_row(result[0], currency).to_dict()
-    return None
+    return get_statistics_async(currency).result()
@@ -1,52 +1,230 @@
-from cassandra.query import dict_factory
-from cassandra.concurrent import execute_concurrent
+"""
+Exchange rates by block height.
 
-from gsrest.db.cassandra import get_session
+The exchange rates of a currency are held per worker in a RatesTable, a
+NumPy array indexed by block height with one float column per fiat
+currency, so that rates are looked up without querying the database. The
+table is loaded with a full scan of exchange_rates at worker start (see
+preload) or on first use, and is extended with the rates of new blocks once
+the summary statistics report them.
+"""
+import threading
+
+import numpy as np
+from flask import current_app
+
+from gsrest.db.storage import get_columns, execute, \
+    get_supported_currencies, QueryFuture
+from gsrest.model.common import RatesArray
 from gsrest.model.rates import ExchangeRate
-from gsrest.service.general_service import get_statistics
+from gsrest.service.general_service import get_statistics, \
+    get_statistics_async
+from gsrest.util.timing import timed
+
+# rates of new blocks are fetched in batches of this many heights
+RATES_BATCH_SIZE = 100
+# the full scan is paged by this many rows
+RATES_SCAN_FETCH_SIZE = 10000
+
+_lock = threading.Lock()
+
+
+class RatesTable:
+    """ Exchange rates of a currency, indexed by block height """
+
+    def __init__(self, fiat_currencies):
+        self.fiat_currencies = tuple(fiat_currencies)
+        # (values, size): all heights below size have been loaded; both are
+        # replaced in one assignment, so that readers taking the tuple once
+        # never see a size beyond the array
+        self.snapshot = (np.full((0, len(self.fiat_currencies)), np.nan), 0)
+        self.lock = threading.Lock()
+
+    @property
+    def size(self):
+        return self.snapshot[1]
+
+    def insert(self, heights, values, size=None):
+        """ Inserts the rates (one row per height) of the given heights;
+        heights below size are marked as loaded """
+        heights = np.asarray(heights, dtype=np.int64)
+        size = max(size or 0, int(heights.max()) + 1 if len(heights) else 0)
+        previous, previous_size = self.snapshot
+        table = previous
+        if size > len(table):
+            # readers keep using the previous array until it is replaced
+            table = np.full((max(size, 2 * len(table)),
+                             len(self.fiat_currencies)), np.nan)
+            table[:len(previous)] = previous
+        table[heights] = values
+        self.snapshot = (table, max(previous_size, size))
+
+    def get(self, height):
+        """ Returns the rates of a height as dict, or None if unknown """
+        values, size = self.snapshot
+        if 0 <= height < size:
+            row = values[height]
+            if not np.isnan(row).all():
+                return dict(zip(self.fiat_currencies, row.tolist()))
+        return None
+
+
+def rates_columns(currency, name):
+    """ Returns the index of the height column and the (fiat currency,
+    index) pairs of the rate columns of exchange_rates rows """
+    columns = get_columns(currency, 'transformed', name)
+    return columns['height'], [(k, i) for k, i in columns.items()
+                               if k != 'height']
+
+
+def to_arrays(rows, height_index, fiat_columns):
+    heights = [row[height_index] for row in rows]
+    values = [[np.nan if row[i] is None else row[i]
+               for _, i in fiat_columns] for row in rows]
+    return heights, np.array(values, dtype=np.float64).reshape(
+        len(heights), len(fiat_columns))
+
+
+def load_rates_table(currency):
+    """ Loads all exchange rates of a currency """
+    name = 'all_exchange_rates'
+    height_index, fiat_columns = rates_columns(currency, name)
+    table = RatesTable([k for k, _ in fiat_columns])
+    heights, values = to_arrays(
+        list(execute(currency, 'transformed', name,
+                     fetch_size=RATES_SCAN_FETCH_SIZE)),
+        height_index, fiat_columns)
+    table.insert(heights, values)
+    return table
+
+
+def fetch_rates(currency, heights):
+    """ Fetches the exchange rates of the given heights """
+    name = 'exchange_rates_by_heights'
+    height_index, fiat_columns = rates_columns(currency, name)
+    rows = []
+    for i in range(0, len(heights), RATES_BATCH_SIZE):
+        rows += execute(currency, 'transformed', name,
+                        [heights[i:i + RATES_BATCH_SIZE]])
+    return to_arrays(rows, height_index, fiat_columns)
+
+
+def get_rates_table(currency):
+    """ Returns the exchange rate table of a currency, loading it on first
+    use """
+    tables = current_app.extensions.setdefault('rates_tables', dict())
+    if currency not in tables:
+        with _lock:
+            if currency not in tables:
+                tables[currency] = load_rates_table(currency)
+    return tables[currency]
 
 
-RATES_TABLE = 'exchange_rates'
+def extend_rates_table(currency, table):
+    """ Adds the rates of the blocks reported by the summary statistics
+    since the table was loaded """
+    size = get_statistics(currency)['no_blocks']
+    if size <= table.size:
+        return
+    with table.lock:
+        if size > table.size:
+            heights, values = fetch_rates(
+                currency, list(range(table.size, size)))
+            table.insert(heights, values, size)
 
 
+def preload(app):
+    """ Loads the exchange rate tables of all currencies into the current
+    worker """
+    with app.app_context():
+        for currency in get_supported_currencies():
+            get_rates_table(currency)
+
+
+def lookup_rates(currency, heights):
+    """ Returns the exchange rates of the given heights as dict, leaving out
+    heights without rates """
+    table = get_rates_table(currency)
+    heights = set(heights)
+    if heights and max(heights) >= table.size:
+        extend_rates_table(currency, table)
+    height_rates = dict()  # key: height, value: {'eur': 0, 'usd':0}
+    unknown = []
+    for height in heights:
+        rates = table.get(height)
+        if rates is not None:
+            height_rates[height] = rates
+        elif height >= table.size:
+            unknown.append(height)
+    if unknown:
+        # heights not yet reported by the (cached) statistics
+        fetched, values = fetch_rates(currency, sorted(unknown))
+        for height, row in zip(fetched, values.tolist()):
+            height_rates[height] = dict(zip(table.fiat_currencies, row))
+    return height_rates
+
+
+def list_rates_array(currency, heights):
+    """ Returns the exchange rates of the given heights as RatesArray, with
+    one row per height (NaN if unknown), for batch conversions """
+    table = get_rates_table(currency)
+    heights = np.asarray(heights, dtype=np.int64)
+    if len(heights) and heights.max() >= table.size:
+        extend_rates_table(currency, table)
+    values, size = table.snapshot
+    rates = np.full((len(heights), len(table.fiat_currencies)), np.nan)
+    known = (heights >= 0) & (heights < size)
+    rates[known] = values[heights[known]]
+    if not known.all():
+        height_rates = lookup_rates(currency, heights[~known].tolist())
+        for i in np.flatnonzero(~known):
+            if heights[i] in height_rates:
+                rates[i] = [height_rates[heights[i]][k]
+                            for k in table.fiat_currencies]
+    return RatesArray(table.fiat_currencies, rates)
+
+
+def list_rates_range(currency, start=0, end=None, stride=1):
+    """ Returns the fiat currencies and the exchange rates of the heights
+    start, start + stride, ... up to end (inclusive, default: the latest
+    height) as array with one row per height, NaN if unknown """
+    table = get_rates_table(currency)
+    latest = get_statistics(currency)['no_blocks'] - 1
+    end = latest if end is None else min(end, latest)
+    if end >= table.size:
+        extend_rates_table(currency, table)
+    values, size = table.snapshot
+    end = min(end, size - 1)
+    if start > end:
+        return table.fiat_currencies, values[:0]
+    return table.fiat_currencies, values[start:end + 1:stride]
+
+
+def get_rates_async(currency, height=-1):
+    """ Starts fetching the exchange rate for a given block height """
+    if height == -1:
+        # the latest height is only known once the statistics arrived
+        return QueryFuture([get_statistics_async(currency)],
+                           lambda statistics: get_rates(
+                               currency, statistics['no_blocks'] - 1))
+    return QueryFuture([], lambda: get_rates(currency, height))
+
+
+@timed('rates')
 def get_rates(currency, height=-1):
     """ Returns the exchange rate for a given block height """
-
     if height == -1:
         height = get_statistics(currency)['no_blocks'] - 1
-
-    session = get_session(currency, 'transformed')
-    session.row_factory = dict_factory
-    query = "SELECT * FROM exchange_rates WHERE height = %s"
-    result = session.execute(query, [height])
-    if result.current_rows:
-        r = result.current_rows[0]
-        return ExchangeRate(r['height'], {k: v for k, v in r.items()
-                                          if k != 'height'}).to_dict()
-    raise ValueError("Cannot find height {} in currency {}"
-                     .format(height, currency))
+    rates = lookup_rates(currency, [height])
+    if height not in rates:
+        raise ValueError("Cannot find height {} in currency {}"
+                         .format(height, currency))
+    return ExchangeRate(height, rates[height]).to_dict()
 
 
+@timed('rates')
 def list_rates(currency, heights=-1):
     """ Returns the exchange rates for a list of block heights """
-    session = get_session(currency, 'transformed')
-    session.row_factory = dict_factory
-
     if heights == -1:
         heights = [get_statistics(currency)['no_blocks'] - 1]
-
-    concurrent_query = "SELECT * FROM exchange_rates WHERE height = %s"
-    statements_and_params = []
-    for h in heights:
-        statements_and_params.append((concurrent_query, [h]))
-    rates = execute_concurrent(session, statements_and_params,
-                               raise_on_first_error=False)
-    height_rates = dict()  # key: height, value: {'eur': 0, 'usd':0}
-    for (success, rate) in rates:
-        if not success:
-            pass
-        else:
-            d = rate.one()
-            height_rates[d['height']] = {k: v for k, v in d.items()
-                                         if k != 'height'}
-    return height_rates
+    return lookup_rates(currency, heights)
@@ -1,5 +1,6 @@
-from gsrest.db.cassandra import get_session
+from gsrest.db.storage import execute
 from gsrest.model.tags import Tag, Concept, Taxonomy
+from gsrest.service.common_service import search_bounds, until
 from gsrest.util.checks import LABEL_PREFIX_LENGTH
 from gsrest.util.string_edit import alphanumeric_lower
 
@@ -8,47 +9,60 @@ def list_tags(label, currency=None):
     label_norm = alphanumeric_lower(label)
     label_norm_prefix = label_norm[:LABEL_PREFIX_LENGTH]
 
-    session = get_session(currency=currency, keyspace_type='transformed')
-    query = "SELECT * FROM tag_by_label WHERE label_norm_prefix = %s and " \
-            "label_norm = %s"
-    rows = session.execute(query, [label_norm_prefix, label_norm])
+    rows = execute(currency, 'transformed', 'tag_by_label',
+                   [label_norm_prefix, label_norm])
     if rows:
         return [Tag.from_address_row(row, row.currency).to_dict()
                 for row in rows]
     return None
 
 
-def list_labels(currency, expression):
+def list_labels(currency, expression, limit=None, deadline=None):
+    """ Returns the distinct labels starting with expression (normalized),
+    at most limit of them, read until the deadline """
     # Normalize label
     expression_norm = alphanumeric_lower(expression)
     expression_norm_prefix = expression_norm[:LABEL_PREFIX_LENGTH]
 
-    session = get_session(currency=currency, keyspace_type='transformed')
-    query = "SELECT label, label_norm, currency FROM tag_by_label WHERE " \
-            "label_norm_prefix = %s GROUP BY label_norm_prefix, label_norm"
-    result = session.execute(query, [expression_norm_prefix])
-
-    if currency:
-        return list(dict.fromkeys([
-            row.label for row in result
-            if row.label_norm.startswith(expression_norm) and
-            row.currency.lower() == currency]))
-    return list(dict.fromkeys([
-        row.label for row in result
-        if row.label_norm.startswith(expression_norm)]))
+    if limit == 0:
+        return []
+    labels = []
+    seen = set()
+    start = expression_norm
+    query_limit, fetch_size = search_bounds(limit)
+    while True:
+        result = execute(currency, 'transformed', 'labels_by_prefix',
+                         [expression_norm_prefix, start, query_limit],
+                         fetch_size=fetch_size)
+        no_rows = 0
+        # further pages are only fetched until the first label not
+        # matching
+        for row in until(result, deadline):
+            no_rows += 1
+            if row.label_norm == start and start != expression_norm:
+                continue
+            if not row.label_norm.startswith(expression_norm):
+                return labels
+            start = row.label_norm
+            if (not currency or row.currency.lower() == currency) and \
+                    row.label not in seen:
+                seen.add(row.label)
+                labels.append(row.label)
+                if len(labels) == limit:
+                    return labels
+        if no_rows < query_limit:
+            return labels
+        # rows of other currencies filled the LIMIT: continue after the
+        # last label read, which is returned again
+        query_limit = limit - len(labels) + 1
+        fetch_size = query_limit
 
 
 def list_concepts(taxonomy):
-    session = get_session(currency=None, keyspace_type='tagpacks')
-
-    query = "SELECT * FROM concept_by_taxonomy_id WHERE taxonomy = %s"
-    rows = session.execute(query, [taxonomy])
+    rows = execute(None, 'tagpacks', 'concept_by_taxonomy_id', [taxonomy])
     return [Concept.from_row(row).to_dict() for row in rows]
 
 
 def list_taxonomies():
-    session = get_session(currency=None, keyspace_type='tagpacks')
-
-    query = "SELECT * FROM taxonomy_by_key LIMIT 100"
-    rows = session.execute(query)
+    rows = execute(None, 'tagpacks', 'taxonomy_by_key')
     return [Taxonomy.from_row(row).to_dict() for row in rows]
@@ -0,0 +1,246 @@
+"""
+Offline-built, sorted index of the transaction hashes of a keyspace,
+answering transaction prefix searches with a binary search over the raw
+hashes.
+
+The index is built by
+
+    flask build-tx-index <currency>
+
+into TX_INDEX_PATH/<raw keyspace>.txindex. After a header, the file holds
+the 32-byte transaction hashes in byte order, and is memory-mapped
+read-only by the workers. The hashes are sorted in runs of CHUNK_SIZE,
+spooled to temporary files next to the index and merged into it, so that
+the build holds one run in memory.
+
+The header records the number of blocks of the summary statistics read
+before scanning. The hashes of the blocks added since are read from the
+storage backend once per worker and searched along with the index; if
+there are more than MAX_NEWER_BLOCKS of them, the index is stale and
+skipped. Without an index, or for other keyspaces, prefix searches query
+the storage backend.
+"""
+import bisect
+import heapq
+import mmap
+import os
+import struct
+import tempfile
+from itertools import islice
+
+import click
+import numpy as np
+from flask import current_app
+from flask.cli import with_appcontext
+
+from gsrest.db.storage import execute, execute_many, get_keyspace_mapping
+from gsrest.service.general_service import get_statistics
+from gsrest.util.mapped_files import MappedFiles, atomic_write, \
+    decode_keyspace, encode_keyspace
+
+MAGIC = b'GSTXIX02'
+HASH_SIZE = 32
+# magic, number of hashes, number of blocks, keyspace
+HEADER = struct.Struct('<8sQQ48s')
+
+# hashes sorted in memory at once while building an index
+CHUNK_SIZE = 1000000
+# hashes read at once from each run while merging
+READ_SIZE = 4096
+# blocks newer than an index read per worker, beyond which prefix searches
+# query the storage backend
+MAX_NEWER_BLOCKS = 1000
+
+
+def init_app(app):
+    app.cli.add_command(build_tx_index_command)
+
+
+def prefix_range(expression):
+    """ Returns the smallest and largest hash starting with the hex
+    expression, or None if no hash can start with it """
+    if len(expression) > 2 * HASH_SIZE:
+        return None
+    try:
+        low = bytes.fromhex(expression + '0' * (len(expression) % 2))
+        high = bytes.fromhex(expression + 'f' * (len(expression) % 2))
+    except ValueError:
+        return None
+    return low.ljust(HASH_SIZE, b'\0'), high.ljust(HASH_SIZE, b'\xff')
+
+
+def write_run(tx_hashes, directory):
+    """ Returns a temporary file of the given hashes, sorted """
+    run = tempfile.TemporaryFile(dir=directory)
+    # fixed-width byte strings sort in byte order
+    run.write(np.sort(np.array(tx_hashes, dtype='S{}'.format(HASH_SIZE)))
+              .tobytes())
+    run.seek(0)
+    return run
+
+
+def read_run(run):
+    """ Yields the hashes of a run """
+    while True:
+        block = run.read(HASH_SIZE * READ_SIZE)
+        if not block:
+            return
+        for start in range(0, len(block), HASH_SIZE):
+            yield block[start:start + HASH_SIZE]
+
+
+def write_index(path, keyspace, tx_hashes, no_blocks=0):
+    """ Writes the index of the given transaction hashes, of a dataset of
+    no_blocks blocks, and returns their number """
+    field = encode_keyspace(keyspace)
+    directory = os.path.dirname(os.path.abspath(path))
+    tx_hashes = iter(tx_hashes)
+    runs = []
+    try:
+        while True:
+            chunk = list(islice(tx_hashes, CHUNK_SIZE))
+            if not chunk:
+                break
+            runs.append(write_run(chunk, directory))
+        count = 0
+        with atomic_write(path) as f:
+            f.write(HEADER.pack(MAGIC, 0, no_blocks, field))
+            for tx_hash in heapq.merge(*[read_run(run) for run in runs]):
+                f.write(tx_hash)
+                count += 1
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, count, no_blocks, field))
+    finally:
+        for run in runs:
+            run.close()
+    return count
+
+
+def search_sorted(tx_hashes, expression, limit=None):
+    """ Returns the hex hashes of a sorted sequence of hashes starting with
+    the hex expression, in order, at most limit of them """
+    bounds = prefix_range(expression)
+    if bounds is None:
+        return []
+    low, high = bounds
+    matches = []
+    position = bisect.bisect_left(tx_hashes, low)
+    while position < len(tx_hashes) and \
+            (limit is None or len(matches) < limit):
+        tx_hash = tx_hashes[position]
+        if tx_hash > high:
+            break
+        matches.append(tx_hash.hex())
+        position += 1
+    return matches
+
+
+class TxIndex:
+    """ Read-only, memory-mapped sorted transaction hash index """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.no_blocks, keyspace = \
+            HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError('Not a transaction index: {}'.format(path))
+        self.keyspace = decode_keyspace(keyspace)
+        # number of blocks read and the sorted hashes of the blocks newer
+        # than the index, swapped in one assignment
+        self.newer = (self.no_blocks, [])
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, position):
+        start = HEADER.size + position * HASH_SIZE
+        return self._mmap[start:start + HASH_SIZE]
+
+    def search(self, expression, limit=None):
+        """ Returns the hex hashes starting with the hex expression, in
+        order, at most limit of them """
+        return search_sorted(self, expression, limit)
+
+
+indexes = MappedFiles('transaction index', 'tx_indexes', 'TX_INDEX_PATH',
+                      TxIndex)
+
+
+def index_path(currency):
+    return indexes.path('{}.txindex'.format(
+        get_keyspace_mapping(currency, 'raw')))
+
+
+def get_tx_index(currency):
+    """ Returns the transaction index of a currency, opened on first use,
+    or None if there is none for the current keyspace """
+    return indexes.get(currency, index_path(currency),
+                       get_keyspace_mapping(currency, 'raw'))
+
+
+def get_newer_txs(currency, index):
+    """ Returns the sorted hashes of the blocks newer than the index, read
+    when the statistics report new blocks, or None if there are more than
+    MAX_NEWER_BLOCKS of them or reading them failed """
+    statistics = get_statistics(currency)
+    no_blocks = statistics['no_blocks'] if statistics else 0
+    read, tx_hashes = index.newer
+    if no_blocks <= read:
+        return tx_hashes
+    if no_blocks - index.no_blocks > MAX_NEWER_BLOCKS:
+        return None
+    results = execute_many(currency, 'raw', 'block_transactions',
+                           [[height] for height in range(read, no_blocks)])
+    if any(result is None for result in results):
+        return None
+    added = [bytes(tx.tx_hash) for result in results for row in result
+             for tx in row.txs]
+    tx_hashes = sorted(tx_hashes + added)
+    index.newer = (no_blocks, tx_hashes)
+    return tx_hashes
+
+
+def search_tx_index(currency, expression, limit=None):
+    """ Returns the hex hashes starting with the hex expression, at most
+    limit of them, or None if there is no current index to search """
+    index = get_tx_index(currency)
+    if index is None:
+        return None
+    newer = get_newer_txs(currency, index)
+    if newer is None:
+        return None
+    matches = index.search(expression, limit)
+    if not newer:
+        return matches
+    # hex hashes of equal length sort like the hashes; blocks added while
+    # building the index are in both
+    return sorted(set(matches + search_sorted(newer, expression, limit)))[
+        :limit]
+
+
+def build_index(currency, path):
+    """ Writes the index of all transaction hashes of a currency and returns
+    their number """
+    # read before scanning, so that blocks added while scanning are read
+    # by the workers
+    statistics = get_statistics(currency)
+    # further pages are fetched while iterating
+    tx_hashes = (bytes(row.tx_hash) for row
+                 in execute(currency, 'raw', 'all_transaction_hashes'))
+    return write_index(path, get_keyspace_mapping(currency, 'raw'),
+                       tx_hashes, statistics['no_blocks'])
+
+
+@click.command('build-tx-index')
+@click.argument('currency')
+@click.option('--output', help='index file (default: '
+              'TX_INDEX_PATH/<keyspace>.txindex)')
+@with_appcontext
+def build_tx_index_command(currency, output):
+    """Build the sorted transaction hash index of a currency."""
+    path = output or index_path(currency)
+    if path is None:
+        raise click.UsageError('Set TX_INDEX_PATH or --output')
+    count = build_index(currency, path)
+    current_app.logger.info('Wrote %d transaction hashes to %s', count, path)
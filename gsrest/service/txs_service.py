@@ -1,19 +1,20 @@
-from cassandra.query import SimpleStatement
 
-from gsrest.db.cassandra import get_session
+from gsrest.db.storage import execute
 from gsrest.model.txs import Tx
-from gsrest.service.rates_service import get_rates, list_rates
+from gsrest.service.bloom_filters import is_unknown, is_unknown_prefix
+from gsrest.service.common_service import search_bounds, until
+from gsrest.service.tx_index import prefix_range, search_tx_index
+from gsrest.service.rates_service import get_rates, list_rates_array
 
 TXS_PAGE_SIZE = 100
 TX_PREFIX_LENGTH = 5
 
 
 def get_tx(currency, tx_hash):
-    session = get_session(currency, 'raw')
-
-    query = "SELECT * FROM transaction WHERE tx_prefix = %s AND tx_hash = %s"
-    result = session.execute(query, [tx_hash[:TX_PREFIX_LENGTH],
-                                     bytearray.fromhex(tx_hash)])
+    if is_unknown(currency, 'txs', tx_hash.lower()):
+        return None
+    result = execute(currency, 'raw', 'transaction',
+                     [tx_hash[:TX_PREFIX_LENGTH], bytearray.fromhex(tx_hash)])
     if result:
         return Tx.from_row(result[0],
                            get_rates(currency,
@@ -22,26 +23,33 @@ def get_tx(currency, tx_hash):
 
 
 def list_txs(currency, paging_state=None):
-    session = get_session(currency, 'raw')
-
-    query = "SELECT * FROM transaction"
-    statement = SimpleStatement(query, fetch_size=TXS_PAGE_SIZE)
-    results = session.execute(statement, paging_state=paging_state)
+    results = execute(currency, 'raw', 'transactions',
+                      fetch_size=TXS_PAGE_SIZE, paging_state=paging_state)
 
     paging_state = results.paging_state
     heights = [row.height for row in results.current_rows]
-    rates = list_rates(currency, heights)
-    tx_list = [Tx.from_row(row, rates[row.height])
-               .to_dict() for row in results.current_rows]
+    rates = list_rates_array(currency, heights)
+    tx_list = [tx.to_dict() for tx in Tx.from_rows(results.current_rows,
+                                                   rates)]
 
     return paging_state, tx_list
 
 
-def list_matching_txs(currency, expression, leading_zeros):
-    session = get_session(currency, 'raw')
-    query = 'SELECT tx_hash from transaction where tx_prefix = %s'
-    results = session.execute(query, [expression[:TX_PREFIX_LENGTH]])
-    txs = ["0" * leading_zeros + str(hex(int.from_bytes(row.tx_hash,
-                                                        byteorder="big")))[2:]
-           for row in results]
-    return [tx for tx in txs if tx.startswith(expression)]
+def list_matching_txs(currency, expression, limit=None, deadline=None):
+    """ Returns the transaction hashes starting with expression, at most
+    limit of them, read until the deadline """
+    expression = expression.lower()
+    if is_unknown_prefix(currency, 'txs', expression):
+        return []
+    matches = search_tx_index(currency, expression, limit)
+    if matches is not None:
+        return matches
+    bounds = prefix_range(expression)
+    if bounds is None:
+        return []
+    query_limit, fetch_size = search_bounds(limit)
+    results = execute(currency, 'raw', 'transaction_hashes',
+                      [expression[:TX_PREFIX_LENGTH], *bounds, query_limit],
+                      fetch_size=fetch_size)
+    # only the hashes starting with expression are read
+    return [row.tx_hash.hex() for row in until(results, deadline)][:limit]
@@ -0,0 +1,284 @@
+"""
+Per-worker caches.
+
+RefreshingCache holds slowly changing values, such as the latest summary
+statistics of a currency. An entry is fresh for LATEST_CACHE_TTL seconds.
+Once it turns stale, it is reloaded in a background thread while the stale
+value keeps being served, for at most LATEST_CACHE_MAX_STALE further
+seconds, so that requests do not wait for the reload. Setting
+LATEST_CACHE_TTL to 0 disables these caches.
+
+LRUCache holds immutable values, such as the address ids of a keyspace,
+bounded by the estimated size of its entries. It may be backed by a
+SharedCache, a SQLite file shared by all workers of a host and bounded by
+its number of entries.
+"""
+import json
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from gsrest.config import Config
+from gsrest.util.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+
+# returned for keys not in a cache, as None may be a cached value
+MISSING = object()
+
+
+class RefreshingCache:
+    """ Values by key, reloaded in the background once stale """
+
+    def __init__(self, name, ttl, max_stale):
+        self.name = name
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._entries = dict()  # key: (value, time loaded)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get(self, key, load):
+        """ Returns the cached value of key, or None if it is missing or
+        expired. A stale value is returned while load() reloads it in a
+        background thread within the current application context. """
+        entry = self._entries.get(key)
+        age = time.monotonic() - entry[1] if entry is not None else None
+        if age is None or age > self.ttl + self.max_stale:
+            record_cache(self.name, False)
+            return None
+        if age > self.ttl:
+            self.refresh(key, load)
+        record_cache(self.name, True)
+        return entry[0]
+
+    def put(self, key, value):
+        self._entries[key] = (value, time.monotonic())
+
+    def refresh(self, key, load):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        app = current_app._get_current_object()
+
+        def run():
+            try:
+                with app.app_context():
+                    value = load()
+                if value is not None:
+                    self.put(key, value)
+            except Exception:
+                logger.exception('Refreshing %s of %s failed', self.name, key)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+        threading.Thread(target=run, daemon=True,
+                         name='refresh-{}-{}'.format(self.name, key)).start()
+
+
+def entry_size(key, value):
+    """ Estimates the memory held by a cache entry, in bytes """
+    return sys.getsizeof(key) + sys.getsizeof(value) + 100
+
+
+class LRUCache:
+    """ Least recently used values by key, bounded by the total estimated
+    size (bytes) of the entries and optionally backed by a shared cache """
+
+    def __init__(self, name, max_size, shared=None, sizeof=entry_size):
+        self.name = name
+        self.max_size = max_size
+        self.shared = shared
+        self.sizeof = sizeof
+        self.size = 0
+        self._entries = OrderedDict()  # key: (value, size)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """ Returns the cached value of key, or MISSING """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None:
+            record_cache(self.name, True)
+            return entry[0]
+        value = MISSING
+        if self.shared is not None:
+            value = self.shared.get(key)
+            if value is not MISSING:
+                self._put(key, value)
+        record_cache(self.name, value is not MISSING)
+        return value
+
+    def put(self, key, value):
+        self._put(key, value)
+        if self.shared is not None:
+            self.shared.put(key, value)
+
+    def _put(self, key, value):
+        size = self.sizeof(key, value)
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_size and self._entries:
+                self.size -= self._entries.popitem(last=False)[1][1]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SharedCache:
+    """ JSON-serializable values by key in a SQLite file, shared by the
+    workers of a host and bounded to max_entries rows. Every
+    EVICTION_INTERVAL updates, the least recently accessed rows beyond the
+    bound are deleted. Lookups only read: the access times of hits are
+    buffered per worker and written before an eviction, or once
+    EVICTION_INTERVAL keys are buffered, so that hits do not contend for
+    the write lock of the file. Lookups failing, e.g. while the file is
+    locked, are treated as misses. """
+
+    EVICTION_INTERVAL = 1000
+
+    def __init__(self, path, max_entries=None, timeout=0.1):
+        self.path = path
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._local = threading.local()
+        self._updates = 0
+        # key: time of the last hit not yet written
+        self._accessed = dict()
+
+    def connection(self):
+        # SQLite connections must not be shared across threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout,
+                                         isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS cache '
+                               '(key TEXT PRIMARY KEY, value TEXT, '
+                               'accessed REAL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS cache_accessed '
+                               'ON cache (accessed)')
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        try:
+            connection = self.connection()
+            row = connection.execute(
+                'SELECT value FROM cache WHERE key = ?', (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.debug('Shared cache lookup failed: %s', e)
+            return MISSING
+        if row is None:
+            return MISSING
+        # access times only matter for eviction
+        if self.max_entries:
+            self._accessed[key] = time.time()
+            if len(self._accessed) >= self.EVICTION_INTERVAL:
+                self.flush()
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        try:
+            self.connection().execute(
+                'INSERT OR REPLACE INTO cache VALUES (?, ?, ?)',
+                (key, json.dumps(value), time.time()))
+        except sqlite3.Error as e:
+            logger.debug('Shared cache update failed: %s', e)
+            return
+        self._updates += 1
+        if self.max_entries and \
+                self._updates % self.EVICTION_INTERVAL == 0:
+            self.evict()
+
+    def flush(self):
+        """ Writes the buffered access times; they are dropped if the file
+        is locked """
+        accessed, self._accessed = self._accessed, dict()
+        if not accessed:
+            return
+        try:
+            with self.connection() as connection:
+                connection.execute('BEGIN')
+                connection.executemany(
+                    'UPDATE cache SET accessed = ? WHERE key = ?',
+                    [(accessed_at, key)
+                     for key, accessed_at in accessed.items()])
+        except sqlite3.Error as e:
+            logger.debug('Shared cache access times lost: %s', e)
+
+    def evict(self):
+        """ Deletes the least recently accessed rows beyond max_entries """
+        self.flush()
+        try:
+            connection = self.connection()
+            count = connection.execute(
+                'SELECT COUNT(*) FROM cache').fetchone()[0]
+            if count > self.max_entries:
+                connection.execute(
+                    'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                    'ORDER BY accessed LIMIT ?)',
+                    (count - self.max_entries,))
+        except sqlite3.Error as e:
+            logger.debug('Shared cache eviction failed: %s', e)
+
+    def __len__(self):
+        return self.connection().execute(
+            'SELECT COUNT(*) FROM cache').fetchone()[0]
+
+
+def get_lru_cache(name, size_setting, shared_setting=None,
+                  shared_size_setting=None):
+    """ Returns the named LRU cache of the current application, sized by
+    the given config setting and backed by the shared cache file of the
+    given setting, bounded by the number of entries of the shared size
+    setting, if any; or None if the cache is disabled """
+    config = current_app.config
+    max_size = config.get(size_setting, getattr(Config, size_setting))
+    if not max_size:
+        return None
+    caches = current_app.extensions.setdefault('caches', dict())
+    if name not in caches:
+        with _lock:
+            if name not in caches:
+                path = config.get(shared_setting,
+                                  getattr(Config, shared_setting)) \
+                    if shared_setting else None
+                max_entries = config.get(
+                    shared_size_setting,
+                    getattr(Config, shared_size_setting)) \
+                    if shared_size_setting else None
+                caches[name] = LRUCache(
+                    name, max_size,
+                    SharedCache(path, max_entries) if path else None)
+    return caches[name]
+
+
+def get_cache(name):
+    """ Returns the named cache of the current application, or None if
+    caching is disabled """
+    config = current_app.config
+    ttl = config.get('LATEST_CACHE_TTL', Config.LATEST_CACHE_TTL)
+    if not ttl:
+        return None
+    caches = current_app.extensions.setdefault('caches', dict())
+    if name not in caches:
+        with _lock:
+            if name not in caches:
+                caches[name] = RefreshingCache(
+                    name, ttl, config.get('LATEST_CACHE_MAX_STALE',
+                                          Config.LATEST_CACHE_MAX_STALE))
+    return caches[name]
@@ -2,13 +2,15 @@ from functools import wraps
 from flask import request
 
 from gsrest.service.auth_helper import Auth
+from gsrest.util.timing import timed
 
 
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
 
-        data, status = Auth.get_logged_in_user(request)
+        with timed('auth'):
+            data, status = Auth.get_logged_in_user(request)
         token = data.get('data')
 
         if not token:
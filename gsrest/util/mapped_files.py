@@ -0,0 +1,131 @@
+"""
+Offline-built files memory-mapped read-only by the workers: the address
+dictionaries, Bloom filters and prefix search indexes.
+
+Files are built by flask CLI commands, one per keyspace, into the directory
+of a config setting. They are written to a temporary file which is then
+moved into place, so that workers never see a partially written file. The
+header of a file records the keyspace it was built from; files of other
+keyspaces are ignored. Workers check every CHECK_INTERVAL seconds whether
+a file was replaced, by its inode and modification time, and reopen it.
+"""
+import os
+import struct
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+from flask import current_app
+
+from gsrest.config import Config
+
+# bytes of the keyspace field of the file headers
+KEYSPACE_SIZE = 48
+# seconds between checks of whether an opened file was replaced
+CHECK_INTERVAL = 5.0
+
+# mapped: opened file or None, signature: see file_signature, checked:
+# monotonic time of the last check
+OpenedFile = namedtuple('OpenedFile', ['mapped', 'signature', 'checked'])
+
+
+@contextmanager
+def atomic_write(path):
+    """ Opens a temporary file for writing, which replaces the file at path
+    once written """
+    tmp_path = path + '.tmp'
+    # readable, so that parts of the file can be memory-mapped while written
+    with open(tmp_path, 'w+b') as f:
+        yield f
+    os.replace(tmp_path, path)
+
+
+def encode_keyspace(keyspace):
+    """ Returns the keyspace field of a file header; keyspace names not
+    fitting into it are rejected rather than truncated """
+    field = (keyspace or '').encode('utf-8')
+    if len(field) > KEYSPACE_SIZE:
+        raise ValueError('Keyspace name longer than {} bytes: {}'
+                         .format(KEYSPACE_SIZE, keyspace))
+    return field
+
+
+def decode_keyspace(field):
+    return field.rstrip(b'\0').decode('utf-8')
+
+
+def file_signature(path):
+    """ Returns what changes when the file at path is replaced, or None if
+    there is none """
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return path, stat.st_ino, stat.st_mtime_ns
+
+
+class MappedFiles:
+    """ Files of one kind, opened on first use per key (e.g. currency) and
+    held in app.extensions[extension] """
+
+    def __init__(self, name, extension, setting, open_file):
+        self.name = name
+        self.extension = extension
+        self.setting = setting
+        # path: object with a keyspace attribute
+        self.open_file = open_file
+        self._lock = threading.Lock()
+
+    def directory(self):
+        return current_app.config.get(self.setting,
+                                      getattr(Config, self.setting))
+
+    def path(self, filename):
+        """ Returns the path of a file in the configured directory, or None
+        if there is none """
+        directory = self.directory()
+        if not directory:
+            return None
+        return os.path.join(directory, filename)
+
+    def get(self, key, path, keyspace):
+        """ Returns the file at path, opened on first use and reopened when
+        it was replaced, or None if it is missing or belongs to another
+        keyspace """
+        files = current_app.extensions.setdefault(self.extension, dict())
+        opened = files.get(key)
+        now = time.monotonic()
+        if opened is not None and now < opened.checked + CHECK_INTERVAL:
+            return opened.mapped
+        with self._lock:
+            opened = files.get(key)
+            if opened is None or now >= opened.checked + CHECK_INTERVAL:
+                signature = file_signature(path)
+                if opened is not None and opened.signature == signature:
+                    mapped = opened.mapped
+                else:
+                    # mappings of the replaced file stay valid while in use
+                    mapped = self.open(path, keyspace)
+                opened = OpenedFile(mapped, signature, now)
+                files[key] = opened
+        return opened.mapped
+
+    def open(self, path, keyspace):
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            mapped = self.open_file(path)
+        except (OSError, ValueError, struct.error) as e:
+            current_app.logger.warning('Cannot open %s %s: %s', self.name,
+                                       path, e)
+            return None
+        if mapped.keyspace != keyspace:
+            current_app.logger.warning('%s %s belongs to keyspace %s',
+                                       self.name.capitalize(), path,
+                                       mapped.keyspace)
+            return None
+        current_app.logger.info('Opened %s %s', self.name, path)
+        return mapped
@@ -0,0 +1,195 @@
+"""
+Prometheus metrics, served at /metrics if METRICS is enabled.
+
+Exported are request latencies per route, requests in progress, query
+counts and latencies per catalog query, cache lookups per cache and the
+connection pool state of the storage backend. Requires the optional
+prometheus_client package (pip install gsrest[metrics]).
+
+When served by several gunicorn workers, the environment variable
+PROMETHEUS_MULTIPROC_DIR must point to an empty directory shared by all
+workers, so that every worker reports the metrics of all of them (see
+conf/gunicorn-conf.py).
+"""
+import os
+import time
+
+from flask import Response, current_app, g, has_app_context, request
+
+from gsrest.config import Config
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:  # optional dependency
+    prometheus_client = None
+
+MULTIPROC_DIR_VARIABLES = ('PROMETHEUS_MULTIPROC_DIR',
+                           'prometheus_multiproc_dir')
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+
+# the connection pool gauges are refreshed at most this often (seconds)
+POOL_STATS_INTERVAL = 5.0
+
+
+class Metrics:
+    """ Metric objects of the worker process """
+
+    def __init__(self):
+        Counter, Gauge, Histogram = prometheus_client.Counter, \
+            prometheus_client.Gauge, prometheus_client.Histogram
+        self.requests = Counter(
+            'gsrest_requests_total', 'Requests by route and status',
+            ['method', 'route', 'status'])
+        self.request_latency = Histogram(
+            'gsrest_request_duration_seconds', 'Request latency by route',
+            ['method', 'route'], buckets=LATENCY_BUCKETS)
+        self.requests_in_progress = Gauge(
+            'gsrest_requests_in_progress', 'Requests in progress by route',
+            ['method', 'route'], multiprocess_mode='livesum')
+        self.queries = Counter(
+            'gsrest_queries_total', 'Queries by catalog name and outcome',
+            ['query', 'outcome'])
+        self.query_latency = Histogram(
+            'gsrest_query_duration_seconds', 'Query latency by catalog name',
+            ['query'], buckets=LATENCY_BUCKETS)
+        self.cache_requests = Counter(
+            'gsrest_cache_requests_total', 'Cache lookups by cache and result',
+            ['cache', 'result'])
+        self.pool_connections = Gauge(
+            'gsrest_cassandra_pool_open_connections',
+            'Open driver connections by host', ['host'],
+            multiprocess_mode='livesum')
+        self.pool_in_flight = Gauge(
+            'gsrest_cassandra_pool_in_flight_requests',
+            'Requests in flight on driver connections by host', ['host'],
+            multiprocess_mode='livesum')
+        self.driver_errors = Gauge(
+            'gsrest_cassandra_driver_errors',
+            'Driver request errors, retries and ignores by type', ['type'],
+            multiprocess_mode='livesum')
+        self.driver_hosts = Gauge(
+            'gsrest_cassandra_driver_hosts',
+            'Known and connected Cassandra hosts', ['state'],
+            multiprocess_mode='livemax')
+        self.pool_stats_updated = 0.0
+
+
+_metrics = None
+
+
+def get_metrics():
+    """ Returns the metrics, if enabled for the current application """
+    if has_app_context() and 'metrics' in current_app.extensions:
+        return current_app.extensions['metrics']
+    return None
+
+
+def get_multiproc_dir():
+    for variable in MULTIPROC_DIR_VARIABLES:
+        if os.environ.get(variable):
+            return os.environ[variable]
+    return None
+
+
+def route():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+def start_request():
+    metrics = get_metrics()
+    g.metrics_started = time.perf_counter()
+    metrics.requests_in_progress.labels(request.method, route()).inc()
+
+
+def record_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def end_request(exception=None):
+    metrics = get_metrics()
+    if 'metrics_started' not in g:
+        return
+    labels = (request.method, route())
+    metrics.requests_in_progress.labels(*labels).dec()
+    metrics.request_latency.labels(*labels).observe(
+        time.perf_counter() - g.metrics_started)
+    metrics.requests.labels(*labels, g.get('metrics_status', 500)).inc()
+    if time.monotonic() - metrics.pool_stats_updated > POOL_STATS_INTERVAL:
+        update_pool_stats(metrics)
+
+
+def observe_query(name, future):
+    """ Counts a started query and observes its latency on completion of
+    its first page; the callbacks are called again for further pages """
+    metrics = get_metrics()
+    if metrics is None:
+        return
+    started = time.perf_counter()
+    observed = False
+
+    def observe(outcome):
+        nonlocal observed
+        if observed:
+            return
+        observed = True
+        metrics.queries.labels(name, outcome).inc()
+        metrics.query_latency.labels(name).observe(
+            time.perf_counter() - started)
+
+    future.add_callbacks(lambda *_: observe('success'),
+                         lambda *_: observe('error'))
+
+
+def record_cache(cache, hit):
+    """ Counts a lookup of the named cache """
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.cache_requests.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def update_pool_stats(metrics):
+    from gsrest.db.storage import get_backend
+    stats = get_backend().get_stats()
+    for host, pool in stats.get('pool', {}).items():
+        metrics.pool_connections.labels(host).set(pool['open_connections'])
+        metrics.pool_in_flight.labels(host).set(pool['in_flight'])
+    driver = stats.get('driver', {})
+    for error in ('connection_errors', 'write_timeouts', 'read_timeouts',
+                  'unavailables', 'other_errors', 'retries', 'ignores'):
+        if error in driver:
+            metrics.driver_errors.labels(error).set(driver[error])
+    for state, stat in (('known', 'known_hosts'),
+                        ('connected', 'connected_to')):
+        if stat in driver:
+            metrics.driver_hosts.labels(state).set(driver[stat])
+    metrics.pool_stats_updated = time.monotonic()
+
+
+def serve_metrics():
+    update_pool_stats(get_metrics())
+    if get_multiproc_dir():
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return Response(prometheus_client.generate_latest(registry),
+                    mimetype=prometheus_client.CONTENT_TYPE_LATEST)
+
+
+def init_app(app):
+    global _metrics
+    if not app.config.get('METRICS', Config.METRICS):
+        return
+    if prometheus_client is None:
+        raise RuntimeError('METRICS requires the prometheus_client package')
+    if _metrics is None:
+        # metrics are registered once per process
+        _metrics = Metrics()
+    app.extensions['metrics'] = _metrics
+    app.before_request(start_request)
+    app.after_request(record_status)
+    app.teardown_request(end_request)
+    app.add_url_rule('/metrics', 'metrics', serve_metrics)
@@ -0,0 +1,159 @@
+"""
+Slow-query log.
+
+If SLOW_QUERY_THRESHOLD (seconds) is set, every query issued while serving a
+request is recorded with its catalog name, keyspace, bound parameters, the
+rows and pages fetched and its latency, measured from the start of the query
+to the arrival of its last fetched page. Once the response has been sent,
+queries slower than the threshold are logged to the 'gsrest.slow_queries'
+logger.
+
+A fraction SLOW_QUERY_TRACE_RATE of all queries is executed with Cassandra
+tracing; if such a query turns out to be slow, its server-side trace events
+are added to the log entry. Tracing adds load to the cluster, so the rate
+should be kept low.
+"""
+import logging
+import random
+import time
+
+from flask import current_app, g, has_app_context, request
+
+from gsrest.config import Config
+
+logger = logging.getLogger('gsrest.slow_queries')
+
+# bound parameter lists are shortened to this many items in the log
+MAX_LOGGED_ITEMS = 10
+# seconds to wait for the trace of a slow query
+TRACE_MAX_WAIT = 2.0
+
+
+class QueryRecord:
+    """ Progress of a query, updated from the backend's callbacks, which
+    are called once per fetched page """
+
+    def __init__(self, name, keyspace, params, future, traced):
+        self.name = name
+        self.keyspace = keyspace
+        self.params = params
+        self.future = future
+        self.traced = traced
+        self.started = time.perf_counter()
+        self.finished = None
+        self.rows = 0
+        self.pages = 0
+        self.error = None
+
+    def on_page(self, rows):
+        self.pages += 1
+        self.rows += len(rows)
+        self.finished = time.perf_counter()
+        self.release()
+
+    def on_error(self, exception):
+        self.error = exception
+        self.finished = time.perf_counter()
+        self.release()
+
+    def release(self):
+        """ Drops the future, which holds the fetched rows until the
+        response is closed, unless its trace is needed """
+        if not self.traced:
+            self.future = None
+
+    def latency(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+
+def format_value(value):
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    if isinstance(value, (list, tuple)):
+        items = [format_value(v) for v in value[:MAX_LOGGED_ITEMS]]
+        if len(value) > MAX_LOGGED_ITEMS:
+            items.append('... {} more'.format(len(value) - MAX_LOGGED_ITEMS))
+        return '[{}]'.format(', '.join(items))
+    return repr(value)
+
+
+def format_record(record, request_line):
+    message = 'Slow query {} on {}: {:.1f} ms, {} rows, {} pages, ' \
+              'params {}, request {}'.format(
+                  record.name, record.keyspace, record.latency() * 1000,
+                  record.rows, record.pages,
+                  format_value(list(record.params or [])), request_line)
+    if record.finished is None:
+        message += ' (unfinished)'
+    if record.error is not None:
+        message += ' (failed: {})'.format(record.error)
+    return message
+
+
+def format_trace(trace):
+    lines = ['Trace {} ({}), coordinator {}:'.format(
+        trace.trace_id, trace.duration, trace.coordinator)]
+    for event in trace.events:
+        elapsed = int(event.source_elapsed.total_seconds() * 1000000) \
+            if event.source_elapsed else '-'
+        lines.append('  {:>8} us  {}  {}'.format(elapsed, event.source,
+                                                 event.description))
+    return '\n'.join(lines)
+
+
+def sample_trace():
+    """ Decides whether the next query is executed with tracing """
+    if not has_app_context() or 'slow_queries' not in g:
+        return False
+    rate = current_app.config.get('SLOW_QUERY_TRACE_RATE',
+                                  Config.SLOW_QUERY_TRACE_RATE)
+    return rate > 0 and random.random() < rate
+
+
+def record_query(name, keyspace, params, future, traced=False):
+    """ Records a started query of the current request, or of the request
+    whose records were handed to the current thread (see
+    gsrest.apis.general.run_searches) """
+    if not has_app_context() or 'slow_queries' not in g:
+        return
+    record = QueryRecord(name, keyspace, params, future, traced)
+    g.slow_queries.append(record)
+    future.add_callbacks(record.on_page, record.on_error)
+
+
+def start_request():
+    g.slow_queries = []
+
+
+def flush(records, threshold, request_line):
+    for record in records:
+        if record.latency() < threshold:
+            continue
+        message = format_record(record, request_line)
+        if record.traced:
+            try:
+                message += '\n' + format_trace(
+                    record.future.get_query_trace(TRACE_MAX_WAIT))
+            except Exception as e:
+                message += '\nTrace unavailable: {}'.format(e)
+        logger.warning(message)
+
+
+def end_request(response):
+    # streamed responses keep adding queries to the list until they are
+    # closed
+    records = g.slow_queries
+    threshold = current_app.config.get('SLOW_QUERY_THRESHOLD',
+                                       Config.SLOW_QUERY_THRESHOLD)
+    request_line = '{} {}'.format(request.method,
+                                  request.full_path.rstrip('?'))
+    response.call_on_close(lambda: flush(records, threshold, request_line))
+    return response
+
+
+def init_app(app):
+    if app.config.get('SLOW_QUERY_THRESHOLD',
+                      Config.SLOW_QUERY_THRESHOLD) is None:
+        return
+    app.before_request(start_request)
+    app.after_request(end_request)
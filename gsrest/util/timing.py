@@ -0,0 +1,117 @@
+"""
+Per-request timing breakdown, emitted as a Server-Timing response header
+(https://www.w3.org/TR/server-timing/) if SERVER_TIMING is enabled.
+
+A request is split into exclusive phases: while a nested phase runs, the
+enclosing one is paused, so the durations add up to the request time.
+Requests start in the 'model' phase, which covers the service layer and the
+response models except for the time spent in the nested phases:
+
+    auth       user database lookup and JWT verification
+    db         waiting for query results
+    rates      fetching exchange rates
+    serialize  encoding the response body
+
+The db entry also reports the number of queries and fetched rows.
+"""
+import time
+from contextlib import contextmanager
+
+from flask import g, has_app_context
+
+from gsrest.config import Config
+
+PHASES = ('auth', 'db', 'rates', 'model', 'serialize')
+
+
+class RequestTimer:
+    """ Accumulates the phase durations and query counts of a request """
+
+    def __init__(self, phase='model'):
+        self.durations = dict.fromkeys(PHASES, 0.0)
+        self.stack = [phase]
+        self.started = self.resumed = time.perf_counter()
+        self.total = None
+        self.queries = 0
+        self.rows = 0
+
+    def _switch(self):
+        now = time.perf_counter()
+        self.durations[self.stack[-1]] += now - self.resumed
+        self.resumed = now
+
+    def enter(self, phase):
+        self._switch()
+        self.stack.append(phase)
+
+    def exit(self):
+        self._switch()
+        self.stack.pop()
+
+    def stop(self):
+        self._switch()
+        self.total = self.resumed - self.started
+
+    def header(self):
+        metrics = []
+        for phase in PHASES:
+            metric = '{};dur={:.2f}'.format(phase,
+                                            self.durations[phase] * 1000)
+            if phase == 'db':
+                metric += ';desc="{} queries, {} rows"'.format(
+                    self.queries, self.rows)
+            metrics.append(metric)
+        metrics.append('total;dur={:.2f}'.format(self.total * 1000))
+        return ', '.join(metrics)
+
+
+def get_timer():
+    """ Returns the timer of the current request, if timing is enabled """
+    if has_app_context():
+        return g.get('timer')
+    return None
+
+
+@contextmanager
+def timed(phase):
+    """ Accounts the enclosed code (or decorated function) to a phase """
+    timer = get_timer()
+    if timer is None:
+        yield
+        return
+    timer.enter(phase)
+    try:
+        yield
+    finally:
+        timer.exit()
+
+
+def count_query():
+    timer = get_timer()
+    if timer is not None:
+        timer.queries += 1
+
+
+def count_rows(result):
+    """ Counts the rows of the current page of a result set """
+    timer = get_timer()
+    if timer is not None:
+        timer.rows += len(result.current_rows)
+
+
+def start_timer():
+    g.timer = RequestTimer()
+
+
+def add_header(response):
+    timer = g.pop('timer', None)
+    if timer is not None:
+        timer.stop()
+        response.headers['Server-Timing'] = timer.header()
+    return response
+
+
+def init_app(app):
+    if app.config.get('SERVER_TIMING', Config.SERVER_TIMING):
+        app.before_request(start_timer)
+        app.after_request(add_header)
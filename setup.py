@@ -38,8 +38,12 @@ setup(
         'flask-restplus>=0.13.0',
         'pyjwt>=1.7.1',
         'cassandra-driver>=3.23.0',
+        'numpy>=1.17.0',
         'Werkzeug>=0.16.0',
         'pyjwt>=1.7.1'
     ],
+    extras_require={
+        'metrics': ['prometheus_client>=0.8.0', 'scales>=1.0.9']
+    },
     test_suite="tests"
 )
@@ -1,5 +1,6 @@
 from collections import namedtuple
 
+from gsrest.db.storage import QueryFuture
 from gsrest.model.addresses import Address, AddressTx
 from gsrest.model.txs import TxSummary
 from gsrest.model.tags import Tag
@@ -38,11 +39,11 @@ TEST_ADDRESSES = {
 TEST_ADDRESSES_TXS = {
     address1: [
         AddressTx(address1, first_tx.height, first_tx.timestamp,
-                  first_tx.tx_hash.hex(), 649456, {'eur': 0.5, 'usd': 0.5})
-        .to_dict(),
+                  first_tx.tx_hash.hex(),
+                  {'value': 649456, 'eur': 0.0, 'usd': 0.0}).to_dict(),
         AddressTx(address1, last_tx.height, last_tx.timestamp,
-                  last_tx.tx_hash.hex(), -649456, {'eur': 0.5, 'usd': 0.5})
-        .to_dict()
+                  last_tx.tx_hash.hex(),
+                  {'value': -649456, 'eur': 0.0, 'usd': 0.0}).to_dict()
     ]
 }
 
@@ -64,17 +65,18 @@ TEST_ADDRESSES_TAGS = {
 
 def test_address(client, auth, monkeypatch):
 
-    def mock_get_address(*args):
+    def mock_get_address_async(*args):
         check_inputs(currency=args[0])
-        return TEST_ADDRESSES.get(args[1])
-    monkeypatch.setattr(gsrest.service.common_service, "get_address",
-                        mock_get_address)
+        return QueryFuture.resolved(TEST_ADDRESSES.get(args[1]))
+    monkeypatch.setattr(gsrest.service.common_service, "get_address_async",
+                        mock_get_address_async)
 
-    def mock_list_address_tags(*args):
+    def mock_list_address_tags_async(*args):
         check_inputs(currency=args[0])
-        return []
-    monkeypatch.setattr(gsrest.service.common_service, "list_address_tags",
-                        mock_list_address_tags)
+        return QueryFuture.resolved([])
+    monkeypatch.setattr(gsrest.service.common_service,
+                        "list_address_tags_async",
+                        mock_list_address_tags_async)
 
     auth.login()
 
@@ -0,0 +1,158 @@
+import threading
+import time
+
+from gsrest.db.storage import execute
+import gsrest.service.addresses_service as addressesDAO
+import gsrest.service.tags_service as labelsDAO
+import gsrest.service.txs_service as txsDAO
+
+
+def test_stats(memory_client):
+    response = memory_client.get('/stats')
+    assert response.status_code == 200
+    currencies = response.get_json()['currencies']
+    assert sorted(currencies) == ['bch', 'btc', 'ltc', 'zec']
+    assert currencies['btc']['no_blocks'] == 20
+    etag = response.headers['ETag']
+
+    response = memory_client.get('/stats', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert not response.data
+
+    response = memory_client.get('/stats',
+                                 headers={'If-None-Match': '"outdated"'})
+    assert response.status_code == 200
+
+
+def test_search_limit(memory_client, memory_auth):
+    memory_auth.login()
+    labels = memory_client.get('/search?q=exc&currency=btc').get_json()[
+        'labels']
+    assert len(labels) > 1
+    data = memory_client.get('/search?q=exc&currency=btc&limit=1') \
+        .get_json()
+    assert data['labels'] == labels[:1]
+    assert memory_client.get('/search?q=exc&limit=-1').status_code == 400
+
+
+def test_search_leading_zeros(memory_client, memory_auth):
+    memory_auth.login()
+    response = memory_client.get('/search?q=00000&currency=btc')
+    assert response.status_code == 200
+    assert response.get_json()['currencies'][0]['txs'] == []
+
+
+def test_search_timeout(memory_app, memory_client, memory_auth,
+                        monkeypatch):
+    memory_auth.login()
+    expected = memory_client.get('/search?q=exc').get_json()
+    assert expected['timed_out'] == []
+    assert expected['failed'] == []
+
+    released = threading.Event()
+    list_labels = labelsDAO.list_labels
+
+    def slow_list_labels(currency, expression, limit=None, deadline=None):
+        if currency == 'bch':
+            released.wait(10)
+        return list_labels(currency, expression, limit, deadline)
+
+    monkeypatch.setattr(labelsDAO, 'list_labels', slow_list_labels)
+    monkeypatch.setitem(memory_app.config, 'SEARCH_TIMEOUT', 0.2)
+    try:
+        data = memory_client.get('/search?q=exc').get_json()
+    finally:
+        released.set()
+    assert data['timed_out'] == [{'currency': 'bch', 'source': 'labels'}]
+    assert data['currencies'] == expected['currencies']
+    labels = [label for currency in ('btc', 'ltc', 'zec')
+              for label in memory_client.get(
+                  '/search?q=exc&currency=' + currency).get_json()['labels']]
+    assert sorted(data['labels']) == sorted(labels)
+    assert len(data['labels']) < len(expected['labels'])
+
+
+def test_search_without_timeout(memory_app, memory_client, memory_auth,
+                                monkeypatch):
+    memory_auth.login()
+    expected = memory_client.get('/search?q=exc').get_json()
+    monkeypatch.setitem(memory_app.config, 'SEARCH_TIMEOUT', None)
+    response = memory_client.get('/search?q=exc')
+    assert response.status_code == 200
+    assert response.get_json() == expected
+
+
+def test_search_failure(memory_app, memory_client, memory_auth,
+                        monkeypatch):
+    memory_auth.login()
+    expected = memory_client.get('/search?q=exc').get_json()
+    list_labels = labelsDAO.list_labels
+
+    def failing_list_labels(currency, expression, limit=None,
+                            deadline=None):
+        if currency == 'ltc':
+            raise RuntimeError('Unavailable')
+        return list_labels(currency, expression, limit, deadline)
+
+    monkeypatch.setattr(labelsDAO, 'list_labels', failing_list_labels)
+    response = memory_client.get('/search?q=exc')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['failed'] == [{'currency': 'ltc', 'source': 'labels'}]
+    assert data['timed_out'] == []
+    assert data['currencies'] == expected['currencies']
+    assert len(data['labels']) < len(expected['labels'])
+
+
+def test_search_deadline(memory_app):
+    with memory_app.app_context():
+        tx = execute('btc', 'raw', 'transactions').one().tx_hash.hex()
+        assert txsDAO.list_matching_txs('btc', tx[:10]) == [tx]
+        # no rows are read past the deadline
+        passed = time.monotonic()
+        assert txsDAO.list_matching_txs('btc', tx[:10],
+                                        deadline=passed) == []
+        assert labelsDAO.list_labels('btc', 'exchange0',
+                                     deadline=passed) == []
+        address = execute('btc', 'transformed', 'addresses_by_id_group',
+                          [0]).one().address
+        assert addressesDAO.list_matching_addresses(
+            'btc', address, deadline=passed) == []
+
+
+def test_search_reads_matching_rows(memory_app, monkeypatch):
+    backend = memory_app.extensions['storage']
+    execute_async = backend.execute_async
+    queries = []
+
+    def recording_execute_async(currency, keyspace_type, name, params=None,
+                                *args, **kwargs):
+        future = execute_async(currency, keyspace_type, name, params, *args,
+                               **kwargs)
+        rows = []
+        queries.append((name, params, rows))
+        future.add_callbacks(rows.extend, lambda exception: None)
+        return future
+
+    monkeypatch.setattr(backend, 'execute_async', recording_execute_async)
+    with memory_app.app_context():
+        tx = execute('btc', 'raw', 'transactions').one().tx_hash.hex()
+        address = execute('btc', 'transformed', 'addresses_by_id_group',
+                          [0]).one().address
+        del queries[:]
+        assert txsDAO.list_matching_txs('btc', tx[:10], 5) == [tx]
+        assert addressesDAO.list_matching_addresses('btc', address, 5) == \
+            [address]
+        assert labelsDAO.list_labels('btc', 'exchange0', 1) == \
+            ['Exchange 0']
+        # the clustering column is restricted to the matching range and
+        # the rows read are bounded by the limit
+        (_, tx_params, tx_rows), (_, address_params, _), \
+            (_, label_params, label_rows) = queries
+        assert tx_params[3] == 5 and len(tx_rows) == 1
+        assert address_params[1:] == [address, 5]
+        assert label_params[1:] == ['exchange0', 1]
+        assert len(label_rows) == 1 < len(list(execute(
+            'btc', 'transformed', 'labels_by_prefix',
+            [label_params[0], '', 1000])))
@@ -0,0 +1,207 @@
+"""
+Query budgets of the endpoints.
+
+Every endpoint is requested against the memory storage backend, which
+records its round-trips: each query and each further page fetched while
+iterating a result. With warm caches, a request may not exceed the budget
+of its endpoint, so that an added query, or a query per listed row, fails
+the tests.
+"""
+from collections import Counter
+
+import pytest
+
+from gsrest.db import synthetic
+from gsrest.db.memory import MemoryBackend
+from gsrest.service import common_service
+from tests.conftest import make_app, MEMORY_DATASET, AuthActions
+
+
+# (url, maximum number of round-trips); the placeholders are filled in
+# from the dataset by the ids fixture
+BUDGETS = [
+    ('/stats', 0),  # cached statistics
+    ('/btc/blocks/', 1),
+    ('/btc/blocks/{height}', 1),
+    ('/btc/blocks/{height}/txs', 1),
+    ('/btc/blocks/{height}/txs.csv', 1),
+    ('/btc/rates/{height}', 0),  # rates table
+    ('/btc/rates/range', 0),
+    ('/btc/rates/range.csv?stride=2', 0),
+    ('/btc/txs/', 1),
+    ('/btc/txs/{tx}', 1),
+    ('/btc/addresses/{address}', 2),
+    ('/btc/addresses/{address}/txs?pagesize=100', 1),
+    ('/btc/addresses/{address}/tags', 1),
+    ('/btc/addresses/{address}/tags.csv', 1),
+    # one query per id group of the listed addresses
+    ('/btc/addresses/{address}/neighbors?direction=out&pagesize=100', 2),
+    ('/btc/addresses/{address}/neighbors?direction=in&pagesize=100', 2),
+    ('/btc/addresses/{address}/neighbors.csv?direction=out', 2),
+    ('/btc/addresses/{neighbor}/links?neighbor={address}', 4),
+    ('/btc/addresses/{address}/entity', 4),
+    ('/btc/entities/{entity}', 3),
+    ('/btc/entities/{entity}/tags', 2),
+    ('/btc/entities/{entity}/tags.csv', 2),
+    ('/btc/entities/{entity}/neighbors?direction=out&pagesize=100', 1),
+    ('/btc/entities/{entity}/neighbors?direction=in&pagesize=100', 1),
+    ('/btc/entities/{entity}/neighbors.csv?direction=in', 1),
+    ('/btc/entities/{entity}/neighbors?direction=out&targets=1,2,3', 4),
+    ('/btc/entities/{entity}/addresses?pagesize=100', 2),
+    # bounded by the visited nodes, at most depth * breadth
+    ('/btc/entities/{entity}/search?direction=out&category=exchange'
+     '&depth=2&breadth=10', 98),
+    ('/search?q={address_prefix}', 12),  # three queries per currency
+    ('/search?q={tx_prefix}&currency=btc', 3),
+    ('/search?q=exch&currency=btc', 1),
+    # pages of limit rows, no further page once enough labels match
+    ('/search?q=exc&currency=btc&limit=1', 1),
+    ('/tags?label=exchange0', 4),  # one query per currency
+    ('/tags/taxonomies', 1),
+    ('/tags/taxonomies/entity/concepts', 1),
+]
+
+
+class RecordingBackend(MemoryBackend):
+    """ Memory backend recording the catalog name of each round-trip """
+
+    def __init__(self):
+        super().__init__()
+        self.round_trips = []
+
+    def execute_async(self, currency, keyspace_type, name, *args, **kwargs):
+        future = super().execute_async(currency, keyspace_type, name,
+                                       *args, **kwargs)
+        # called once per fetched page
+        future.add_callbacks(lambda rows: self.round_trips.append(name),
+                             lambda exception: self.round_trips.append(name))
+        return future
+
+
+@pytest.fixture(scope='module')
+def recording_app():
+    for app in make_app(STORAGE_BACKEND='memory',
+                        MEMORY_DATASET=MEMORY_DATASET,
+                        LATEST_CACHE_TTL=3600):
+        app.extensions['storage'] = RecordingBackend()
+        yield app
+
+
+@pytest.fixture(scope='module')
+def recording_client(recording_app):
+    client = recording_app.test_client()
+    AuthActions(client).login()
+    return client
+
+
+@pytest.fixture(scope='module')
+def ids(recording_client):
+    # warms the caches of the latest statistics and the rates table
+    assert recording_client.get('/stats').status_code == 200
+    height = 3
+    tx = recording_client.get('/btc/blocks/{}/txs'.format(height)) \
+        .get_json()['txs'][1]['tx_hash']
+    tx_data = recording_client.get('/btc/txs/' + tx).get_json()
+    address = tx_data['outputs'][0]['address']
+    entity = recording_client.get('/btc/addresses/{}/entity'
+                                  .format(address)).get_json()['entity']
+    return {'height': height,
+            'tx': tx,
+            'tx_prefix': tx[:6],
+            'address': address,
+            'address_prefix': address[:6],
+            'neighbor': tx_data['inputs'][0]['address'],
+            'entity': entity}
+
+
+@pytest.mark.parametrize('url,budget', BUDGETS)
+def test_query_budget(recording_app, recording_client, ids, url, budget):
+    backend = recording_app.extensions['storage']
+    del backend.round_trips[:]
+    response = recording_client.get(url.format(**ids))
+    assert response.status_code == 200
+    # streamed responses finish their queries while being consumed
+    response.get_data()
+    response.close()
+    round_trips = Counter(backend.round_trips)
+    assert sum(round_trips.values()) <= budget, dict(round_trips)
+
+
+# addresses per id group of the grouped dataset, so that listings of a few
+# rows span several id groups
+GROUP_SIZE = 10
+
+
+@pytest.fixture
+def grouped_app(monkeypatch):
+    monkeypatch.setattr(synthetic, 'BUCKET_SIZE', GROUP_SIZE)
+    monkeypatch.setattr(common_service, 'BUCKET_SIZE', GROUP_SIZE)
+    # without the address cache, every listed address is resolved by a query
+    for app in make_app(STORAGE_BACKEND='memory',
+                        MEMORY_DATASET=MEMORY_DATASET,
+                        LATEST_CACHE_TTL=3600,
+                        ADDRESS_CACHE_SIZE=0):
+        app.extensions['storage'] = RecordingBackend()
+        yield app
+
+
+def select(app, name, params):
+    with app.app_context():
+        return app.extensions['storage'] \
+            .execute_async('btc', 'transformed', name, params).result()
+
+
+def check_group_budget(app, client, url, address_ids):
+    """ Requests url and returns the number of id groups of the listed
+    address_ids, after checking that they were resolved by one query per
+    id group """
+    backend = app.extensions['storage']
+    del backend.round_trips[:]
+    response = client.get(url)
+    assert response.status_code == 200
+    groups = {common_service.get_id_group(address_id)
+              for address_id in address_ids}
+    assert Counter(backend.round_trips)['addresses_by_ids'] == len(groups)
+    return len(groups)
+
+
+def test_query_budget_per_id_group(grouped_app):
+    client = grouped_app.test_client()
+    AuthActions(client).login()
+    assert client.get('/stats').status_code == 200
+    addresses = [
+        row.address
+        for group in range(MEMORY_DATASET['no_addresses'] // GROUP_SIZE + 1)
+        for row in select(grouped_app, 'addresses_by_ids',
+                          [group, list(range(group * GROUP_SIZE,
+                                             (group + 1) * GROUP_SIZE))])]
+    assert len(addresses) == MEMORY_DATASET['no_addresses']
+
+    # (number of listed rows, number of their id groups)
+    listings = []
+    for address in addresses:
+        prefix = address[:common_service.ADDRESS_PREFIX_LENGTH]
+        address_id = select(grouped_app, 'address_id',
+                            [prefix, address]).one().address_id
+        neighbors = [row.dst_address_id for row in select(
+            grouped_app, 'address_outgoing_relations',
+            [common_service.get_id_group(address_id), address_id])]
+        groups = check_group_budget(
+            grouped_app, client,
+            '/btc/addresses/{}/neighbors?direction=out&pagesize=100'
+            .format(address), neighbors)
+        listings.append((len(neighbors), groups))
+    for entity in range(MEMORY_DATASET['no_clusters']):
+        rows = [row.address_id for row in select(
+            grouped_app, 'cluster_addresses',
+            [common_service.get_id_group(entity), entity])]
+        if rows:
+            groups = check_group_budget(
+                grouped_app, client,
+                '/btc/entities/{}/addresses?pagesize=100'.format(entity),
+                rows)
+            listings.append((len(rows), groups))
+    # the dataset lists rows of several id groups, and of more rows than
+    # id groups
+    assert any(groups > 1 for _, groups in listings)
+    assert any(rows > groups > 1 for rows, groups in listings)
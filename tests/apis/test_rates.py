@@ -0,0 +1,43 @@
+import json
+
+
+def test_rates_range(memory_client, memory_auth):
+    memory_auth.login()
+    rates = [memory_client.get('/btc/rates/{}'.format(height))
+             .get_json()['rates'] for height in range(20)]
+
+    response = memory_client.get('/btc/rates/range')
+    assert response.status_code == 200
+    data = json.loads(response.data.decode())
+    assert data['start'] == 0
+    assert data['end'] == 19
+    assert data['stride'] == 1
+    assert data['rates']['eur'] == [r['eur'] for r in rates]
+    assert data['rates']['usd'] == [r['usd'] for r in rates]
+
+    data = memory_client.get('/btc/rates/range?start=2&end=100&stride=5') \
+        .get_json()
+    assert data['start'] == 2
+    assert data['end'] == 17
+    assert data['rates']['usd'] == [rates[h]['usd'] for h in (2, 7, 12, 17)]
+
+    data = memory_client.get('/btc/rates/range?start=30').get_json()
+    assert data == {'start': 30, 'end': None, 'stride': 1,
+                    'rates': {'eur': [], 'usd': []}}
+
+    for args in ('start=-1', 'stride=0', 'start=5&end=4'):
+        response = memory_client.get('/btc/rates/range?' + args)
+        assert response.status_code == 400
+    assert memory_client.get('/abc/rates/range').status_code == 404
+
+
+def test_rates_range_csv(memory_client, memory_auth):
+    memory_auth.login()
+    response = memory_client.get('/btc/rates/range.csv?start=3&end=9'
+                                 '&stride=3')
+    assert response.status_code == 200
+    lines = response.data.decode().splitlines()
+    assert lines[0] == 'height,eur,usd'
+    assert [line.split(',')[0] for line in lines[1:]] == ['3', '6', '9']
+    rate = memory_client.get('/btc/rates/6').get_json()['rates']
+    assert lines[2] == '6,{!r},{!r}'.format(rate['eur'], rate['usd'])
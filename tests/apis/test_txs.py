@@ -1,6 +1,6 @@
 from collections import namedtuple
 
-from gsrest.model.txs import Tx
+from gsrest.model.txs import Tx, TxInputOutput
 import gsrest.service.txs_service
 from gsrest.util.checks import check_inputs
 
@@ -16,12 +16,17 @@ TEST_TXS = {
     tx1: Tx(bytearray.fromhex(tx1),
             False,
             245426,
-            [input1],
-            [output1, output2],
+            [TxInputOutput(input1.address,
+                           {'value': 10000000, 'eur': 0.05, 'usd': 0.05})
+             .to_dict()],
+            [TxInputOutput(output1.address,
+                           {'value': 1, 'eur': 0.0, 'usd': 0.0}).to_dict(),
+             TxInputOutput(output2.address,
+                           {'value': 9949999, 'eur': 0.05, 'usd': 0.05})
+             .to_dict()],
             1373266967,
-            10000000,
-            9950000,
-            {'eur': 0.5, 'usd': 0.5}).to_dict()
+            {'value': 10000000, 'eur': 0.05, 'usd': 0.05},
+            {'value': 9950000, 'eur': 0.05, 'usd': 0.05}).to_dict()
 }
 
 non_existing_tx = '999999'
@@ -1,6 +1,7 @@
 import json
 import os
 import tempfile
+from contextlib import contextmanager
 
 import pytest
 
@@ -30,20 +31,30 @@ class AuthActions(object):
         return self._client.get('/logout')
 
 
-@pytest.fixture
-def app(monkeypatch):
+DUMMY_MAPPING = {
+    "tagpacks": "tagpacks",
+    "btc": ["btc_raw", "btc_transformed_X"],
+    "ltc": ["ltc_raw_", "ltc_transformed_Y"],
+    "bch": ["bch_raw_", "bch_transformed_Z"],
+    "zec": ["zec_raw_", "zec_transformed_A"]
+}
+
+# small synthetic dataset of the memory storage backend
+MEMORY_DATASET = {
+    'seed': 1,
+    'no_blocks': 20,
+    'no_txs_per_block': 5,
+    'no_addresses': 60,
+    'no_clusters': 20,
+    'no_tags': 10
+}
+
+
+def make_app(**config):
 
     # temp user db location
     db_fd, db_path = tempfile.mkstemp()
 
-    DUMMY_MAPPING = {
-        "tagpacks": "tagpacks",
-        "btc": ["btc_raw", "btc_transformed_X"],
-        "ltc": ["ltc_raw_", "ltc_transformed_Y"],
-        "bch": ["bch_raw_", "bch_transformed_Z"],
-        "zec": ["zec_raw_", "zec_transformed_A"]
-    }
-
     db_test_conf = {
         'TESTING': True,
         'DATABASE': db_path,
@@ -51,6 +62,7 @@ def app(monkeypatch):
         'SECRET_KEY': 'testing_secret',
         'MAPPING': DUMMY_MAPPING,
         'CASSANDRA_NODES': None,
+        **config
     }
 
     app = create_app(db_test_conf)
@@ -65,6 +77,62 @@ def app(monkeypatch):
     os.unlink(db_path)
 
 
+@pytest.fixture
+def app(monkeypatch):
+    yield from make_app()
+
+
+@pytest.fixture
+def memory_app():
+    yield from make_app(STORAGE_BACKEND='memory',
+                        MEMORY_DATASET=MEMORY_DATASET)
+
+
+@pytest.fixture
+def files_app(tmp_path):
+    """ Memory backend application reading the offline-built files
+    (address dictionaries, Bloom filters and indexes) from tmp_path """
+    yield from make_app(STORAGE_BACKEND='memory',
+                        MEMORY_DATASET=MEMORY_DATASET, ADDRESS_CACHE_SIZE=0,
+                        ADDRESS_DICTIONARY_PATH=str(tmp_path),
+                        BLOOM_FILTER_PATH=str(tmp_path),
+                        ADDRESS_INDEX_PATH=str(tmp_path),
+                        TX_INDEX_PATH=str(tmp_path))
+
+
+OFFLINE_FILES = ('address_dictionaries', 'bloom_filters', 'address_indexes',
+                 'tx_indexes')
+
+
+def reopen_files(app):
+    """ Makes the app open the offline-built files anew """
+    for extension in OFFLINE_FILES:
+        app.extensions.pop(extension, None)
+
+
+def build(app, *args):
+    """ Runs a flask CLI command building offline files """
+    result = app.test_cli_runner().invoke(args=list(args))
+    assert result.exit_code == 0, result.output
+    reopen_files(app)
+
+
+@contextmanager
+def no_queries(app):
+    """ Makes every query of the storage backend fail """
+    storage = app.extensions['storage']
+    storage.execute_async = None
+    try:
+        yield
+    finally:
+        del storage.execute_async
+
+
+@pytest.fixture
+def memory_client(memory_app):
+    return memory_app.test_client()
+
+
 @pytest.fixture
 def client(app):
     return app.test_client()
@@ -78,3 +146,8 @@ def runner(app):
 @pytest.fixture
 def auth(client):
     return AuthActions(client)
+
+
+@pytest.fixture
+def memory_auth(memory_client):
+    return AuthActions(memory_client)
@@ -0,0 +1,173 @@
+import logging
+
+import pytest
+from cassandra import ConsistencyLevel
+from cassandra.cluster import EXEC_PROFILE_DEFAULT
+from cassandra.policies import ConstantSpeculativeExecutionPolicy, \
+    NoSpeculativeExecutionPolicy, TokenAwarePolicy
+from cassandra.query import tuple_factory
+
+import gsrest.db.cassandra as cassandra
+from gsrest.db.cassandra import ClusterManager, CassandraBackend, \
+    cached_named_tuple_factory, create_execution_profiles, \
+    get_execution_profile, profile_name
+from gsrest.util.exceptions import MissingConfigError
+
+logger = logging.getLogger(__name__)
+
+CONFIG = {'CASSANDRA_NODES': ['localhost']}
+
+
+class StubSession:
+    def __init__(self, keyspace):
+        self.keyspace = keyspace
+
+
+class StubCluster:
+    """ Records the clusters created and the sessions opened """
+
+    instances = []
+
+    def __init__(self, nodes, **kwargs):
+        self.nodes = nodes
+        self.kwargs = kwargs
+        self.keyspaces = []
+        self.is_shutdown = False
+        StubCluster.instances.append(self)
+
+    def connect(self, keyspace):
+        self.keyspaces.append(keyspace)
+        return StubSession(keyspace)
+
+    def shutdown(self):
+        self.is_shutdown = True
+
+
+@pytest.fixture
+def stub_cluster(monkeypatch):
+    StubCluster.instances = []
+    monkeypatch.setattr(cassandra, 'Cluster', StubCluster)
+    return StubCluster
+
+
+def test_cached_named_tuple_factory():
+    page1 = cached_named_tuple_factory(['height', 'eur'], [(1, 0.5)])
+    page2 = cached_named_tuple_factory(['height', 'eur'], [(2, 0.7)])
+    assert page1[0].height == 1 and page1[0].eur == 0.5
+    assert page2[0][0] == 2
+    # the row class is created once per column list
+    assert type(page1[0]) is type(page2[0])
+    assert type(cached_named_tuple_factory(['height'], [(1,)])[0]) is not \
+        type(page1[0])
+
+
+def test_profile_name():
+    assert profile_name('default', 'named') is EXEC_PROFILE_DEFAULT
+    assert profile_name('point', 'named') == 'point'
+    assert profile_name('default', 'tuple') == 'default:tuple'
+
+
+PROFILES = {
+    'default': {'consistency_level': 'QUORUM', 'request_timeout': 5.0},
+    'point': {'request_timeout': 1.0,
+              'speculative_execution': {'delay': 0.05, 'max_attempts': 2}}
+}
+
+
+def test_create_execution_profiles():
+    profiles = create_execution_profiles(PROFILES)
+    # one profile per row format
+    assert set(profiles) == {EXEC_PROFILE_DEFAULT, 'default:tuple', 'point',
+                             'point:tuple'}
+    assert profiles['point'].row_factory is cached_named_tuple_factory
+    assert profiles['point:tuple'].row_factory is tuple_factory
+    default = profiles[EXEC_PROFILE_DEFAULT]
+    assert default.consistency_level == ConsistencyLevel.QUORUM
+    assert default.request_timeout == 5.0
+    assert isinstance(default.load_balancing_policy, TokenAwarePolicy)
+    # hedging only where configured
+    assert isinstance(default.speculative_execution_policy,
+                      NoSpeculativeExecutionPolicy)
+    for name in ('point', 'point:tuple'):
+        policy = profiles[name].speculative_execution_policy
+        assert isinstance(policy, ConstantSpeculativeExecutionPolicy)
+        assert policy.delay == 0.05 and policy.max_attempts == 2
+
+
+def test_create_execution_profiles_without_default():
+    with pytest.raises(MissingConfigError):
+        create_execution_profiles({'point': PROFILES['point']})
+
+
+def test_get_execution_profile(app):
+    app.config['CASSANDRA_EXECUTION_PROFILES'] = PROFILES
+    with app.app_context():
+        assert get_execution_profile('address') == 'point'
+        assert get_execution_profile('exchange_rates') == 'point:tuple'
+        # the scan profile is not configured
+        assert get_execution_profile('blocks') is EXEC_PROFILE_DEFAULT
+        assert get_execution_profile('all_exchange_rates') == \
+            'default:tuple'
+        assert get_execution_profile('blocks', 'point') == 'point'
+        assert get_execution_profile('address', 'unknown') is \
+            EXEC_PROFILE_DEFAULT
+
+
+def test_one_cluster_per_process(stub_cluster):
+    manager = ClusterManager()
+    cluster = manager.connect(CONFIG, logger)
+    assert manager.connect(CONFIG, logger) is cluster
+    assert stub_cluster.instances == [cluster]
+    assert cluster.nodes == ['localhost']
+    assert set(cluster.kwargs['execution_profiles']) == \
+        {EXEC_PROFILE_DEFAULT, 'default:tuple', 'point', 'point:tuple',
+         'scan', 'scan:tuple'}
+
+
+def test_session_per_keyspace(stub_cluster):
+    manager = ClusterManager()
+    btc = manager.get_session('btc_raw', CONFIG, logger)
+    ltc = manager.get_session('ltc_raw', CONFIG, logger)
+    assert btc.keyspace == 'btc_raw' and ltc.keyspace == 'ltc_raw'
+    # sessions are reused by later requests
+    assert manager.get_session('btc_raw', CONFIG, logger) is btc
+    assert len(stub_cluster.instances) == 1
+    assert stub_cluster.instances[0].keyspaces == ['btc_raw', 'ltc_raw']
+
+
+def test_reconnect_after_fork(stub_cluster, monkeypatch):
+    manager = ClusterManager()
+    session = manager.get_session('btc_raw', CONFIG, logger)
+    parent = stub_cluster.instances[0]
+    monkeypatch.setattr(cassandra.os, 'getpid', lambda: -1)
+    assert not manager.is_connected()
+    assert manager.get_session('btc_raw', CONFIG, logger) is not session
+    assert len(stub_cluster.instances) == 2
+    # the connections of the parent process are left alone
+    manager.shutdown()
+    assert not parent.is_shutdown
+    assert stub_cluster.instances[1].is_shutdown
+
+
+def test_reset_and_shutdown(stub_cluster):
+    manager = ClusterManager()
+    manager.get_session('btc_raw', CONFIG, logger)
+    manager.reset()
+    assert not manager.is_connected() and not manager.sessions
+    assert not stub_cluster.instances[0].is_shutdown
+    manager.get_session('btc_raw', CONFIG, logger)
+    manager.shutdown()
+    assert stub_cluster.instances[1].is_shutdown
+    assert manager.cluster is None and not manager.sessions
+
+
+def test_backend_connect(stub_cluster, monkeypatch, app):
+    monkeypatch.setattr(cassandra, 'manager', ClusterManager())
+    with app.app_context():
+        CassandraBackend().connect(app)
+    assert len(stub_cluster.instances) == 1
+    # one session for every keyspace of the mapping
+    assert sorted(stub_cluster.instances[0].keyspaces) == sorted(
+        ['tagpacks', 'btc_raw', 'btc_transformed_X', 'ltc_raw_',
+         'ltc_transformed_Y', 'bch_raw_', 'bch_transformed_Z', 'zec_raw_',
+         'zec_transformed_A'])
@@ -0,0 +1,99 @@
+import pytest
+
+from gsrest.db.memory import Statement, Table, ResultSet
+from gsrest.db.storage import execute, get_columns
+
+
+def test_statement():
+    statement = Statement("SELECT label, label_norm FROM tag_by_label WHERE "
+                          "label_norm_prefix = ? GROUP BY label_norm_prefix, "
+                          "label_norm LIMIT 10")
+    assert statement.table == 'tag_by_label'
+    assert statement.columns == ('label', 'label_norm')
+    assert statement.restrictions == [('label_norm_prefix', '=')]
+    assert statement.group_by == ('label_norm_prefix', 'label_norm')
+    assert statement.limit == 10
+
+    statement = Statement("SELECT address FROM address WHERE "
+                          "address_prefix = ? AND address >= ? LIMIT ?")
+    assert statement.restrictions == [('address_prefix', '='),
+                                      ('address', '>=')]
+    assert statement.limit == '?'
+
+    with pytest.raises(ValueError):
+        Statement("SELECT * FROM block WHERE height > ?")
+
+
+def test_table_rows():
+    table = Table(('group', 'id', 'value'), ('group',), ('id',))
+    table.insert([{'group': 1, 'id': 3, 'value': 'c'},
+                  {'group': 1, 'id': 1, 'value': 'a'},
+                  {'group': 2, 'id': 2, 'value': 'b'}])
+    assert table.rows([('group', '=', 1)]) == [(1, 1, 'a'), (1, 3, 'c')]
+    assert table.rows([('group', '=', 1), ('id', 'IN', [3, 4])]) == \
+        [(1, 3, 'c')]
+    # restrictions without the partition key scan all partitions
+    assert table.rows([('value', '=', 'b')]) == [(2, 2, 'b')]
+    assert table.rows([('group', '=', 1), ('id', '>=', 2)]) == [(1, 3, 'c')]
+    assert table.rows([('id', '>=', 2), ('id', '<=', 2)]) == [(2, 2, 'b')]
+
+
+def test_bound_limit():
+    table = Table(('group', 'id'), ('group',), ('id',))
+    table.insert([{'group': 1, 'id': i} for i in range(5)])
+    statement = Statement("SELECT id FROM t WHERE group = ? AND id >= ? "
+                          "LIMIT ?")
+    assert statement.execute(table, [1, 1, 2]) == [(1, 1), (1, 2)]
+    with pytest.raises(ValueError):
+        statement.execute(table, [1, 1])
+    with pytest.raises(ValueError):
+        statement.execute(table, [1, 1, 0])
+
+
+def test_result_set_paging():
+    rows = list(range(5))
+    page1 = ResultSet(rows, fetch_size=2)
+    assert page1.current_rows == [0, 1]
+    assert list(page1) == rows
+    page2 = ResultSet(rows, fetch_size=2, paging_state=page1.paging_state)
+    assert page2.current_rows == [2, 3]
+    page3 = ResultSet(rows, fetch_size=2, paging_state=page2.paging_state)
+    assert page3.current_rows == [4]
+    assert page3.paging_state is None
+    assert page3.one() == 4
+    assert not ResultSet([])
+
+
+def test_execute(memory_app):
+    with memory_app.app_context():
+        block = execute('btc', 'raw', 'block', [3]).one()
+        assert block.height == 3
+
+        blocks = execute('btc', 'raw', 'blocks', fetch_size=8)
+        assert [row.height for row in blocks.current_rows] == \
+            list(range(8))
+        blocks = execute('btc', 'raw', 'blocks', fetch_size=8,
+                         paging_state=blocks.paging_state)
+        assert blocks.current_rows[0].height == 8
+
+        # rows of tuple row format queries are accessed by column index
+        columns = get_columns('btc', 'transformed', 'exchange_rates')
+        rate = execute('btc', 'transformed', 'exchange_rates', [3]).one()
+        assert rate[columns['height']] == 3
+
+        # the dataset is consistent across tables
+        address = execute('btc', 'transformed', 'address_by_id_group',
+                          [0, 1]).one()
+        address_id = execute('btc', 'transformed', 'address_id',
+                             [address.address[:5], address.address]).one()
+        assert address_id.address_id == 1
+
+        with pytest.raises(ValueError):
+            execute('btc', 'raw', 'block')
+
+
+def test_api(memory_client, memory_auth):
+    memory_auth.login()
+    response = memory_client.get('/btc/blocks/1')
+    assert response.status_code == 200
+    assert response.get_json()['height'] == 1
@@ -0,0 +1,21 @@
+from gsrest.db.storage import QueryFuture, join
+
+
+def test_query_future_joins_futures():
+    calls = []
+
+    def build(a, b):
+        calls.append((a, b))
+        return a + b
+
+    future = QueryFuture([QueryFuture.resolved(1), QueryFuture.resolved(2)],
+                         build)
+    assert future.result() == 3
+    # the callback is evaluated only once
+    assert future.result() == 3
+    assert calls == [(1, 2)]
+
+
+def test_join():
+    assert join(QueryFuture.resolved('a'), QueryFuture.resolved(None)) == \
+        ['a', None]
@@ -1,4 +1,5 @@
-from gsrest.model.common import Values, ConvertedValues
+from gsrest.model.common import Values, ConvertedValues, RatesArray, \
+    convert_values
 
 
 def test_normal_value():
@@ -25,3 +26,20 @@ def test_converted_value():
     assert value_dict['value'] == 175000000000
     assert value_dict['eur'] == 700
     assert value_dict['usd'] == 1225
+
+
+def test_convert_values():
+    rates = {'eur': 0.4, 'usd': 0.7}
+    values = [175000000000, -123456789, 0]
+
+    converted = convert_values(values, RatesArray.from_dict(rates))
+    assert converted == [ConvertedValues(value, rates).to_dict()
+                         for value in values]
+
+    rates = RatesArray(['eur', 'usd'], [[0.4, 0.7], [1.2, float('nan')]])
+    assert convert_values([100000000, 100000000], rates) == [
+        {'value': 100000000, 'eur': 0.4, 'usd': 0.7},
+        {'value': 100000000, 'eur': 1.2, 'usd': None}]
+    assert convert_values([100000000], rates.take([1])) == [
+        {'value': 100000000, 'eur': 1.2, 'usd': None}]
+    assert convert_values([], rates) == []
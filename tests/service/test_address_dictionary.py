@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+import pytest
+
+import gsrest.service.address_dictionary as address_dictionary
+from gsrest.db.storage import execute, get_keyspace_mapping
+from gsrest.service.address_dictionary import AddressDictionary, \
+    DictionaryWriter, dictionary_path, fill_table, get_address_dictionary, \
+    write_dictionary
+from gsrest.service.addresses_service import get_address_id
+from gsrest.service.common_service import get_id_group, \
+    list_addresses_by_ids
+from tests.conftest import build, no_queries, reopen_files, MEMORY_DATASET
+
+
+def test_write_dictionary(tmp_path):
+    path = str(tmp_path / 'test.dict')
+    ids = [7, 3, 1000000, 4]
+    addresses = ['1Seven', 'bc1three', '3Million', 'bitcoincash:four']
+    write_dictionary(path, 'btc_transformed', ids, addresses)
+    dictionary = AddressDictionary(path)
+    assert dictionary.keyspace == 'btc_transformed'
+    assert dictionary.max_id == 1000000
+    assert len(dictionary) == 4
+    assert dictionary.get_addresses([3, 4, 5, 1000000, 7, 0, 2000000]) == \
+        ['bc1three', 'bitcoincash:four', None, '3Million', '1Seven', None,
+         None]
+    for id_, address in zip(ids, addresses):
+        assert dictionary.get_address_id(address) == id_
+    assert dictionary.get_address_id('1Unknown') is None
+
+    write_dictionary(path, 'btc_transformed', [], [])
+    empty = AddressDictionary(path)
+    assert empty.get_addresses([1]) == [None]
+    assert empty.get_address_id('1Seven') is None
+
+    # keyspace names are not truncated
+    with pytest.raises(ValueError):
+        write_dictionary(path, 'k' * 49, ids, addresses)
+    writer = DictionaryWriter(path, 'btc_transformed')
+    writer.add([1, 2], ['a', 'b'])
+    with pytest.raises(ValueError):
+        writer.add([2, 3], ['b', 'c'])
+
+
+def test_fill_table():
+    hashes = np.random.RandomState(0).randint(0, 2 ** 32, 40,
+                                              dtype=np.uint32)
+    table = np.zeros(64, dtype=np.int64)
+    fill_table(table, hashes[:25], np.arange(25))
+    fill_table(table, hashes[25:], np.arange(25, 40))
+    assert sorted(table[table > 0]) == list(range(1, 41))
+    # every position is reached by probing from its hash
+    for position, hash_ in enumerate(hashes):
+        slot = int(hash_) & 63
+        while table[slot] != position + 1:
+            assert table[slot]
+            slot = (slot + 1) & 63
+
+
+def test_chunked_build(tmp_path, monkeypatch):
+    monkeypatch.setattr(address_dictionary, 'CHUNK_SIZE', 7)
+    path = str(tmp_path / 'test.dict')
+    ids = list(range(0, 100, 3))
+    addresses = ['1Address{}'.format(id_) for id_ in ids]
+    writer = DictionaryWriter(path, 'btc_transformed')
+    for start in range(0, len(ids), 7):
+        writer.add(ids[start:start + 7], addresses[start:start + 7])
+    writer.close()
+    dictionary = AddressDictionary(path)
+    assert dictionary.max_id == 99
+    assert dictionary.get_addresses(ids + [1]) == addresses + [None]
+    assert [dictionary.get_address_id(a) for a in addresses] == ids
+    assert os.listdir(str(tmp_path)) == ['test.dict']
+
+
+def test_address_dictionary(files_app, tmp_path):
+    with files_app.app_context():
+        assert get_address_dictionary('btc') is None
+        keyspace = get_keyspace_mapping('btc', 'transformed')
+    build(files_app, 'build-address-dictionary', 'btc', '--concurrency', '2')
+    assert os.path.exists(str(tmp_path / (keyspace + '.dict')))
+
+    with files_app.app_context():
+        dictionary = get_address_dictionary('btc')
+        assert len(dictionary) == MEMORY_DATASET['no_addresses']
+        ids = list(range(1, MEMORY_DATASET['no_addresses'] + 1))
+        addresses = [execute('btc', 'transformed', 'address_by_id_group',
+                             [get_id_group(id_), id_]).one().address
+                     for id_ in ids]
+        # served from the dictionary
+        with no_queries(files_app):
+            assert list_addresses_by_ids('btc', ids) == addresses
+            assert get_address_id('btc', addresses[5]) == 6
+
+        # newer ids and addresses are queried
+        write_dictionary(dictionary_path('btc'), keyspace,
+                         ids[:10], addresses[:10])
+        reopen_files(files_app)
+        assert get_address_dictionary('btc').max_id == 10
+        assert list_addresses_by_ids('btc', ids) == addresses
+        assert get_address_id('btc', addresses[20]) == 21
+        assert get_address_id('btc', 'unknown') is None
+
+        # dictionaries of other keyspaces are ignored
+        write_dictionary(dictionary_path('btc'), 'other', ids, addresses)
+        reopen_files(files_app)
+        assert get_address_dictionary('btc') is None
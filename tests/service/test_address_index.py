@@ -0,0 +1,79 @@
+import os
+
+import gsrest.service.address_index as address_index
+from gsrest.db.storage import execute, get_keyspace_mapping
+from gsrest.service.address_index import AddressIndex, get_address_index, \
+    index_path, search_sorted, write_index
+from gsrest.service.addresses_service import list_matching_addresses
+from tests.conftest import build, no_queries, reopen_files, \
+    MEMORY_DATASET
+
+
+def test_address_index(tmp_path, monkeypatch):
+    # offsets written in batches of three
+    monkeypatch.setattr(address_index, 'OFFSETS_BATCH', 3)
+    path = str(tmp_path / 'test.index')
+    addresses = sorted(['1A1', '1A2', '1B', 'bc1qa', 'bc1qb', 'bc1qc', 'z'])
+    assert write_index(path, 'btc_transformed',
+                       (a.encode() for a in addresses), 7) == 7
+    assert os.listdir(str(tmp_path)) == ['test.index']
+    index = AddressIndex(path)
+    assert index.keyspace == 'btc_transformed'
+    assert index.max_id == 7
+    assert len(index) == 7
+    assert index.search('bc1q') == ['bc1qa', 'bc1qb', 'bc1qc']
+    assert index.search('bc1q', limit=2) == ['bc1qa', 'bc1qb']
+    assert index.search('1A') == ['1A1', '1A2']
+    assert index.search('1A3') == []
+    assert index.search('zz') == []
+    assert index.search('') == addresses
+    encoded = [a.encode() for a in addresses]
+    assert search_sorted(encoded, 'bc1q', 2) == ['bc1qa', 'bc1qb']
+    assert search_sorted(encoded, '1A3') == []
+
+
+def test_incremental_build(files_app, monkeypatch):
+    with files_app.app_context():
+        rows = list(execute('btc', 'transformed', 'addresses_by_id_group',
+                            [0]))
+        addresses = sorted(row.address for row in rows)
+        prefix = addresses[0][:6]
+        expected = list_matching_addresses('btc', prefix)
+        assert expected
+        # an index of the first ten addresses
+        write_index(index_path('btc'),
+                    get_keyspace_mapping('btc', 'transformed'),
+                    sorted(row.address.encode() for row in rows
+                           if row.address_id <= 10), 10)
+        reopen_files(files_app)
+        assert get_address_index('btc').max_id == 10
+        # newer addresses are scanned once
+        assert list_matching_addresses('btc', prefix) == expected
+        assert get_address_index('btc').newer[0] == \
+            MEMORY_DATASET['no_addresses']
+        with no_queries(files_app):
+            assert list_matching_addresses('btc', prefix) == expected
+        # too many newer addresses
+        monkeypatch.setattr(address_index, 'MAX_NEWER_ADDRESSES', 5)
+        get_address_index('btc').newer = (10, [])
+        assert list_matching_addresses('btc', prefix) == expected
+        assert get_address_index('btc').newer == (10, [])
+        monkeypatch.undo()
+
+    # sorted in runs of seven addresses, merged with the existing index
+    monkeypatch.setattr(address_index, 'CHUNK_SIZE', 7)
+    build(files_app, 'build-address-index', 'btc', '--incremental')
+
+    with files_app.app_context():
+        index = get_address_index('btc')
+        assert index.max_id == MEMORY_DATASET['no_addresses']
+        assert [a.decode() for a in index] == addresses
+        # served from the index
+        with no_queries(files_app):
+            assert list_matching_addresses('btc', prefix) == expected
+            assert list_matching_addresses('btc', prefix[:5], 1) == \
+                addresses[:1]
+        # no runs are left behind
+        path = index_path('btc')
+        assert os.listdir(os.path.dirname(path)) == \
+            [os.path.basename(path)]
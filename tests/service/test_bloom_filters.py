@@ -0,0 +1,114 @@
+import random
+
+from gsrest.db.storage import execute
+from gsrest.service.bloom_filters import BloomFilter, get_bloom_filter, \
+    get_current_filter
+from gsrest.service.common_service import get_address
+from gsrest.service.general_service import get_statistics
+from gsrest.service.txs_service import get_tx
+from gsrest.util.cache import get_cache
+from tests.conftest import build, no_queries, AuthActions
+
+
+def test_bloom_filter(tmp_path):
+    rng = random.Random(0)
+    items = ['{:064x}'.format(rng.getrandbits(256)) for _ in range(2000)]
+    bloom_filter = BloomFilter.create(2000, 0.01, 5, 'btc_raw', 7, 1000)
+    for item in items[:1000]:
+        bloom_filter.add(item)
+        bloom_filter.add_prefix(item)
+    path = str(tmp_path / 'test.bloom')
+    bloom_filter.write(path)
+
+    for bloom_filter in (bloom_filter, BloomFilter.open(path)):
+        assert bloom_filter.keyspace == 'btc_raw'
+        assert bloom_filter.prefix_length == 5
+        assert bloom_filter.count == 2000
+        assert bloom_filter.covers(7, 1000)
+        assert not bloom_filter.covers(8, 1000)
+        assert not bloom_filter.covers(7, 1001)
+        # no false negatives
+        assert all(item in bloom_filter for item in items[:1000])
+        assert all(bloom_filter.contains_prefix(item[:5] + 'x')
+                   for item in items[:1000])
+        false_positives = sum(item in bloom_filter for item in items[1000:])
+        assert false_positives < 30
+        assert items[1000][:5] not in bloom_filter
+
+
+def test_unknown_lookups(files_app):
+    build(files_app, 'build-bloom-filters', 'btc', '--false-positive-rate',
+          '0.0001')
+    client = files_app.test_client()
+    AuthActions(client).login()
+    with files_app.app_context():
+        assert get_bloom_filter('btc', 'addresses') is not None
+        row = execute('btc', 'transformed', 'address_by_id_group',
+                      [0, 1]).one()
+        tx_hash = next(iter(execute('btc', 'raw',
+                                    'all_transaction_hashes'))) \
+            .tx_hash.hex()
+        assert get_address('btc', row.address)['address'] == row.address
+        assert get_tx('btc', tx_hash)['tx_hash'] == tx_hash
+
+        # unknown addresses and transactions are not queried
+        with no_queries(files_app):
+            assert get_address('btc', row.address + 'x') is None
+            assert get_tx('btc', 'ff' * 32) is None
+            assert client.get('/btc/addresses/{}x'.format(row.address)) \
+                .status_code == 404
+            assert client.get('/btc/addresses/{}x/txs'.format(row.address)) \
+                .status_code == 404
+            assert client.get('/btc/txs/' + 'ff' * 32).status_code == 404
+
+        # labels are still searched
+        storage = files_app.extensions['storage']
+        execute_memory = storage.execute_async
+        queries = []
+
+        def execute_async(currency, keyspace_type, name, *args, **kwargs):
+            queries.append(name)
+            return execute_memory(currency, keyspace_type, name, *args,
+                                  **kwargs)
+        storage.execute_async = execute_async
+        data = client.get('/search?q=zzzzzzzzz&currency=btc').get_json()
+        assert data['currencies'] == [
+            {'currency': 'btc', 'addresses': [], 'txs': []}]
+        assert queries == ['labels_by_prefix']
+
+        # filters are skipped once the statistics report newer items
+        statistics = get_statistics('btc')
+        get_cache('statistics').put('btc', dict(statistics,
+                                                no_txs=statistics['no_txs']
+                                                + 1))
+        del queries[:]
+        assert get_tx('btc', 'ff' * 32) is None
+        assert 'transaction' in queries
+        assert get_address('btc', row.address + 'x') is None
+        assert get_bloom_filter('btc', 'addresses') is not None
+
+
+def test_stale_filters(files_app):
+    build(files_app, 'build-bloom-filters', 'btc')
+    files_app.config['LATEST_CACHE_TTL'] = 0
+    with files_app.app_context():
+        # the statistics are not cached, so the filters are not used
+        assert get_bloom_filter('btc', 'txs') is not None
+        assert get_current_filter('btc', 'txs') is None
+
+
+def test_upper_case_tx_search(files_app):
+    build(files_app, 'build-bloom-filters', 'btc')
+    client = files_app.test_client()
+    AuthActions(client).login()
+    with files_app.app_context():
+        tx_hash = next(iter(execute('btc', 'raw',
+                                    'all_transaction_hashes'))) \
+            .tx_hash.hex()
+    url = '/search?q={}&currency=btc'.format(tx_hash[:8].upper())
+    # checked by the filter, then queried or looked up in the index
+    for command in (None, 'build-tx-index'):
+        if command:
+            build(files_app, command, 'btc')
+        data = client.get(url).get_json()
+        assert tx_hash in data['currencies'][0]['txs']
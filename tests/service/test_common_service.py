@@ -0,0 +1,27 @@
+from gsrest.db.storage import execute
+from gsrest.service.common_service import get_address_cache, \
+    get_id_group, list_addresses_by_ids
+from tests.conftest import make_app, no_queries, MEMORY_DATASET
+
+
+def test_list_addresses_by_ids(memory_app):
+    with memory_app.app_context():
+        ids = [1, 40, 2, 1, 10 ** 9]
+        expected = [execute('btc', 'transformed', 'address_by_id_group',
+                            [get_id_group(id_), id_]).one().address
+                    for id_ in ids[:4]] + [None]
+        assert list_addresses_by_ids('btc', ids) == expected
+        # unknown ids are cached as well
+        assert len(get_address_cache()) == 4
+        # served from the cache
+        with no_queries(memory_app):
+            assert list_addresses_by_ids('btc', ids) == expected
+            assert list_addresses_by_ids('btc', []) == []
+
+
+def test_list_addresses_by_ids_uncached():
+    for app in make_app(STORAGE_BACKEND='memory',
+                        MEMORY_DATASET=MEMORY_DATASET, ADDRESS_CACHE_SIZE=0):
+        with app.app_context():
+            assert list_addresses_by_ids('btc', [1, 1, 10 ** 9])[1:] == \
+                [list_addresses_by_ids('btc', [1])[0], None]
@@ -0,0 +1,57 @@
+import numpy as np
+
+from gsrest.db.storage import execute, get_columns
+from gsrest.service.rates_service import RatesTable, get_rates, \
+    get_rates_table, list_rates
+
+
+def test_rates_table():
+    table = RatesTable(['eur', 'usd'])
+    assert table.get(0) is None
+    table.insert([0, 1], [[1.0, 2.0], [3.0, 4.0]])
+    table.insert([5], [[5.0, 6.0]], size=8)
+    assert table.size == 8
+    assert len(table.snapshot[0]) >= 8
+    assert table.get(1) == {'eur': 3.0, 'usd': 4.0}
+    assert table.get(5) == {'eur': 5.0, 'usd': 6.0}
+    # loaded heights without rates
+    assert table.get(3) is None
+    assert table.get(8) is None
+    assert table.get(-1) is None
+
+
+def test_rates(memory_app):
+    with memory_app.app_context():
+        columns = get_columns('btc', 'transformed', 'exchange_rates')
+        row = execute('btc', 'transformed', 'exchange_rates', [3]).one()
+        assert get_rates('btc', 3) == {
+            'height': 3,
+            'rates': {'eur': row[columns['eur']], 'usd': row[columns['usd']]}}
+        assert get_rates('btc')['height'] == 19
+        assert list(list_rates('btc', [3, 4, 3, 100])) == [3, 4]
+
+
+def test_rates_table_extension(memory_app):
+    with memory_app.app_context():
+        table = get_rates_table('btc')
+        assert table.size == 20
+        rates = table.get(12)
+        # forget the rates of the latest blocks
+        values, _ = table.snapshot
+        values[10:] = np.nan
+        table.snapshot = (values, 10)
+        assert list_rates('btc', [12]) == {12: rates}
+        assert table.size == 20
+        assert table.get(12) == rates
+
+
+def test_rates_table_snapshot():
+    table = RatesTable(['eur'])
+    table.insert([0, 1], [[1.0], [2.0]])
+    values, size = table.snapshot
+    # the first extension reallocates the array; a reader holding the
+    # previous snapshot keeps a consistent array and size
+    table.insert([5], [[6.0]], size=8)
+    assert len(values) >= size == 2
+    assert table.snapshot[0] is not values
+    assert table.size == 8
@@ -0,0 +1,81 @@
+import os
+
+import gsrest.service.tx_index as tx_index
+from gsrest.db.storage import execute
+from gsrest.service.tx_index import TxIndex, get_tx_index, index_path, \
+    prefix_range, write_index
+from gsrest.service.txs_service import list_matching_txs
+from tests.conftest import build, no_queries, reopen_files, MEMORY_DATASET
+
+
+def test_tx_index(tmp_path, monkeypatch):
+    # sorted in runs of two hashes, read one by one
+    monkeypatch.setattr(tx_index, 'CHUNK_SIZE', 2)
+    monkeypatch.setattr(tx_index, 'READ_SIZE', 1)
+    path = str(tmp_path / 'test.txindex')
+    tx_hashes = [bytes.fromhex(h.ljust(64, '0')) for h in
+                 ('00ab', '00ab1', '00abff', '00ac', 'ff')] + \
+        [b'\xab' + b'\xff' * 31]
+    assert write_index(path, 'btc_raw', reversed(tx_hashes), 7) == 6
+    assert os.listdir(str(tmp_path)) == ['test.txindex']
+    index = TxIndex(path)
+    assert index.keyspace == 'btc_raw'
+    assert index.no_blocks == 7
+    assert len(index) == 6
+    assert [index[i] for i in range(6)] == sorted(tx_hashes)
+    expected = ['00ab'.ljust(64, '0'), '00ab1'.ljust(64, '0'),
+                '00abff'.ljust(64, '0')]
+    # leading zeros are kept
+    assert index.search('00ab') == expected
+    assert index.search('00AB', limit=2) == expected[:2]
+    assert index.search('00a') == expected + ['00ac'.ljust(64, '0')]
+    assert index.search('ab') == ['ab' + 'f' * 62]
+    assert index.search('00ad') == []
+    assert index.search('xyz') == []
+    assert index.search('f' * 65) == []
+    assert prefix_range('abc') == (b'\xab\xc0' + b'\0' * 30,
+                                   b'\xab\xcf' + b'\xff' * 30)
+
+
+def test_build_tx_index(files_app):
+    with files_app.app_context():
+        tx_hashes = sorted(row.tx_hash.hex() for row in execute(
+            'btc', 'raw', 'all_transaction_hashes'))
+        expression = tx_hashes[0][:6]
+        expected = list_matching_txs('btc', expression)
+        assert expected == [tx for tx in tx_hashes
+                            if tx.startswith(expression)]
+
+    build(files_app, 'build-tx-index', 'btc')
+
+    with files_app.app_context():
+        assert len(get_tx_index('btc')) == len(tx_hashes)
+        # served from the index
+        with no_queries(files_app):
+            assert list_matching_txs('btc', expression) == expected
+            assert list_matching_txs('btc', expression[:5], 1) == \
+                tx_hashes[:1]
+
+
+def test_newer_blocks(files_app, monkeypatch):
+    with files_app.app_context():
+        rows = list(execute('btc', 'raw', 'transactions'))
+        expression = min(row.tx_hash.hex() for row in rows
+                         if row.height >= 10)[:6]
+        expected = list_matching_txs('btc', expression)
+        assert expected
+        # an index of the first ten blocks
+        write_index(index_path('btc'), 'btc_raw',
+                    [bytes(row.tx_hash) for row in rows if row.height < 10],
+                    10)
+        reopen_files(files_app)
+        # the newer blocks are read once
+        assert list_matching_txs('btc', expression) == expected
+        assert get_tx_index('btc').newer[0] == MEMORY_DATASET['no_blocks']
+        with no_queries(files_app):
+            assert list_matching_txs('btc', expression) == expected
+        # too many newer blocks
+        monkeypatch.setattr(tx_index, 'MAX_NEWER_BLOCKS', 5)
+        get_tx_index('btc').newer = (10, [])
+        assert list_matching_txs('btc', expression) == expected
+        assert get_tx_index('btc').newer == (10, [])
@@ -0,0 +1,62 @@
+import asyncio
+import json
+
+import gsrest.asgi
+from gsrest.asgi import AsgiApp
+from tests.conftest import AuthActions
+
+
+def call(app, method, path, body=b'', headers=None):
+    scope = {'type': 'http', 'method': method, 'path': path,
+             'query_string': b'', 'http_version': '1.1',
+             'headers': headers or []}
+    messages = [{'type': 'http.request', 'body': body,
+                 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(app(scope, receive, send))
+    finally:
+        loop.close()
+    status = sent[0]['status']
+    body = b''.join(m['body'] for m in sent[1:])
+    return status, body, sent
+
+
+def test_asgi_get(app):
+    asgi_app = AsgiApp(app, 4)
+    status, body, _ = call(asgi_app, 'GET', '/swagger.json')
+    assert status == 200
+    assert json.loads(body.decode())['info']['title'] == 'GraphSense REST API'
+
+
+def test_asgi_post(app):
+    asgi_app = AsgiApp(app, 4)
+    body = json.dumps({'username': 'john', 'password': 'doe'}).encode()
+    status, body, _ = call(asgi_app, 'POST', '/login', body,
+                           [(b'content-type', b'application/json'),
+                            (b'content-length', str(len(body)).encode())])
+    assert status == 200
+    assert 'Authorization' in json.loads(body.decode())
+
+
+def test_asgi_streamed_csv(memory_app, memory_client, monkeypatch):
+    AuthActions(memory_client).login()
+    expected = memory_client.get('/btc/blocks/1/txs.csv').data
+    authorization = memory_client.environ_base['HTTP_AUTHORIZATION']
+    monkeypatch.setattr(gsrest.asgi, 'RESPONSE_CHUNK_SIZE', 64)
+    asgi_app = AsgiApp(memory_app, 4)
+    # the CSV generator holds an application context across chunks
+    status, body, sent = call(
+        asgi_app, 'GET', '/btc/blocks/1/txs.csv',
+        headers=[(b'authorization', authorization.encode())])
+    assert status == 200
+    assert len(sent) > 4
+    assert body == expected
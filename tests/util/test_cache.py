@@ -0,0 +1,133 @@
+import sqlite3
+import threading
+
+from gsrest.db.storage import execute, get_keyspace_mapping
+from gsrest.service.addresses_service import get_address_id
+from gsrest.service.common_service import get_address_cache
+from gsrest.service.general_service import get_statistics
+from gsrest.util.cache import MISSING, LRUCache, RefreshingCache, \
+    SharedCache, get_cache
+from tests.conftest import make_app, MEMORY_DATASET
+
+
+def test_refreshing_cache(app, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('gsrest.util.cache.time.monotonic', lambda: now[0])
+    cache = RefreshingCache('rates', ttl=10, max_stale=20)
+    reloaded = threading.Event()
+
+    def load():
+        reloaded.set()
+        return 'new'
+
+    with app.app_context():
+        assert cache.get('btc', load) is None
+        cache.put('btc', 'old')
+        now[0] += 5
+        assert cache.get('btc', load) == 'old'
+        assert not reloaded.is_set()
+
+        # stale entries are served while being reloaded
+        now[0] += 10
+        assert cache.get('btc', load) == 'old'
+        assert reloaded.wait(1)
+        for thread in threading.enumerate():
+            if thread.name == 'refresh-rates-btc':
+                thread.join()
+        assert cache.get('btc', load) == 'new'
+
+        now[0] += 31
+        assert cache.get('btc', load) is None
+
+
+def test_cached_statistics():
+    for app in make_app(STORAGE_BACKEND='memory',
+                        MEMORY_DATASET=MEMORY_DATASET):
+        with app.app_context():
+            statistics = get_statistics('btc')
+            assert get_cache('statistics').get('btc', None) == statistics
+    for app in make_app(STORAGE_BACKEND='memory',
+                        MEMORY_DATASET=MEMORY_DATASET, LATEST_CACHE_TTL=0):
+        with app.app_context():
+            assert get_cache('statistics') is None
+
+
+def test_lru_cache(tmp_path):
+    cache = LRUCache('test', max_size=3, sizeof=lambda key, value: 1)
+    assert cache.get('a') is MISSING
+    for key in 'abc':
+        cache.put(key, key.upper())
+    cache.put('unknown', None)
+    # the least recently used entry is evicted
+    assert cache.get('a') is MISSING
+    assert cache.get('b') == 'B'
+    cache.put('d', 'D')
+    assert cache.get('c') is MISSING
+    assert cache.get('unknown') is None
+    assert len(cache) == cache.size == 3
+
+    shared = SharedCache(str(tmp_path / 'cache.db'))
+    worker1 = LRUCache('test', 10000, shared)
+    worker2 = LRUCache('test', 10000, SharedCache(shared.path))
+    worker1.put('btc:1A', 42)
+    worker1.put('btc:1B', None)
+    assert worker2.get('btc:1A') == 42
+    assert worker2.get('btc:1B') is None
+    assert worker2.get('btc:1C') is MISSING
+    assert len(worker2) == 2
+
+
+def test_cached_address_ids(tmp_path):
+    for app in make_app(STORAGE_BACKEND='memory',
+                        MEMORY_DATASET=MEMORY_DATASET,
+                        ADDRESS_CACHE_SHARED_PATH=str(tmp_path / 'ids.db')):
+        with app.app_context():
+            address = execute('btc', 'transformed', 'address_by_id_group',
+                              [0, 1]).one().address
+            address_id = get_address_id('btc', address)
+            assert address_id == 1
+            assert get_address_id('btc', 'unknown') is None
+            cache = get_address_cache()
+            key = 'id:' + get_keyspace_mapping('btc', 'transformed') + ':'
+            assert cache.get(key + address) == address_id
+            assert cache.get(key + 'unknown') is None
+            assert cache.shared.get(key + address) == address_id
+    for app in make_app(STORAGE_BACKEND='memory',
+                        MEMORY_DATASET=MEMORY_DATASET, ADDRESS_CACHE_SIZE=0):
+        with app.app_context():
+            assert get_address_cache() is None
+            assert get_address_id('btc', 'unknown') is None
+
+
+def test_shared_cache_eviction(tmp_path, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('gsrest.util.cache.time.time', lambda: now[0])
+    monkeypatch.setattr(SharedCache, 'EVICTION_INTERVAL', 4)
+    shared = SharedCache(str(tmp_path / 'cache.db'), max_entries=3)
+    for key in 'abc':
+        now[0] += 1
+        shared.put(key, key.upper())
+    # accessing an entry keeps it
+    now[0] += 1
+    assert shared.get('a') == 'A'
+    now[0] += 1
+    shared.put('d', 'D')
+    assert len(shared) == 3
+    assert shared.get('b') is MISSING
+    assert [shared.get(key) for key in 'acd'] == ['A', 'C', 'D']
+
+
+def test_shared_cache_hits_do_not_write(tmp_path):
+    shared = SharedCache(str(tmp_path / 'cache.db'), max_entries=3)
+    shared.put('a', 'A')
+    writer = sqlite3.connect(shared.path, isolation_level=None)
+    writer.execute('BEGIN IMMEDIATE')
+    try:
+        # hits are served while another worker holds the write lock
+        assert shared.get('a') == 'A'
+    finally:
+        writer.execute('ROLLBACK')
+        writer.close()
+    assert list(shared._accessed) == ['a']
+    shared.flush()
+    assert not shared._accessed
@@ -0,0 +1,65 @@
+import os
+
+import gsrest.util.mapped_files as mapped_files
+from gsrest.util.mapped_files import MappedFiles, atomic_write
+
+
+class KeyspaceFile:
+    """ File holding nothing but its keyspace """
+
+    def __init__(self, path):
+        with open(path) as f:
+            self.keyspace = f.read()
+        if not self.keyspace:
+            raise ValueError('Empty file')
+
+
+def write(path, keyspace):
+    with atomic_write(path) as f:
+        f.write(keyspace.encode())
+
+
+def test_mapped_files(app, tmp_path):
+    app.config['TX_INDEX_PATH'] = str(tmp_path)
+    files = MappedFiles('test file', 'test_files', 'TX_INDEX_PATH',
+                        KeyspaceFile)
+    path = str(tmp_path / 'btc.test')
+    write(path, 'btc_raw')
+    assert not os.path.exists(path + '.tmp')
+    with app.app_context():
+        assert files.path('btc.test') == path
+        mapped = files.get('btc', path, 'btc_raw')
+        assert mapped.keyspace == 'btc_raw'
+        # opened once
+        assert files.get('btc', path, 'btc_raw') is mapped
+        assert app.extensions['test_files']['btc'].mapped is mapped
+        # missing, unreadable or other keyspaces
+        assert files.get('ltc', str(tmp_path / 'ltc.test'), 'ltc') is None
+        write(str(tmp_path / 'empty.test'), '')
+        assert files.open(str(tmp_path / 'empty.test'), '') is None
+        assert files.open(path, 'ltc_raw') is None
+        app.config['TX_INDEX_PATH'] = None
+        assert files.path('btc.test') is None
+        assert files.get('bch', None, 'bch_raw') is None
+
+
+def test_reopen(app, tmp_path, monkeypatch):
+    files = MappedFiles('test file', 'test_files', 'TX_INDEX_PATH',
+                        KeyspaceFile)
+    path = str(tmp_path / 'btc.test')
+    with app.app_context():
+        assert files.get('btc', path, 'btc_raw') is None
+        write(path, 'btc_raw')
+        # not checked again within the interval
+        assert files.get('btc', path, 'btc_raw') is None
+        monkeypatch.setattr(mapped_files, 'CHECK_INTERVAL', 0)
+        mapped = files.get('btc', path, 'btc_raw')
+        assert mapped.keyspace == 'btc_raw'
+        assert files.get('btc', path, 'btc_raw') is mapped
+        # replaced files are reopened
+        write(path, 'btc_raw')
+        replaced = files.get('btc', path, 'btc_raw')
+        assert replaced is not mapped
+        assert replaced.keyspace == 'btc_raw'
+        os.remove(path)
+        assert files.get('btc', path, 'btc_raw') is None
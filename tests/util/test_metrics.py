@@ -0,0 +1,54 @@
+import pytest
+
+from tests.conftest import make_app, MEMORY_DATASET, AuthActions
+
+pytest.importorskip('prometheus_client')
+
+
+@pytest.fixture
+def metrics_app():
+    yield from make_app(STORAGE_BACKEND='memory',
+                        MEMORY_DATASET=MEMORY_DATASET, METRICS=True)
+
+
+def test_metrics(metrics_app):
+    from gsrest.util.metrics import record_cache
+
+    client = metrics_app.test_client()
+    AuthActions(client).login()
+    assert client.get('/btc/blocks/1').status_code == 200
+    with metrics_app.app_context():
+        record_cache('rates', True)
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    metrics = response.data.decode()
+    assert 'gsrest_requests_total{method="GET",' \
+           'route="/<currency>/blocks/<int:height>",status="200"}' in metrics
+    assert 'gsrest_request_duration_seconds_bucket{le="0.005",' \
+           'method="GET",route="/<currency>/blocks/<int:height>"}' in metrics
+    assert 'gsrest_queries_total{outcome="success",query="block"}' in metrics
+    assert 'gsrest_query_duration_seconds_count{query="block"}' in metrics
+    assert 'gsrest_cache_requests_total{cache="rates",result="hit"}' \
+        in metrics
+
+
+def test_paged_query_counted_once(metrics_app):
+    from gsrest.db.storage import execute
+    from gsrest.util.metrics import get_metrics
+
+    with metrics_app.app_context():
+        metrics = get_metrics()
+        queries = metrics.queries.labels('transactions', 'success')
+        latency = metrics.query_latency.labels('transactions')
+        count = queries._value.get()
+        observations = sum(bucket.get() for bucket in latency._buckets)
+        rows = list(execute('btc', 'raw', 'transactions', fetch_size=10))
+        assert len(rows) > 10
+        assert queries._value.get() == count + 1
+        assert sum(bucket.get() for bucket in latency._buckets) == \
+            observations + 1
+
+
+def test_metrics_disabled(client):
+    assert client.get('/metrics').status_code == 404
@@ -0,0 +1,67 @@
+import logging
+
+import pytest
+
+from gsrest.util.slow_queries import QueryRecord, format_record
+from tests.conftest import make_app, MEMORY_DATASET, AuthActions
+
+
+@pytest.fixture
+def logging_client():
+    for app in make_app(STORAGE_BACKEND='memory',
+                        MEMORY_DATASET=MEMORY_DATASET,
+                        SLOW_QUERY_THRESHOLD=0.0):
+        yield app.test_client()
+
+
+def test_format_record():
+    record = QueryRecord('address_transactions_by_hashes', 'btc_transformed',
+                         [1, 2, [bytes([i]) for i in range(12)]], None,
+                         False)
+    record.on_page([(1,), (2,)])
+    message = format_record(record, 'GET /btc/addresses/1A/links')
+    assert message.startswith('Slow query address_transactions_by_hashes '
+                              'on btc_transformed: ')
+    assert '2 rows, 1 pages' in message
+    assert "params [1, 2, [00, 01, 02, 03, 04, 05, 06, 07, 08, 09, " \
+           "... 2 more]]" in message
+    assert message.endswith('request GET /btc/addresses/1A/links')
+
+
+def test_record_releases_future():
+    record = QueryRecord('block', 'btc_raw', [1], object(), False)
+    record.on_page([(1,)])
+    assert record.future is None
+    traced = QueryRecord('block', 'btc_raw', [1], object(), True)
+    traced.on_error(RuntimeError('Timeout'))
+    assert traced.future is not None
+
+
+def test_slow_query_log(logging_client, caplog):
+    AuthActions(logging_client).login()
+    with caplog.at_level(logging.WARNING, logger='gsrest.slow_queries'):
+        response = logging_client.get('/btc/blocks/1')
+        assert response.status_code == 200
+        # queries are logged once the response has been sent
+        response.close()
+    messages = [r.getMessage() for r in caplog.records
+                if r.name == 'gsrest.slow_queries']
+    assert len(messages) == 1
+    assert messages[0].startswith('Slow query block on btc_raw: ')
+    assert 'params [1], request GET /btc/blocks/1' in messages[0]
+
+
+def test_search_queries_logged(logging_client, caplog):
+    AuthActions(logging_client).login()
+    with caplog.at_level(logging.WARNING, logger='gsrest.slow_queries'):
+        response = logging_client.get('/search?q=exchange0&currency=btc')
+        assert response.status_code == 200
+        response.close()
+    messages = [r.getMessage() for r in caplog.records
+                if r.name == 'gsrest.slow_queries']
+    # queries of the search threads are recorded with the request
+    assert messages
+    assert all('request GET /search?q=exchange0&currency=btc' in message
+               for message in messages)
+    assert any(message.startswith('Slow query labels_by_prefix ')
+               for message in messages)
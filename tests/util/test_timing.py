@@ -0,0 +1,55 @@
+import re
+import time
+
+import pytest
+
+from gsrest.util.timing import RequestTimer
+from tests.conftest import make_app, MEMORY_DATASET, AuthActions
+
+
+@pytest.fixture
+def timed_client():
+    for app in make_app(STORAGE_BACKEND='memory',
+                        MEMORY_DATASET=MEMORY_DATASET, SERVER_TIMING=True):
+        yield app.test_client()
+
+
+def test_request_timer():
+    timer = RequestTimer()
+    timer.enter('db')
+    time.sleep(0.01)
+    timer.enter('rates')
+    time.sleep(0.01)
+    timer.exit()
+    timer.exit()
+    timer.stop()
+    # nested phases pause the enclosing one
+    assert 0.01 <= timer.durations['db'] < 0.02
+    assert timer.durations['rates'] >= 0.01
+    assert sum(timer.durations.values()) == pytest.approx(timer.total)
+
+
+def test_server_timing_header(timed_client, client, auth):
+    AuthActions(timed_client).login()
+    # loads the exchange rates table
+    assert timed_client.get('/btc/blocks/2/txs').status_code == 200
+    response = timed_client.get('/btc/blocks/1/txs')
+    assert response.status_code == 200
+    header = response.headers['Server-Timing']
+    for phase in ('auth', 'db', 'rates', 'model', 'serialize', 'total'):
+        assert re.search(r'\b{};dur=\d+\.\d\d'.format(phase), header)
+    # the block transactions; the exchange rate is looked up in memory
+    assert 'desc="1 queries, 1 rows"' in header
+
+    # disabled by default
+    auth.login()
+    assert 'Server-Timing' not in client.get('/swagger.json').headers
+
+
+def test_search_timing(timed_client):
+    AuthActions(timed_client).login()
+    response = timed_client.get('/search?q=exchange0&currency=btc')
+    assert response.status_code == 200
+    # the label search runs in the search thread pool
+    assert re.search(r'desc="[1-9]\d* queries, [1-9]\d* rows"',
+                     response.headers['Server-Timing'])